@@ -0,0 +1,147 @@
+# bar_resample.py - 日线合成周线/月线（含当前未走完的周/月），支持新日线到来时增量更新
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+
+# 周期名（与 mootdx client.bars 的 frequency 一致）-> 内部周期
+FREQUENCIES = {'week': 'week', 'w': 'week', 'mon': 'month', 'month': 'month', 'm': 'month'}
+
+_SUM_COLUMNS = ('vol', 'volume', 'amount')
+
+
+def period_key(dates, frequency='week'):
+    """
+    日期所属周期的编号，同一周（周一~周日）或同一月的日期编号相同
+
+    参数:
+        dates: 日期序列，'YYYY-MM-DD...' 字符串、datetime64 或 YYYYMMDD 整数
+        frequency: 'week' / 'mon'
+
+    返回:
+        ndarray[int64]
+    """
+    days = _to_days(dates)
+    if FREQUENCIES[frequency] == 'week':
+        return (days + 3) // 7          # 1970-01-01 是周四，+3 使每周从周一开始
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def resample_bars(bars, frequency='week', dates=None, drop_first=False):
+    """
+    日线合成周线/月线
+
+    开盘价取周期内第一根日线、收盘价取最后一根，最高/最低取极值，成交量/成交额求和，
+    datetime 取周期内最后一根日线（与通达信周线/月线的标注一致）；最后一个周期可以是未走完的当前周/月
+
+    参数:
+        bars: 日线 DataFrame 或 dict，包含 open/close/high/low，可选 vol/volume/amount/datetime
+        frequency: 'week' / 'mon'
+        dates: 日期序列，默认取 bars['datetime']
+        drop_first: 是否丢弃第一个周期（日线从周期中间开始时第一个周期不完整）
+
+    返回:
+        DataFrame: 列为 open, close, high, low 及 bars 中存在的 vol/volume/amount/datetime，每个周期一行
+    """
+    dates = bars['datetime'] if dates is None else dates
+    key = period_key(dates, frequency)
+    if len(key) == 0:
+        return pd.DataFrame(columns=[c for c in ('open', 'close', 'high', 'low') + _SUM_COLUMNS + ('datetime',)
+                                     if c in bars])
+    start = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    end = np.r_[start[1:], len(key)] - 1
+
+    out = {
+        'open': np.asarray(bars['open'], dtype=float)[start],
+        'close': np.asarray(bars['close'], dtype=float)[end],
+        'high': np.maximum.reduceat(np.asarray(bars['high'], dtype=float), start),
+        'low': np.minimum.reduceat(np.asarray(bars['low'], dtype=float), start),
+    }
+    for col in _SUM_COLUMNS:
+        if col in bars:
+            out[col] = np.add.reduceat(np.asarray(bars[col], dtype=float), start)
+    out['datetime'] = np.asarray(dates)[end]
+    df = pd.DataFrame(out)
+    return df.iloc[1:].reset_index(drop=True) if drop_first else df
+
+
+class BarResampler:
+    """
+    增量合成周线/月线：每来一根日线 O(1) 并入当前周期
+
+    用法:
+        weekly = BarResampler('week')
+        weekly.seed(day_df)                                   # 用历史日线初始化
+        bar, new_period = weekly.update(date, o, h, l, c, vol, amount)
+        bar, new_period = weekly.update(date, o, h, l, c, vol, amount, new_bar=False)   # 盘中替换当天日线
+    new_period 为 True 表示这根日线开始了新的一周/一月，可直接传给 indicator_stream 的 new_bar:
+        kdj.update(bar['close'], bar['high'], bar['low'], new_bar=new_period)
+    """
+
+    def __init__(self, frequency='week'):
+        self.frequency = frequency
+        self.bars = []          # 已走完的周期，每项为 dict
+        self.current = None     # 当前周期（包含最后一根日线）
+        self._before = None     # 最后一根日线并入之前的当前周期，None 表示最后一根日线开始了新周期
+        self._key = None
+
+    def update(self, date, open, high, low, close, vol=0.0, amount=0.0, new_bar=True):
+        """
+        并入一根日线
+
+        参数:
+            date: 日期，'YYYY-MM-DD...' 字符串 / datetime64 / YYYYMMDD 整数
+            new_bar: False 时替换上一次 update 的日线（盘中同一天价格变化），第一次调用时等同新开
+
+        返回:
+            tuple: (当前周期K线 dict, 是否开始了新周期)
+        """
+        day = {'open': open, 'close': close, 'high': high, 'low': low, 'vol': vol, 'amount': amount,
+               'datetime': date}
+        if new_bar or self.current is None:
+            key = int(period_key([date], self.frequency)[0])
+            if self.current is not None and key == self._key:
+                self._before = self.current
+            else:
+                if self.current is not None:
+                    self.bars.append(self.current)
+                self._before = None
+                self._key = key
+        self.current = _merge(self._before, day)
+        return self.current, self._before is None
+
+    def seed(self, bars, dates=None):
+        """用历史日线（DataFrame 或 dict，列同 resample_bars）逐根初始化"""
+        dates = bars['datetime'] if dates is None else dates
+        vol = bars['vol'] if 'vol' in bars else np.zeros(len(dates))
+        amount = bars['amount'] if 'amount' in bars else np.zeros(len(dates))
+        for row in zip(dates, *(np.asarray(bars[c], dtype=float) for c in ('open', 'high', 'low', 'close')),
+                       np.asarray(vol, dtype=float), np.asarray(amount, dtype=float)):
+            self.update(*row)
+        return self.current
+
+    def to_frame(self):
+        """全部周期（含当前周期）的 DataFrame，列同 resample_bars"""
+        rows = self.bars + ([self.current] if self.current is not None else [])
+        return pd.DataFrame(rows, columns=['open', 'close', 'high', 'low', 'vol', 'amount', 'datetime'])
+
+
+def _merge(period, day):
+    if period is None:
+        return dict(day)
+    return {'open': period['open'], 'close': day['close'],
+            'high': max(period['high'], day['high']), 'low': min(period['low'], day['low']),
+            'vol': period['vol'] + day['vol'], 'amount': period['amount'] + day['amount'],
+            'datetime': day['datetime']}
+
+
+def _to_days(dates):
+    """日期序列 -> 1970-01-01 起的天数"""
+    arr = np.asarray(dates)
+    if arr.dtype.kind in 'iuf':
+        arr = pd.to_datetime(arr.astype(np.int64).astype(str), format='%Y%m%d').values
+    elif arr.dtype.kind != 'M':
+        arr = arr.astype('U10').astype('datetime64[D]')
+    return arr.astype('datetime64[D]').astype(np.int64)
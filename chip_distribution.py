@@ -0,0 +1,208 @@
+# chip_distribution.py - 筹码分布（成本分布）引擎：股票×价格桶直方图，逐K线按换手率衰减并加入新筹码
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+BUCKETS = 120   # 每只股票的价格桶数
+
+# 筹码模型（与通达信 WINNER/COST 的思路一致）：
+#   每根K线换手率为 r（成交量/流通股本），原有筹码按 1-r 衰减，新增 r 的筹码按三角分布摊到 [最低价, 最高价]，峰值在均价
+#   第一根有效K线的筹码全部来自当根；停牌/缺失（价格或换手率为NaN）的K线不改变分布
+#   价格桶为每只股票各自的等宽网格，新价格超出网格时按累计分布重新分桶（只在扩展时发生）
+
+
+class ChipDistribution:
+    """
+    多只股票的筹码分布，内部为 股票×价格桶 的数组，每根K线 O(桶数) 更新
+
+    用法:
+        chips = ChipDistribution(len(codes))
+        chips.update(high, low, close, turnover)          # 每个参数为长度=股票数的数组
+        chips.winner(close), chips.cost(85), chips.peak()
+        chips.update(high, low, close, turnover, new_bar=False)   # 盘中替换最后一根K线
+    """
+
+    def __init__(self, n_stocks=1, buckets=BUCKETS, lo=None, hi=None):
+        """
+        参数:
+            n_stocks: 股票数
+            buckets: 价格桶数
+            lo, hi: 价格网格范围（长度=股票数的数组），已知整段历史时传入可避免重新分桶；默认按第一根K线自动确定
+        """
+        self.buckets = buckets
+        self.hist = np.zeros((n_stocks, buckets))
+        self.lo = np.full(n_stocks, np.nan)
+        self.step = np.full(n_stocks, np.nan)
+        self.started = np.zeros(n_stocks, dtype=bool)   # 是否已有筹码
+        self._base = None    # 最后一根K线之前的分布，用于 new_bar=False 替换
+        self._cum_cache = None
+        if lo is not None:
+            self._set_grid(np.arange(n_stocks), np.asarray(lo, dtype=float), np.asarray(hi, dtype=float))
+
+    # ---------- 更新 ----------
+
+    def update(self, high, low, close, turnover, avg=None, new_bar=True):
+        """
+        加入一根K线
+
+        参数:
+            high, low, close: 最高/最低/收盘价，长度=股票数的数组（单只股票可传标量）
+            turnover: 换手率（小数，成交量/流通股本），大于1按1处理
+            avg: 新增筹码的峰值价格，默认 (最高+最低+收盘)/3
+            new_bar: False 时替换上一次 update 的K线（盘中同一根K线价格变化）
+        """
+        if new_bar or self._base is None:
+            self._base = (self.hist.copy(), self.lo.copy(), self.step.copy(), self.started.copy())
+        else:
+            self.hist, self.lo, self.step, self.started = [x.copy() for x in self._base]
+        self._apply(*self._bar(high, low, close, turnover, avg))
+
+    def _bar(self, high, low, close, turnover, avg):
+        n = len(self.hist)
+        high, low, close, turnover = [np.broadcast_to(np.asarray(x, dtype=float), (n,))
+                                      for x in (high, low, close, turnover)]
+        avg = (high + low + close) / 3 if avg is None else np.broadcast_to(np.asarray(avg, dtype=float), (n,))
+        return high, low, np.clip(avg, low, high), turnover
+
+    def _apply(self, high, low, avg, turnover):
+        ok = (high == high) & (low == low) & (turnover == turnover) & (turnover >= 0)
+        if not ok.any():
+            return
+        empty = np.isnan(self.lo) & ok
+        if empty.any():
+            rows = np.flatnonzero(empty)
+            width = np.maximum(high[rows] - low[rows], high[rows] * 0.1)
+            self._set_grid(rows, low[rows] - width, high[rows] + width)
+        outside = ok & ((low <= self.lo) | (high >= self.lo + self.step * self.buckets))
+        if outside.any():
+            self._regrid(np.flatnonzero(outside), low, high)
+
+        self._cum_cache = None
+        r = np.where(ok, np.where(self.started, np.minimum(turnover, 1.0), 1.0), 0.0)
+        self.started |= ok
+        self.hist *= (1 - r)[:, None]
+
+        # 新增筹码只落在 [最低价, 最高价] 覆盖的几个桶内，只在这些桶上计算三角分布
+        first = np.where(ok, (low - self.lo) // self.step, 0).astype(np.int64)
+        span = min(int(np.where(ok, (high - self.lo) // self.step - first, 0).max()) + 1, self.buckets)
+        first = np.minimum(first, self.buckets - span)
+        cols = first[:, None] + np.arange(span)
+        edges = self.lo[:, None] + np.append(cols, cols[:, -1:] + 1, axis=1) * self.step[:, None]
+        cdf = _tri_cdf(edges, low[:, None], high[:, None], avg[:, None])
+        self.hist[np.arange(len(self.hist))[:, None], cols] += np.where(ok[:, None], r[:, None] * np.diff(cdf, axis=1), 0.0)
+
+    # ---------- 查询 ----------
+
+    def winner(self, price):
+        """获利盘比例：成本低于 price 的筹码占比（0~1），price 为标量或长度=股票数的数组"""
+        price = np.broadcast_to(np.asarray(price, dtype=float), (len(self.hist),))
+        cum = self._cum()
+        u = np.clip((price - self.lo) / self.step, 0, self.buckets)
+        k = np.minimum(np.nan_to_num(u).astype(np.int64), self.buckets - 1)
+        rows = np.arange(len(self.hist))
+        below = cum[rows, k] + (u - k) * self.hist[rows, k]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(np.isnan(u), np.nan, below / cum[:, -1])
+
+    def cost(self, pct):
+        """成本价：pct% 的筹码成本低于该价格，pct 为 0~100"""
+        cum = self._cum()
+        target = cum[:, -1] * (np.asarray(pct, dtype=float) / 100)
+        k = np.minimum((cum[:, 1:] < target[:, None]).sum(axis=1), self.buckets - 1)
+        rows = np.arange(len(self.hist))
+        mass = self.hist[rows, k]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.clip(np.where(mass > 0, (target - cum[rows, k]) / mass, 0.0), 0, 1)
+            return np.where(self.started, self.lo + (k + frac) * self.step, np.nan)
+
+    def peak(self):
+        """筹码峰：筹码最密集的价格桶的中心价"""
+        k = self.hist.argmax(axis=1)
+        return np.where(self.started, self.lo + (k + 0.5) * self.step, np.nan)
+
+    # ---------- 网格 ----------
+
+    def _edges(self):
+        return self.lo[:, None] + np.arange(self.buckets + 1) * self.step[:, None]
+
+    def _cum(self):
+        # 同一根K线上的多次查询共用一次累计和
+        if self._cum_cache is None:
+            cum = np.zeros((len(self.hist), self.buckets + 1))
+            np.cumsum(self.hist, axis=1, out=cum[:, 1:])
+            self._cum_cache = cum
+        return self._cum_cache
+
+    def _set_grid(self, rows, lo, hi):
+        # 两端各留一个桶，保证 lo < 最低价、最高价 < 上沿
+        step = (hi - lo) / (self.buckets - 2)
+        step = np.where(step > 0, step, np.maximum(np.abs(lo), 1.0) * 1e-3)
+        self.lo[rows] = lo - step
+        self.step[rows] = step
+
+    def _regrid(self, rows, low, high):
+        """价格超出网格的股票扩大网格（多留 1/4 余量），按累计分布线性插值重新分桶"""
+        old_edges, old_cum = self._edges()[rows], self._cum()[rows]
+        lo = np.minimum(self.lo[rows], low[rows])
+        hi = np.maximum(self.lo[rows] + self.step[rows] * self.buckets, high[rows])
+        pad = (hi - lo) / 4
+        self._set_grid(rows, np.where(low[rows] <= self.lo[rows], lo - pad, lo),
+                       np.where(high[rows] >= hi, hi + pad, hi))
+        new_edges = self._edges()[rows]
+        self._cum_cache = None
+        for i, row in enumerate(rows):
+            self.hist[row] = np.diff(np.interp(new_edges[i], old_edges[i], old_cum[i]))
+
+
+def _tri_cdf(x, a, b, c):
+    """三角分布 [a, b]、峰值 c 在 x 处的累计概率；a == b 时为 x > a 的阶跃"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        left = (x - a) ** 2 / ((b - a) * (c - a))
+        right = 1 - (b - x) ** 2 / ((b - a) * (b - c))
+    return np.where(x <= a, 0.0, np.where(x >= b, 1.0, np.where(x <= c, left, right)))
+
+
+def chip_indicators(HIGH, LOW, CLOSE, TURNOVER, winner=None, cost=(), peak=False, buckets=BUCKETS):
+    """
+    按K线逐根推进筹码分布，输出每根K线的获利盘比例/成本价/筹码峰
+
+    价格网格按整段历史的最高/最低价一次确定，推进过程中不重新分桶；
+    1800根K线×全市场约5500只股票作为一个面板一次推进
+
+    参数:
+        HIGH, LOW, CLOSE: 1维序列或2维面板（股票×K线，见 tdx_indicator.to_panel）
+        TURNOVER: 换手率（小数，成交量/流通股本），形状同上
+        winner: dict {输出名: 价格序列/面板/常数}，如 {'WINNER_C': CLOSE, 'WINNER_O': OPEN}
+        cost: 成本百分比列表，如 (15, 50, 85)，输出名为 'COST15' 等
+        peak: 是否输出筹码峰价格 'PEAK'
+        buckets: 价格桶数
+
+    返回:
+        dict: {输出名: 序列}，形状与 CLOSE 相同
+    """
+    one_d = np.ndim(CLOSE) == 1
+    HIGH, LOW, CLOSE, TURNOVER = [np.atleast_2d(np.asarray(x, dtype=float)) for x in (HIGH, LOW, CLOSE, TURNOVER)]
+    HIGH, LOW, CLOSE, TURNOVER = np.broadcast_arrays(HIGH, LOW, CLOSE, TURNOVER)
+    winner = {name: np.broadcast_to(np.atleast_2d(np.asarray(p, dtype=float)), CLOSE.shape)
+              for name, p in (winner or {}).items()}
+    out = {name: np.full(CLOSE.shape, np.nan) for name in list(winner) + [f'COST{p}' for p in cost]
+           + (['PEAK'] if peak else [])}
+
+    with np.errstate(invalid='ignore'):
+        lo, hi = np.nanmin(np.fmin(LOW, HIGH), axis=1), np.nanmax(np.fmax(LOW, HIGH), axis=1)
+    chips = ChipDistribution(len(CLOSE), buckets)
+    listed = ~np.isnan(lo)
+    if listed.any():
+        chips._set_grid(np.flatnonzero(listed), lo[listed], hi[listed])
+    avg = np.clip((HIGH + LOW + CLOSE) / 3, LOW, HIGH)
+    for t in range(CLOSE.shape[1]):
+        chips._apply(HIGH[:, t], LOW[:, t], avg[:, t], TURNOVER[:, t])
+        for name, price in winner.items():
+            out[name][:, t] = chips.winner(price[:, t])
+        for p in cost:
+            out[f'COST{p}'][:, t] = chips.cost(p)
+        if peak:
+            out['PEAK'][:, t] = chips.peak()
+    return {name: v[0] for name, v in out.items()} if one_d else out
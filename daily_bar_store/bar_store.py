@@ -0,0 +1,250 @@
+# bar_store.py - 本地日线列式存储
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# 每只股票一个 .npy 文件（结构化数组，按 date 升序），读取时 mmap 打开，只切片需要的区间
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+BAR_DTYPE = np.dtype([
+    ('date', '<i4'),      # 交易日 YYYYMMDD
+    ('open', '<f8'),
+    ('close', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('vol', '<f8'),
+    ('amount', '<f8'),
+])
+
+INIT_OFFSET = 1800   # 首次建库拉取的日线根数
+MAX_OFFSET = 5000    # 补数时最多回溯的根数
+
+_write_lock = threading.Lock()
+_code_locks = {}      # 代码 -> 锁，update_bars 的 读取→拉取→合并→写入 整个过程按股票串行
+
+
+# ==================== 读取接口 ====================
+
+def get_bars(code, start=None, end=None, client=None):
+    """
+    读取指定股票 [start, end] 区间的日线
+
+    参数:
+        code: 股票代码，如 '000400'
+        start: 开始日期，'20260101' / '2026-01-01' / 20260101，None表示不限
+        end: 结束日期，格式同上，None表示不限
+        client: 通达信客户端，传入则先增量补齐到最新再读取
+
+    返回:
+        DataFrame，列: date(int YYYYMMDD), open, close, high, low, vol, amount, datetime
+        本地无数据返回空 DataFrame
+    """
+    if client is not None:
+        update_bars(code, client)
+
+    arr = get_bar_array(code, start, end)
+    if arr is None or len(arr) == 0:
+        return pd.DataFrame(columns=list(BAR_DTYPE.names) + ['datetime'])
+
+    df = pd.DataFrame(np.asarray(arr))
+    # 与 client.bars 的 datetime 格式保持一致，方便原有按日期字符串定位的代码复用
+    date_str = df['date'].astype(str)
+    df['datetime'] = date_str.str[:4] + '-' + date_str.str[4:6] + '-' + date_str.str[6:] + ' 15:00'
+    return df
+
+
+def get_bar_array(code, start=None, end=None):
+    """
+    读取指定股票 [start, end] 区间的日线（结构化数组，mmap 切片，不拷贝）
+
+    参数:
+        code: 股票代码
+        start: 开始日期，None表示不限
+        end: 结束日期，None表示不限
+
+    返回:
+        np.ndarray(dtype=BAR_DTYPE)，本地无数据返回 None
+    """
+    arr = _load(code)
+    if arr is None:
+        return None
+
+    dates = arr['date']
+    lo = 0 if start is None else int(np.searchsorted(dates, _to_int_date(start), side='left'))
+    hi = len(arr) if end is None else int(np.searchsorted(dates, _to_int_date(end), side='right'))
+    return arr[lo:hi]
+
+
+def get_last_date(code):
+    """本地已存储的最后一个交易日（int YYYYMMDD），无数据返回 None"""
+    arr = _load(code)
+    if arr is None or len(arr) == 0:
+        return None
+    return int(arr['date'][-1])
+
+
+# ==================== 写入接口 ====================
+
+def update_bars(code, client, init_offset=INIT_OFFSET):
+    """
+    增量补齐单只股票的日线
+
+    首次建库拉取 init_offset 根；之后只拉取最后存储日期及之后的日线。
+    最后一根会被覆盖重写，因此盘中存入的未完成日线在收盘后补数时会被修正。
+
+    参数:
+        code: 股票代码
+        client: 通达信客户端
+        init_offset: 首次建库拉取根数，默认1800
+
+    返回:
+        int: 新增（含覆盖）的日线根数
+    """
+    with _code_lock(code):      # 同一只股票并发补数时，后写入的一方不会丢掉另一方新增的日线
+        return _update_bars(code, client, init_offset)
+
+
+def _update_bars(code, client, init_offset):
+    old = _load(code)
+    if old is None or len(old) == 0:
+        new = _fetch(code, client, init_offset)
+        if new is None:
+            return 0
+        _save(code, new)
+        return len(new)
+
+    last_date = int(old['date'][-1])
+    # 按自然日估算缺口，工作日换算后多留余量；拉取不到 last_date 说明缺口更大，翻倍重取
+    gap_days = (datetime.now() - datetime.strptime(str(last_date), '%Y%m%d')).days
+    offset = min(gap_days * 5 // 7 + 10, MAX_OFFSET)
+    while True:
+        new = _fetch(code, client, offset)
+        if new is None:
+            return 0
+        if new['date'][0] <= last_date or offset >= MAX_OFFSET:
+            break
+        offset = min(offset * 2, MAX_OFFSET)
+
+    new = new[new['date'] >= last_date]
+    if len(new) == 0:
+        return 0
+    keep = np.array(old[old['date'] < new['date'][0]])
+    del old  # 释放 mmap，Windows 下文件被映射时无法替换
+    _save(code, np.concatenate([keep, new]))
+    return len(new)
+
+
+def update_all(codes, client_factory, workers=5, init_offset=INIT_OFFSET):
+    """
+    批量增量补齐，多线程，每个线程持有独立客户端
+
+    参数:
+        codes: 股票代码列表
+        client_factory: 无参函数，返回新的通达信客户端
+        workers: 线程数，默认5
+        init_offset: 首次建库拉取根数
+
+    返回:
+        tuple: (成功代码列表, 失败代码列表)
+    """
+    local = threading.local()
+
+    def _task(code):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = client_factory()
+            local.client = client
+        try:
+            update_bars(code, client, init_offset)
+            return code, None
+        except Exception as e:
+            return code, e
+
+    success, fail = [], []
+    total = len(codes)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, (code, err) in enumerate(executor.map(_task, codes)):
+            print(f"\r补数中: {i+1}/{total} {code}", end='', flush=True)
+            if err is None:
+                success.append(code)
+            else:
+                print(f"\n[Error] {code}: {err}")
+                fail.append(code)
+    print()
+    return success, fail
+
+
+# ==================== 内部函数 ====================
+
+def _path(code):
+    return os.path.join(STORE_DIR, f"{code}.npy")
+
+
+def _code_lock(code):
+    with _write_lock:
+        return _code_locks.setdefault(code, threading.Lock())
+
+
+def _load(code):
+    path = _path(code)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def _save(code, arr):
+    """先写临时文件再替换，避免读到写了一半的文件"""
+    if not os.path.exists(STORE_DIR):
+        os.makedirs(STORE_DIR, exist_ok=True)
+    path = _path(code)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with _write_lock:
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(arr, dtype=BAR_DTYPE))
+        os.replace(tmp, path)
+
+
+def _fetch(code, client, offset):
+    """从通达信拉取最近 offset 根日线并转为结构化数组"""
+    df = client.bars(symbol=code, frequency='day', offset=offset)
+    if df is None or df.empty:
+        return None
+
+    arr = np.empty(len(df), dtype=BAR_DTYPE)
+    if {'year', 'month', 'day'}.issubset(df.columns):
+        arr['date'] = df['year'].astype(int) * 10000 + df['month'].astype(int) * 100 + df['day'].astype(int)
+    else:
+        arr['date'] = pd.to_datetime(df['datetime']).dt.strftime('%Y%m%d').astype(int)
+    for field in ('open', 'close', 'high', 'low', 'vol', 'amount'):
+        arr[field] = df[field].values
+    return arr
+
+
+def _to_int_date(date):
+    """'20260101' / '2026-01-01' / 20260101 → 20260101"""
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    return int(str(date)[:10].replace('-', ''))
+
+
+if __name__ == "__main__":
+    from day_index import init_create_client
+
+    parser = argparse.ArgumentParser(description="本地日线库增量补数")
+    parser.add_argument("--file", help="股票代码文件路径，每行一个代码", required=True)
+    parser.add_argument("--workers", help="线程数，默认5", type=int, default=5)
+    parser.add_argument("--init_offset", help="首次建库拉取根数，默认1800", type=int, default=INIT_OFFSET)
+    args = parser.parse_args()
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        codes = [line.strip() for line in f if line.strip()]
+
+    ok, failed = update_all(codes, init_create_client, args.workers, args.init_offset)
+    print(f"完成: 成功 {len(ok)} 只, 失败 {len(failed)} 只")
@@ -1,16 +1,25 @@
 import requests
 import json
-from mootdx.quotes import Quotes
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from tdx_client_pool import get_client
+import numpy as np
 import pandas as pd
 # import stock.tdx_indicator as tdx_indicator
 import tdx_indicator as tdx_indicator
+from bar_resample import resample_bars, period_key
+from indicator_engine import compute_indicators
+from indicator_stream import KDJState, MACDState, BBIState
 
 def init_create_client():
     """
     初始化client，用于传入后续的方法
+
+    返回连接池（tdx_client_pool）的代理客户端：每次调用借用池中连到最快服务器的连接，
+    断线时自动换连接重试，可在多个线程间共用
     """
-    client = Quotes.factory(market='std')
-    return client
+    return get_client()
 
 
 def get_cur_price(code, client=""):
@@ -114,17 +123,168 @@ def get_price_and_change_percent(code, client):
     return current_price, change_percent
 
 
+QUOTE_BATCH = 80    # 通达信实时行情单次请求的股票数上限
+
+QUOTE_COLUMNS = (['price', 'prev_close', 'change_pct', 'open', 'high', 'low', 'vol', 'amount']
+                 + [f'{side}{i}' for i in range(1, 6) for side in ('bid', 'ask', 'bid_vol', 'ask_vol')])
+
+# 批量行情的并发线程池，在多次调用之间复用（盯盘时每隔几秒调用一次）
+_quote_executor = None
+_quote_lock = threading.Lock()
+
+
+def get_quotes(codes, client="", workers=4, batch=QUOTE_BATCH):
+    """
+    批量获取多只股票的实时行情快照（自选股/盯盘列表一次刷新）
+
+    每次请求最多 batch 只股票，代码列表按 batch 分批；只有一批时用 client 单次请求，
+    多批时用 workers 个线程并发请求。get_price_and_change_percent 每只股票拉两次日线，这里
+    一批80只股票只需一次请求
+        df = get_quotes(['000400', '600900'], client)
+        df.loc['000400', 'price'], df.loc['000400', 'change_pct']
+
+    参数:
+    codes: 股票代码或代码列表
+    client: 数据客户端，只在单批（或 workers<=1）时使用，默认使用连接池
+    workers: 并发请求数，默认4（连接从连接池借用）
+    batch: 每次请求的股票数，默认80（通达信上限）
+
+    返回:
+    DataFrame: index 为股票代码（按 codes 的顺序），列: price（最新价）, prev_close（昨收）,
+               change_pct（涨跌幅%，昨收为0时为0）, open, high, low, vol, amount,
+               bid1~bid5, ask1~ask5（买卖五档价）, bid_vol1~bid_vol5, ask_vol1~ask_vol5（五档量）；
+               没取到行情的股票整行为NaN
+    """
+    if isinstance(codes, str):
+        codes = [codes]
+    codes = list(dict.fromkeys(codes))
+    chunks = [codes[i:i + batch] for i in range(0, len(codes), batch)]
+
+    if workers <= 1 or len(chunks) <= 1:
+        cli = client or init_create_client()
+        frames = [_fetch_quotes(chunk, cli) for chunk in chunks]
+    else:
+        # 连接池的代理客户端可在线程间共用，每批请求各自借用一个连接
+        cli = init_create_client()
+        frames = list(_quote_pool(workers).map(lambda chunk: _fetch_quotes(chunk, cli), chunks))
+
+    frames = [df for df in frames if df is not None and not df.empty]
+    if not frames:
+        return pd.DataFrame(index=pd.Index(codes, name='code'), columns=list(QUOTE_COLUMNS), dtype=float)
+    df = pd.concat(frames, ignore_index=True).drop_duplicates('code', keep='last').set_index('code')
+    df = df.rename(columns={'last_close': 'prev_close'})
+    prev_close = df['prev_close'].astype(float).replace(0, np.nan)
+    df['change_pct'] = ((df['price'] - prev_close) / prev_close * 100).where(prev_close.notna(), 0.0)
+    return df.reindex(index=pd.Index(codes, name='code'), columns=[c for c in QUOTE_COLUMNS if c in df.columns])
+
+
+def _quote_pool(workers):
+    global _quote_executor
+    with _quote_lock:
+        if _quote_executor is None or _quote_executor._max_workers != workers:
+            if _quote_executor is not None:
+                _quote_executor.shutdown(wait=False)
+            _quote_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='quotes')
+        return _quote_executor
+
+
+def _fetch_quotes(codes, client):
+    """单次请求一批股票的行情"""
+    try:
+        df = client.quotes(symbol=codes)
+    except Exception as e:
+        print(f"[Error] quotes {codes[0]}...({len(codes)}只): {e}")
+        return None
+    if df is None or df.empty or 'code' not in df.columns:
+        return None
+    return df
+
+
+def bar_dates(df):
+    """
+    K线的日期索引 YYYYMMDD(int32)，K线按时间升序，可直接二分查找
+
+    优先用 year/month/day 列（mootdx 返回的K线都有），否则解析 datetime 列的前10个字符
+    """
+    if {'year', 'month', 'day'} <= set(df.columns):
+        return (df['year'].values * 10000 + df['month'].values * 100 + df['day'].values).astype(np.int32)
+    return df['datetime'].astype(str).str[:10].str.replace('-', '').astype(np.int32).values
+
+
+def locate_dates(dates, targets, frequency='day'):
+    """
+    在升序日期索引中二分查找一批日期
+
+    参数:
+    dates: bar_dates 的返回值
+    targets: 日期列表，'2025-01-09' / '20250109' / 20250109
+    frequency: K线周期；'week' / 'mon' 时匹配日期所在的周/月（周线/月线的日期是该周期最后一个交易日），
+               其他周期按日期精确匹配，同一天有多根K线（分钟线）时取当天最后一根
+
+    返回:
+    ndarray[int64]: 每个日期对应的K线位置，找不到或日期格式不合规为 -1
+    """
+    targets = np.array([_date_int(t) for t in targets], dtype=np.int64)
+    out = np.full(len(targets), -1, dtype=np.int64)
+    valid = targets > 0
+    if len(dates) == 0 or not valid.any():
+        return out
+    keys, targets = dates, targets[valid]
+    if frequency in ('week', 'mon'):
+        keys, targets = period_key(dates, frequency), period_key(targets, frequency)
+    pos = np.searchsorted(keys, targets, side='right') - 1
+    found = (pos >= 0) & (keys[np.maximum(pos, 0)] == targets)
+    out[valid] = np.where(found, pos, -1)
+    return out
+
+
+def _date_int(d):
+    # '2025-01-09' / '20250109' / 20250109 -> 20250109，不合规返回 -1
+    text = str(d).replace('-', '')[:8]
+    try:
+        datetime.strptime(text, '%Y%m%d')
+    except ValueError:
+        return -1
+    return int(text)
+
+
+def values_at(df, datestr, frequency, *series):
+    """
+    按日期取指标值
+
+    参数:
+    df: K线 DataFrame（与 series 等长）
+    datestr: "" 取最新一根；单个日期返回该日期的值；日期列表一次二分查找 + 向量化取值
+    frequency: K线周期，见 locate_dates
+    series: 指标序列，如 K, D, J
+
+    返回:
+    单个日期: 每个序列一个值（只有一个序列时直接返回该值），日期无对应K线时打印提示并返回 None
+    日期列表: 每个序列一个数组，与日期列表一一对应，无对应K线的位置为 NaN
+    """
+    if isinstance(datestr, str) and datestr == "":
+        values = tuple(S[-1] for S in series)
+    else:
+        single = isinstance(datestr, (str, int, np.integer))
+        pos = locate_dates(bar_dates(df), [datestr] if single else datestr, frequency)
+        if single:
+            if pos[0] < 0:
+                print("datestr格式不合规 或 该日期没有交易日 或 指定交易日错误")
+                return None
+            values = tuple(S[pos[0]] for S in series)
+        else:
+            values = tuple(np.where(pos >= 0, np.asarray(S, dtype=float)[np.maximum(pos, 0)], np.nan)
+                           for S in series)
+    return values if len(values) > 1 else values[0]
+
+
 """
-datestr = 2025-01-09
-获取最新月kdj 或 指定日期的kdj
+datestr = 2025-01-09 或日期列表 ['2025-01-09', '2025-02-14', ...]
+获取最新月kdj 或 指定日期的kdj（日期列表时返回 K, D, J 三个数组）
 """
 def get_month_kdj(code,datestr="",client=""):
     # client = Quotes.factory(market='std')
-    # 生成自定义的整数索引列
     df = client.bars(symbol=code, frequency='mon', offset=300)  # 获取最近300日东方财富k线
-    custom_index = pd.RangeIndex(start=1, stop=len(df)+1, step=1)
-    # 使用自定义的整数索引列作为索引
-    df.set_index(custom_index, inplace=True)
     try:
         close = df['close']
         high = df['high']
@@ -133,28 +293,16 @@ def get_month_kdj(code,datestr="",client=""):
         # 如果是退市股票，直接返回0
         return (0,0,0)
     K, D, J = tdx_indicator.KDJ(close, high, low)
-    if(datestr==""):
-        return K[-1],D[-1],J[-1]
-    else:
-        try:
-            index = df[df['datetime'].str.contains(datestr)].index-1
-            return K[index][0],D[index][0],J[index][0]
-        except:
-            print("datestr格式不合规 或 该日期没有交易日 或 指定交易日错误")
+    return values_at(df, datestr, 'mon', K, D, J)
 
 
 """
-datestr = 2025-01-09
-获取最新周kdj 或 指定日期的kdj
+datestr = 2025-01-09 或日期列表 ['2025-01-09', '2025-02-14', ...]
+获取最新周kdj 或 指定日期的kdj（日期列表时返回 K, D, J 三个数组）
 """
 def get_week_kdj(code,datestr="",client=""):
     # client = Quotes.factory(market='std')
-    # 生成自定义的整数索引列
-
     df = client.bars(symbol=code, frequency='week', offset=300)  # 获取最近300日东方财富k线
-    custom_index = pd.RangeIndex(start=1, stop=len(df)+1, step=1)
-    # 使用自定义的整数索引列作为索引
-    df.set_index(custom_index, inplace=True)
     try:
         close = df['close']
         high = df['high']
@@ -163,31 +311,18 @@ def get_week_kdj(code,datestr="",client=""):
         # 如果是退市股票，直接返回0
         return (0,0,0)
     K, D, J = tdx_indicator.KDJ(close, high, low)
-    if(datestr==""):
-        # print(J[-1])
-        return K[-1],D[-1],J[-1]
-    else:
-        try:
-            index = df[df['datetime'].str.contains(datestr)].index-1
-            # print(J[index])
-            return K[index][0],D[index][0],J[index][0]
-        except:
-            print("datestr格式不合规 或 该日期没有交易日 或 指定交易日错误")
+    return values_at(df, datestr, 'week', K, D, J)
 
 
 
 """
-datestr = 2025-01-09
-获取最新日kdj 或 指定日期的kdj
+datestr = 2025-01-09 或日期列表 ['2025-01-09', '2025-02-14', ...]
+获取最新日kdj 或 指定日期的kdj（日期列表时返回 K, D, J 三个数组）
 """
 
 def get_day_kdj(code,datestr="",client=""):
     # client = Quotes.factory(market='std')
-    # 生成自定义的整数索引列
     df = client.bars(symbol=code, frequency='day', offset=300)  # 获取最近300日东方财富k线
-    custom_index = pd.RangeIndex(start=1, stop=len(df)+1, step=1)
-    # 使用自定义的整数索引列作为索引
-    df.set_index(custom_index, inplace=True)
     try:
         close = df['close']
         high = df['high']
@@ -196,16 +331,7 @@ def get_day_kdj(code,datestr="",client=""):
         # 如果是退市股票，直接返回0
         return (0,0,0)
     K, D, J = tdx_indicator.KDJ(close, high, low)
-    if(datestr==""):
-        # print(J[-1])
-        return K[-1],D[-1],J[-1]
-    else:
-        try:
-            index = df[df['datetime'].str.contains(datestr)].index-1
-            # print(J[index])
-            return K[index][0],D[index][0],J[index][0]
-        except:
-            print("datestr格式不合规 或 该日期没有交易日 或 指定交易日错误")
+    return values_at(df, datestr, 'day', K, D, J)
 
 """
 已废弃，接口需要充值，已更新自己的公式api
@@ -235,52 +361,140 @@ def get_day_kdj_api_back(code,date_str):
 
 def get_day_macd(code,datestr="",client=""):
     # client = Quotes.factory(market='std')
-    # 生成自定义的整数索引列
     df = client.bars(symbol=code, frequency='day', offset=300)  # 获取最近300日东方财富k线
-    custom_index = pd.RangeIndex(start=1, stop=len(df)+1, step=1)
-    # 使用自定义的整数索引列作为索引
-    df.set_index(custom_index, inplace=True)
     try:
         close = df['close']
     except:
         # 如果是退市股票，直接返回0
         return (0,0,0)
     DIF,DEA,MACD = tdx_indicator.MACD(close)
-    if(datestr==""):
-        # print(J[-1])
-        return DIF[-1],DEA[-1],MACD[-1]
-    else:
-        try:
-            index = df[df['datetime'].str.contains(datestr)].index-1
-            # print(index)
-            # print(J[index])
-            return DIF[index][0],DEA[index][0],MACD[index][0]
-        except:
-            print("datestr格式不合规 或 该日期没有交易日 或 指定交易日错误")
+    return values_at(df, datestr, 'day', DIF, DEA, MACD)
 
 def get_day_bbi(code,datestr="",client=""):
     # client = Quotes.factory(market='std')
-    # 生成自定义的整数索引列
     df = client.bars(symbol=code, frequency='day', offset=300)  # 获取最近300日东方财富k线
-    custom_index = pd.RangeIndex(start=1, stop=len(df)+1, step=1)
-    # 使用自定义的整数索引列作为索引
-    df.set_index(custom_index, inplace=True)
     try:
         close = df['close']
     except:
         # 如果是退市股票，直接返回0
         return (0,0,0)
     BBI = tdx_indicator.BBI(close)
-    if(datestr==""):
-        return BBI[-1]
-    else:
+    return values_at(df, datestr, 'day', BBI)
+
+def get_day_indicator_stream(code, client="", offset=300):
+    """
+    用最近 offset 根日线初始化日线 KDJ/MACD/BBI 的增量计算器
+
+    盘中反复刷新时不必每次重新拉取300根K线整段重算，只需用最新价更新最后一根日线（每次约几微秒）:
+        streams = get_day_indicator_stream(code, client)
+        K, D, J = streams['KDJ'].update(price, high, low, new_bar=False)
+        DIF, DEA, MACD = streams['MACD'].update(price, new_bar=False)
+        BBI = streams['BBI'].update(price, new_bar=False)
+    初始化时最后一根日线若是昨天（开盘前初始化），当天第一次更新用 new_bar=True
+
+    参数:
+    code: 股票代码
+    client: 数据客户端
+    offset: 初始化用的K线数，默认300
+
+    返回:
+    dict: {'KDJ': KDJState, 'MACD': MACDState, 'BBI': BBIState}，无数据（如退市股票）返回 None
+    """
+    df = client.bars(symbol=code, frequency='day', offset=offset)
+    if df is None or df.empty or 'close' not in df.columns:
+        return None
+    close, high, low = df['close'].values, df['high'].values, df['low'].values
+    streams = {'KDJ': KDJState(), 'MACD': MACDState(), 'BBI': BBIState()}
+    streams['KDJ'].seed(close, high, low)
+    streams['MACD'].seed(close)
+    streams['BBI'].seed(close)
+    return streams
+
+def get_multi_kdj(code, datestr="", client="", frequencies=('day', 'week', 'mon'), offset=800):
+    """
+    多周期KDJ：只拉取一次日线，周线/月线由日线本地合成（含当前未走完的周/月）
+
+    get_day_kdj / get_week_kdj / get_month_kdj 各拉取一次K线，这里一次拉取 offset 根日线代替三次请求。
+    800根日线约合160周、38个月，KDJ的SMA平滑对初值的影响按(2/3)^n衰减，月线KDJ与直接拉月线的结果一致到小数点后几位
+
+    参数:
+    code: 股票代码
+    datestr: 日期，如 '2025-01-09'，或日期列表，默认最新；周线/月线取该日期所在的周/月
+    client: 数据客户端
+    frequencies: 周期列表，'day' / 'week' / 'mon'
+    offset: 拉取的日线根数，默认800（单次请求上限）
+
+    返回:
+    dict: {周期: (K, D, J)}，日期列表时 K, D, J 为数组；退市股票等无数据时各周期为 (0,0,0)，
+          datestr 无对应K线时该周期为 None
+    """
+    df = client.bars(symbol=code, frequency='day', offset=offset)
+    if df is None or df.empty or 'close' not in df.columns:
+        return {freq: (0, 0, 0) for freq in frequencies}
+    df = df.reset_index(drop=True)
+    result = {}
+    for freq in frequencies:
+        # 拉满 offset 根时第一个周/月多半不完整，丢弃；不足 offset 根说明从上市第一天开始，保留
+        bars = df if freq == 'day' else resample_bars(df, freq, drop_first=len(df) >= offset)
+        K, D, J = tdx_indicator.KDJ(bars['close'], bars['high'], bars['low'])
+        result[freq] = values_at(bars, datestr, freq, K, D, J)
+    return result
+
+def get_indicator_snapshot(codes, date="", indicators=('KDJ', 'MACD', 'BBI'), frequencies=('day',),
+                           client="", workers=8, offset=300):
+    """
+    批量获取多只股票、多个周期的指标值，每只股票每个周期只拉取一次K线
+
+    get_day_kdj / get_day_macd / get_day_bbi 各自拉取一次同样的300根K线，这里一次拉取后
+    用 indicator_engine 计算全部指标（共享的中间序列也只算一次）；多只股票时多线程并发拉取
+        df = get_indicator_snapshot(['000400', '600900'], indicators=['KDJ', 'MACD', 'BBI', 'MA(20)'],
+                                    frequencies=['day', 'week'])
+
+    参数:
+    codes: 股票代码或代码列表
+    date: 日期（'2025-01-09' / 20250109）或日期列表，默认最新一根K线；周线/月线取日期所在的周/月
+    indicators: 指标列表，格式见 indicator_engine.compute_indicators，默认 KDJ/MACD/BBI
+    frequencies: 周期列表，如 ['day', 'week', 'mon']，默认日线
+    client: 数据客户端，默认使用连接池（线程安全，各线程共用）；workers>1 时传入的客户端也须线程安全
+    workers: 并发线程数，默认8
+    offset: 拉取的K线数，默认300
+
+    返回:
+    DataFrame: 每个 (股票, 周期[, 日期]) 一行，列: code, frequency, [date,] datetime, 各指标输出列
+               （K, D, J, DIF, DEA, MACD, BBI ...），按 codes、frequencies、date 的顺序排列；
+               无数据（如退市股票）或该日期无K线时指标列为NaN
+    """
+    if isinstance(codes, str):
+        codes = [codes]
+    tasks = [(code, freq) for code in codes for freq in frequencies]
+
+    dates = [] if isinstance(date, str) and date == "" else [date] if isinstance(date, (str, int)) else list(date)
+
+    def _snapshot(code, freq, cli):
+        rows = [{'code': code, 'frequency': freq, 'date': d, 'datetime': None} for d in dates] or \
+               [{'code': code, 'frequency': freq, 'datetime': None}]
         try:
-            index = df[df['datetime'].str.contains(datestr)].index-1
-            # print(index)
-            # print(J[index])
-            return BBI[index][0]
-        except:
-            print("datestr格式不合规 或 该日期没有交易日 或 指定交易日错误")
+            df = cli.bars(symbol=code, frequency=freq, offset=offset)
+            if df is None or df.empty or 'close' not in df.columns:
+                return rows
+            df = df.reset_index(drop=True)
+            positions = locate_dates(bar_dates(df), dates, freq) if dates else [len(df) - 1]
+            values = compute_indicators(df, indicators)
+            for row, pos in zip(rows, positions):
+                if pos >= 0:
+                    row['datetime'] = df['datetime'].iloc[pos]
+                    row.update(values.iloc[pos].to_dict())
+        except Exception as e:
+            print(f"[Error] {code} {freq}: {e}")
+        return rows
+
+    cli = client or init_create_client()
+    if workers <= 1 or len(tasks) <= 1:
+        results = [_snapshot(code, freq, cli) for code, freq in tasks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(lambda task: _snapshot(*task, cli), tasks))
+    return pd.DataFrame([row for rows in results for row in rows])
 
 # print(get_day_kdj("000400", "2024-12-18"))
 
@@ -0,0 +1,183 @@
+# indicator_engine.py - 指标批量计算引擎（声明式指标列表 -> 依赖图，共享中间序列只算一次）
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import re
+import numpy as np
+import pandas as pd
+import tdx_indicator as tdx_indicator
+
+# 可作为依赖图节点的基础函数，节点名形如 'MA(close,5)'、'SMA(RSV(9),3,1)'
+PRIMITIVES = {
+    'MA': tdx_indicator.MA,
+    'EMA': tdx_indicator.EMA,
+    'SMA': tdx_indicator.SMA,
+    'HHV': tdx_indicator.HHV,
+    'LLV': tdx_indicator.LLV,
+    'REF': tdx_indicator.REF,
+    'STD': tdx_indicator.STD,
+    'SUM': tdx_indicator.SUM,
+}
+
+INDICATORS = {}   # 指标名 -> 计算函数 fn(graph, *params) -> {输出列名: 序列}
+
+
+class IndicatorGraph:
+    """
+    一只股票一次计算的依赖图
+
+    节点按名字缓存：同名节点（同一函数、同一输入、同一参数）无论被多少个指标引用都只计算一次。
+    基础列（close/high/low/...）直接作为节点，其余节点通过 node()/derive() 按需创建。
+    """
+
+    def __init__(self, bars):
+        self.columns = bars
+        self.cache = {}
+        self.hits = 0   # 命中缓存的次数，用于观察共享程度
+
+    def __getitem__(self, name):
+        if name in self.cache:
+            return self.cache[name]
+        value = np.asarray(self.columns[name], dtype=float)
+        self.cache[name] = value
+        return value
+
+    def node(self, op, src, *params):
+        """
+        基础函数节点：PRIMITIVES[op](self[src], *params)
+
+        参数:
+            op: 函数名，如 'MA'
+            src: 输入节点名，基础列名或其他节点名
+            params: 函数参数
+
+        返回:
+            str: 节点名，用 graph[name] 取值
+        """
+        name = f"{op}({','.join([src] + [str(p) for p in params])})"
+        if name in self.cache:
+            self.hits += 1
+        else:
+            self.cache[name] = PRIMITIVES[op](self[src], *params)
+        return name
+
+    def derive(self, name, fn):
+        """
+        自定义表达式节点：fn() 的结果缓存在 name 下
+
+        返回:
+            str: 节点名
+        """
+        if name in self.cache:
+            self.hits += 1
+        else:
+            self.cache[name] = fn()
+        return name
+
+
+def register_indicator(name, fn):
+    """
+    注册指标，注册后可在 compute_indicators 的 spec 中使用
+
+    参数:
+        name: 指标名，如 'KDJ'
+        fn: 计算函数 fn(graph, *params)，通过 graph.node()/graph.derive() 取中间序列，
+            返回 {输出列名: 序列}
+    """
+    INDICATORS[name] = fn
+
+
+def parse_spec(item):
+    """
+    解析单个指标声明
+
+    'KDJ' -> ('KDJ', ())，'MA(5)' / 'MA5' -> ('MA', (5,))，('KDJ', 9, 3, 3) -> ('KDJ', (9, 3, 3))
+    """
+    if isinstance(item, (tuple, list)):
+        return item[0], tuple(item[1:])
+    item = item.strip()
+    if item in INDICATORS:
+        return item, ()
+    m = re.fullmatch(r'(\w+?)\((.*)\)', item) or re.fullmatch(r'([A-Za-z_]+)(\d+)', item)
+    if m is None or m.group(1) not in INDICATORS:
+        raise ValueError(f"未知指标: {item}")
+    params = tuple(_parse_number(p) for p in m.group(2).split(',') if p.strip())
+    return m.group(1), params
+
+
+def compute_indicators(bars, spec):
+    """
+    按声明式指标列表批量计算指标
+
+    所有指标共用一张依赖图，MA(close,n)、EMA(close,n)、HHV/LLV(high/low,n)、SMA链等
+    中间序列在整批指标中只计算一次
+
+    参数:
+        bars: DataFrame 或 dict，包含指标用到的列（open/close/high/low/vol/amount）
+        spec: 指标列表，如 ['KDJ', 'MACD', 'BBI', 'MA(5)', 'MA(250)', ('KDJ', 9, 3, 3)]
+
+    返回:
+        DataFrame: 所有指标的输出列，行与 bars 对齐（bars 为 DataFrame 时沿用其 index）
+    """
+    graph = IndicatorGraph(bars)
+    outputs = {}
+    for item in spec:
+        name, params = parse_spec(item)
+        outputs.update(INDICATORS[name](graph, *params))
+    index = bars.index if isinstance(bars, pd.DataFrame) else None
+    return pd.DataFrame(outputs, index=index)
+
+
+def _parse_number(val):
+    val = val.strip()
+    try:
+        return int(val)
+    except ValueError:
+        return float(val)
+
+
+# ==================== 内置指标 ====================
+
+def _ma(g, N):
+    return {f'MA{N}': g[g.node('MA', 'close', N)]}
+
+
+def _ema(g, N):
+    return {f'EMA{N}': g[g.node('EMA', 'close', N)]}
+
+
+def _kdj(g, N=9, M1=3, M2=3):
+    llv, hhv = g.node('LLV', 'low', N), g.node('HHV', 'high', N)
+    rsv = g.derive(f'RSV({N})', lambda: (g['close'] - g[llv]) / (g[hhv] - g[llv]) * 100)
+    k = g.node('SMA', rsv, M1, 1)
+    d = g.node('SMA', k, M2, 1)
+    return {'K': g[k], 'D': g[d], 'J': 3 * g[k] - 2 * g[d]}
+
+
+def _macd(g, SHORT=12, LONG=26, MID=9):
+    short, long = g.node('EMA', 'close', SHORT), g.node('EMA', 'close', LONG)
+    dif = g.derive(f'DIF({SHORT},{LONG})', lambda: g[short] - g[long])
+    dea = g.node('EMA', dif, MID)
+    return {'DIF': g[dif], 'DEA': g[dea], 'MACD': (g[dif] - g[dea]) * 2}
+
+
+def _bbi(g, M1=3, M2=6, M3=12, M4=24):
+    ma = [g[g.node('MA', 'close', m)] for m in (M1, M2, M3, M4)]
+    return {'BBI': (ma[0] + ma[1] + ma[2] + ma[3]) / 4}
+
+
+def _rsi(g, N1=6, N2=12, N3=24):
+    lc = g.node('REF', 'close', 1)
+    up = g.derive('UP(close)', lambda: np.maximum(g['close'] - g[lc], 0))
+    move = g.derive('ABSDIFF(close)', lambda: np.abs(g['close'] - g[lc]))
+    return {f'RSI{i}': g[g.node('SMA', up, n, 1)] / g[g.node('SMA', move, n, 1)] * 100
+            for i, n in enumerate((N1, N2, N3), 1)}
+
+
+register_indicator('MA', _ma)
+register_indicator('EMA', _ema)
+register_indicator('KDJ', _kdj)
+register_indicator('MACD', _macd)
+register_indicator('BBI', _bbi)
+register_indicator('RSI', _rsi)
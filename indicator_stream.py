@@ -0,0 +1,237 @@
+# indicator_stream.py - 增量指标计算（用历史K线初始化后，每根新K线/盘中每个tick O(1) 更新）
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import math
+from collections import deque
+
+# 所有状态对象的约定：
+#   已收盘的K线折叠进内部状态，最后一根（可能仍在变化的）K线单独保存，指标值 = 内部状态 + 最后一根
+#   update(..., new_bar=True)  新开一根K线：原最后一根确认收盘并折叠进内部状态
+#   update(..., new_bar=False) 替换最后一根K线（盘中同一根K线价格变化），第一次调用时等同新开
+#   seed(...)                  用历史K线初始化，历史的最后一根仍可被 new_bar=False 替换
+# 结果与 tdx_indicator 中对应函数对整段序列计算后的最后一个值一致
+
+
+class _Stream:
+    """
+    单个序列状态的基类，子类实现两个方法：
+        _commit(*bar)  最后一根K线确认收盘，把它的输入折叠进内部状态
+        _calc(*bar)    用内部状态加上最后一根K线计算当前指标值，不修改内部状态
+    """
+
+    def __init__(self):
+        self._pending = None    # 最后一根K线的输入，None表示还没有数据
+        self.value = math.nan
+
+    def update(self, *bar, new_bar=True):
+        if new_bar and self._pending is not None:
+            self._commit(*self._pending)
+        self._pending = bar
+        self.value = self._calc(*bar)
+        return self.value
+
+    def seed(self, *series):
+        """用历史序列初始化（多个序列时按K线逐根对齐，如 close, high, low）"""
+        for bar in zip(*series):
+            self.update(*bar)
+        return self.value
+
+
+# ==================== 基础函数 ====================
+
+class EWMState(_Stream):
+    """
+    指数加权平均 y = (1-alpha)*y' + alpha*x，对应 pandas ewm(alpha, adjust=False)
+
+    NaN 输入的处理与 pandas 一致：输出沿用上一个值，之后的衰减把缺失的周期计算在内
+    """
+
+    def __init__(self, alpha):
+        super().__init__()
+        self.alpha = alpha
+        self._mean = math.nan   # 已收盘部分的加权均值
+        self._old_wt = 1.0
+
+    def _step(self, x):
+        mean, old_wt = self._mean, self._old_wt
+        if mean == mean:
+            old_wt *= 1 - self.alpha
+        if x != x:
+            return mean, old_wt
+        if mean != mean:
+            return x, 1.0
+        if mean != x:
+            mean = (old_wt * mean + self.alpha * x) / (old_wt + self.alpha)
+        return mean, 1.0
+
+    def _commit(self, x):
+        self._mean, self._old_wt = self._step(x)
+
+    def _calc(self, x):
+        return self._step(x)[0]
+
+
+class EMAState(EWMState):
+    """EMA(S, N)，alpha = 2/(N+1)"""
+
+    def __init__(self, N):
+        super().__init__(2 / (N + 1))
+
+
+class SMAState(EWMState):
+    """中国式 SMA(S, N, M)，alpha = M/N"""
+
+    def __init__(self, N, M=1):
+        super().__init__(M / N)
+
+
+class MAState(_Stream):
+    """MA(S, N) N周期简单移动平均，窗口未满或窗口内有NaN时为NaN"""
+
+    def __init__(self, N):
+        super().__init__()
+        self.N = N
+        self._window = deque()  # 最近 N-1 根已收盘K线
+        self._sum = 0.0
+        self._nan = 0           # 窗口内NaN个数
+
+    def _commit(self, x):
+        self._window.append(x)
+        if x != x:
+            self._nan += 1
+        else:
+            self._sum += x
+        if len(self._window) >= self.N:
+            old = self._window.popleft()
+            if old != old:
+                self._nan -= 1
+            else:
+                self._sum -= old
+
+    def _calc(self, x):
+        if len(self._window) < self.N - 1 or self._nan or x != x:
+            return math.nan
+        return (self._sum + x) / self.N
+
+
+class _ExtremeState(_Stream):
+    """HHV/LLV 的单调队列实现，均摊 O(1)"""
+
+    def __init__(self, N, is_max):
+        super().__init__()
+        self.N = N
+        self.is_max = is_max
+        self._queue = deque()   # (序号, 值)，只保存最近 N-1 根已收盘K线中可能成为极值的
+        self._count = 0         # 已收盘K线数
+        self._last_nan = -1     # 最近一根NaN的序号
+
+    def _better(self, a, b):
+        return a >= b if self.is_max else a <= b
+
+    def _commit(self, x):
+        i = self._count
+        self._count += 1
+        if x != x:
+            self._last_nan = i
+        else:
+            while self._queue and self._better(x, self._queue[-1][1]):
+                self._queue.pop()
+            self._queue.append((i, x))
+        # 下一根K线的窗口为 [count-N+1, count]，已收盘部分只需保留序号 > count-N 的
+        while self._queue and self._queue[0][0] <= self._count - self.N:
+            self._queue.popleft()
+
+    def _calc(self, x):
+        if self._count < self.N - 1 or x != x or self._last_nan > self._count - self.N:
+            return math.nan
+        if not self._queue:
+            return x
+        best = self._queue[0][1]
+        return x if self._better(x, best) else best
+
+
+class HHVState(_ExtremeState):
+    """HHV(S, N) N周期最高值"""
+
+    def __init__(self, N):
+        super().__init__(N, True)
+
+
+class LLVState(_ExtremeState):
+    """LLV(S, N) N周期最低值"""
+
+    def __init__(self, N):
+        super().__init__(N, False)
+
+
+# ==================== 指标 ====================
+
+class _Composite:
+    """由多个子状态组合的指标，子状态与本对象同步 new_bar，不单独维护已收盘状态"""
+
+    def seed(self, *series):
+        for bar in zip(*series):
+            self.update(*bar)
+        return self.value
+
+
+class KDJState(_Composite):
+    """
+    KDJ(CLOSE, HIGH, LOW, N, M1, M2)
+
+    用法:
+        kdj = KDJState()
+        kdj.seed(df['close'], df['high'], df['low'])
+        k, d, j = kdj.update(close, high, low, new_bar=False)   # 盘中刷新当天K线
+    """
+
+    def __init__(self, N=9, M1=3, M2=3):
+        self.hhv = HHVState(N)
+        self.llv = LLVState(N)
+        self.k = SMAState(M1, 1)
+        self.d = SMAState(M2, 1)
+        self.value = (math.nan, math.nan, math.nan)
+
+    def update(self, close, high, low, new_bar=True):
+        hhv = self.hhv.update(high, new_bar=new_bar)
+        llv = self.llv.update(low, new_bar=new_bar)
+        denom = hhv - llv
+        if denom == 0:
+            rsv = math.nan if close == llv else math.copysign(math.inf, close - llv)
+        else:
+            rsv = (close - llv) / denom * 100
+        k = self.k.update(rsv, new_bar=new_bar)
+        d = self.d.update(k, new_bar=new_bar)
+        self.value = (k, d, 3 * k - 2 * d)
+        return self.value
+
+
+class MACDState(_Composite):
+    """MACD(CLOSE, SHORT, LONG, MID)，update 返回 (DIF, DEA, MACD)"""
+
+    def __init__(self, SHORT=12, LONG=26, MID=9):
+        self.short = EMAState(SHORT)
+        self.long = EMAState(LONG)
+        self.dea = EMAState(MID)
+        self.value = (math.nan, math.nan, math.nan)
+
+    def update(self, close, new_bar=True):
+        dif = self.short.update(close, new_bar=new_bar) - self.long.update(close, new_bar=new_bar)
+        dea = self.dea.update(dif, new_bar=new_bar)
+        self.value = (dif, dea, (dif - dea) * 2)
+        return self.value
+
+
+class BBIState(_Composite):
+    """BBI(CLOSE, M1, M2, M3, M4) 多空均线"""
+
+    def __init__(self, M1=3, M2=6, M3=12, M4=24):
+        self.ma = [MAState(m) for m in (M1, M2, M3, M4)]
+        self.value = math.nan
+
+    def update(self, close, new_bar=True):
+        ma = [state.update(close, new_bar=new_bar) for state in self.ma]
+        self.value = (ma[0] + ma[1] + ma[2] + ma[3]) / 4
+        return self.value
@@ -0,0 +1,212 @@
+# minute_archive.py - 分时数据本地归档（按交易日一个定长数组文件，mmap 读取）
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# 每个交易日两个文件：
+#   {date}.npy   形状 (capacity, 240, len(FIELDS)) 的 float64 数组，第 i 行是第 i 只股票的全天分时
+#   {date}.codes 文本文件，第 i 行是第 i 行数据对应的股票代码；数据行先写入，代码后追加，
+#                因此读到的代码对应的行一定是完整的
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'archive')
+
+FIELDS = ('price', 'vol')
+MINUTES_PER_DAY = 240
+INIT_CAPACITY = 256   # 初始行数，写满后按2倍扩容
+
+_lock = threading.Lock()
+_cache = {}           # date -> (codes文件大小, {code: row}, memmap)
+
+
+# ==================== 读取接口 ====================
+
+def get_archived_minute_data(code, date):
+    """
+    从归档读取指定股票指定日期的分时数据
+
+    参数:
+        code: 股票代码，如 '000400'
+        date: 日期字符串，如 '20260420'
+
+    返回:
+        DataFrame，包含 price, vol 列（240行）；未归档返回 None
+    """
+    with _lock:
+        index, data = _open(date)
+        if data is None or code not in index:
+            return None
+        row = np.array(data[index[code]])
+
+    return pd.DataFrame({field: row[:, i] for i, field in enumerate(FIELDS)})
+
+
+def list_archived_codes(date):
+    """列出指定日期已归档的股票代码"""
+    with _lock:
+        index, _ = _open(date)
+    return list(index.keys())
+
+
+def is_archivable(date, df):
+    """只归档已收盘日期的完整240分钟数据，当天盘中数据仍在变化不归档"""
+    if df is None or len(df) != MINUTES_PER_DAY:
+        return False
+    return date < datetime.now().strftime('%Y%m%d')
+
+
+# ==================== 写入接口 ====================
+
+def archive_minute_data(code, date, df):
+    """
+    将单只股票一天的分时数据写入归档（已存在则跳过）
+
+    参数:
+        code: 股票代码
+        date: 日期字符串，如 '20260420'
+        df: 分时 DataFrame，必须包含 FIELDS 中的列，且为240行
+
+    返回:
+        bool: 是否写入
+    """
+    if len(df) != MINUTES_PER_DAY:
+        return False
+    row = np.column_stack([df[field].values.astype(float) for field in FIELDS])
+
+    with _lock:
+        index, data = _open(date)
+        if code in index:
+            return False
+
+        n = len(index)
+        if data is None or n >= data.shape[0]:
+            capacity = INIT_CAPACITY if data is None else data.shape[0] * 2
+            existing = None if data is None else np.array(data[:n])
+            # 先释放旧 mmap 再扩容替换，Windows 下文件被映射时无法替换
+            _cache.pop(date, None)
+            del data
+            data = _grow(date, existing, capacity)
+
+        data[n] = row
+        data.flush()
+        with open(_codes_path(date), 'a', encoding='utf-8') as f:
+            f.write(code + '\n')
+        index[code] = n
+        _cache[date] = (os.path.getsize(_codes_path(date)), index, data)
+    return True
+
+
+def build_archive(codes, date, client_factory, workers=8):
+    """
+    批量下载并归档一个交易日的全市场分时数据，多线程，每个线程持有独立客户端
+
+    参数:
+        codes: 股票代码列表
+        date: 日期字符串，如 '20260420'
+        client_factory: 无参函数，返回新的通达信客户端
+        workers: 线程数，默认8
+
+    返回:
+        int: 新归档的股票数
+    """
+    done = set(list_archived_codes(date))
+    todo = [c for c in codes if c not in done]
+    local = threading.local()
+
+    def _task(code):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = client_factory()
+            local.client = client
+        try:
+            df = client.minutes(symbol=code, date=date)
+            if is_archivable(date, df):
+                return archive_minute_data(code, date, df)
+        except Exception as e:
+            print(f"\n[Error] {code}: {e}")
+        return False
+
+    count = 0
+    total = len(todo)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, (code, ok) in enumerate(zip(todo, executor.map(_task, todo))):
+            print(f"\r归档中: {i+1}/{total} {code}", end='', flush=True)
+            count += int(ok)
+    print()
+    return count
+
+
+# ==================== 内部函数 ====================
+
+def _data_path(date):
+    return os.path.join(ARCHIVE_DIR, f"{date}.npy")
+
+
+def _codes_path(date):
+    return os.path.join(ARCHIVE_DIR, f"{date}.codes")
+
+
+def _open(date):
+    """
+    打开指定日期的归档（调用方需持有 _lock）
+
+    codes 文件大小未变时直接复用缓存的索引和 mmap，否则重新加载
+
+    返回:
+        tuple: ({code: row}, memmap)，不存在返回 ({}, None)
+    """
+    codes_path = _codes_path(date)
+    if not os.path.exists(codes_path) or not os.path.exists(_data_path(date)):
+        return {}, None
+
+    size = os.path.getsize(codes_path)
+    cached = _cache.get(date)
+    if cached is not None and cached[0] == size:
+        return cached[1], cached[2]
+
+    with open(codes_path, 'r', encoding='utf-8') as f:
+        codes = [line.strip() for line in f if line.strip()]
+    index = {code: i for i, code in enumerate(codes)}
+    data = np.load(_data_path(date), mmap_mode='r+')
+    _cache[date] = (size, index, data)
+    return index, data
+
+
+def _grow(date, existing, capacity):
+    """扩容（调用方需持有 _lock）：新建 capacity 行的文件，写入已有数据后替换"""
+    if not os.path.exists(ARCHIVE_DIR):
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    path = _data_path(date)
+    tmp = path + '.tmp'
+    new = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64,
+                                    shape=(capacity, MINUTES_PER_DAY, len(FIELDS)))
+    if existing is not None:
+        new[:len(existing)] = existing
+    new.flush()
+    del new
+    os.replace(tmp, path)
+    if not os.path.exists(_codes_path(date)):
+        open(_codes_path(date), 'w', encoding='utf-8').close()
+    return np.load(path, mmap_mode='r+')
+
+
+if __name__ == "__main__":
+    from day_index import init_create_client
+
+    parser = argparse.ArgumentParser(description="分时数据归档工具")
+    parser.add_argument("--file", help="股票代码文件路径，每行一个代码", required=True)
+    parser.add_argument("--date", help="日期，格式 YYYYMMDD", required=True)
+    parser.add_argument("--workers", help="线程数，默认8", type=int, default=8)
+    args = parser.parse_args()
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        codes = [line.strip() for line in f if line.strip()]
+
+    count = build_archive(codes, args.date, init_create_client, args.workers)
+    print(f"{args.date} 新归档 {count} 只，累计 {len(list_archived_codes(args.date))} 只")
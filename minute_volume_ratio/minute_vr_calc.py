@@ -78,6 +78,23 @@ def calc_volume_ratio(minute_df, avg_vol_per_minute):
     return df
 
 
+def calc_volume_ratio_matrix(vol, time_index, avg_vol_per_minute):
+    """
+    批量计算多只股票每一分钟的量比（矩阵版 calc_volume_ratio，结果逐元素一致）
+
+    参数:
+        vol: 二维数组 (股票数, 分钟数)，每分钟成交量
+        time_index: 一维数组 (分钟数,)，时间序号
+        avg_vol_per_minute: 一维数组 (股票数,)，各股票过去n日每分钟平均成交量
+
+    返回:
+        二维数组 (股票数, 分钟数)，量比（保留2位小数）
+    """
+    cumulative_vol = np.cumsum(np.asarray(vol, dtype=float), axis=1)
+    avg = np.asarray(avg_vol_per_minute, dtype=float)[:, None]
+    return np.round(cumulative_vol / np.asarray(time_index)[None, :] / avg, 2)
+
+
 # ==================== 查询接口 ====================
 
 def get_volume_ratio_at_time(df, hour, minute):
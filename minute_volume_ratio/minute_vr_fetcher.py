@@ -4,6 +4,9 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from day_index import init_create_client
+from daily_bar_store.bar_store import get_bar_array
+from minute_volume_ratio.minute_archive import get_archived_minute_data, archive_minute_data, is_archivable
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
@@ -12,6 +15,8 @@ def get_minute_data(code, date, client):
     """
     获取指定股票指定日期的分时数据
 
+    已收盘日期优先读本地归档（minute_archive），未归档的从通达信下载后写入归档
+
     参数:
         code: 股票代码，如 '000400'
         date: 日期字符串，如 '20260420'
@@ -20,10 +25,14 @@ def get_minute_data(code, date, client):
     返回:
         DataFrame，包含 open, close, high, low, vol, hour, minute, trade_date
     """
-    df = client.minutes(symbol=code, date=date)
-    if df is None or df.empty:
-        print(f"[Fetcher] 未获取到 {code} 在 {date} 的分时数据")
-        return pd.DataFrame()
+    df = get_archived_minute_data(code, date)
+    if df is None:
+        df = client.minutes(symbol=code, date=date)
+        if df is None or df.empty:
+            print(f"[Fetcher] 未获取到 {code} 在 {date} 的分时数据")
+            return pd.DataFrame()
+        if is_archivable(date, df):
+            archive_minute_data(code, date, df)
 
     # 补全 hour, minute 字段
     hours = []
@@ -50,6 +59,7 @@ def get_prev_n_day_vol(code, n=5, client=None, date=None):
     获取足够多的日线数据，根据目标日期定位：
       vol_list = 目标日期前 n 日成交量（用于计算分钟均量）
       prev_close = 目标日期前一交易日的收盘价（即昨收价）
+    指定了历史日期且本地日线库已覆盖该日期时直接读本地，不再请求通达信
 
     参数:
         code: 股票代码
@@ -62,6 +72,11 @@ def get_prev_n_day_vol(code, n=5, client=None, date=None):
             vol_list: 过去n个交易日的成交量列表
             prev_close: 昨收价（目标日期前一交易日收盘价）
     """
+    if date:
+        day_data = _get_prev_n_day_vol_from_store(code, n, date)
+        if day_data is not None:
+            return day_data
+
     # 多取一些数据确保能覆盖目标日期
     offset = n + 50 if date else n + 1
     df = client.bars(symbol=code, frequency='day', offset=offset)
@@ -94,6 +109,30 @@ def get_prev_n_day_vol(code, n=5, client=None, date=None):
     return {'vol_list': vol_list, 'prev_close': prev_close}
 
 
+def _get_prev_n_day_vol_from_store(code, n, date):
+    """
+    从本地日线库读取目标日期前n日成交量及昨收价，逻辑与 get_prev_n_day_vol 一致
+
+    本地库中目标日期之后已有数据（或恰好存到目标日期）才认为覆盖完整，否则返回 None 走网络
+    """
+    arr = get_bar_array(code)
+    if arr is None or len(arr) == 0:
+        return None
+
+    dates = arr['date']
+    target = int(date)
+    loc = int(np.searchsorted(dates, target, side='right')) - 1
+    if loc < n:
+        return None
+    if dates[loc] != target and loc == len(arr) - 1:
+        return None
+
+    rows = arr[loc - n:loc + 1]
+    vol_list = rows['vol'].tolist()[:n]
+    prev_close = float(rows['close'][n - 1])
+    return {'vol_list': vol_list, 'prev_close': prev_close}
+
+
 def _get_trade_hour_minute(index):
     """
     根据分时数据索引计算交易小时和分钟
@@ -1,5 +1,5 @@
 # fetcher.py
-from day_index import get_cur_price, init_create_client
+from day_index import get_cur_price, get_quotes, init_create_client
 
 def get_current_price(stock_code: str, client) -> float:
     try:
@@ -9,6 +9,15 @@ def get_current_price(stock_code: str, client) -> float:
         print(f"[Fetcher] Error getting price for {stock_code}: {e}")
         return None
 
+def get_current_prices(stock_codes, client) -> dict:
+    """一次批量请求所有任务股票的最新价，返回 {股票代码: 价格}，取不到的股票为 None"""
+    try:
+        prices = get_quotes(list(stock_codes), client)['price']
+        return {code: (None if price != price else float(price)) for code, price in prices.items()}
+    except Exception as e:
+        print(f"[Fetcher] Error getting quotes: {e}")
+        return {code: None for code in stock_codes}
+
 def init_client():
     return init_create_client()
 
@@ -38,16 +38,19 @@ def evaluate_condition(task, current_price: float) -> (bool, str):
 
 
 # scheduler.py
-def monitor_task(task, client):
+def monitor_task(task, client, prices=None):
+    """prices 为本轮批量取到的 {股票代码: 价格}，不传时单独请求该股票"""
     if not task.get("enabled", True):
         return
+    if prices is not None:
+        current_price = prices.get(task["stock_code"])
+    else:
+        current_price = fetcher.get_current_price(task["stock_code"], client)
     if task.get("notified", False):
         # 已经通知过，此任务跳过通知，仅更新 last_price 或不处理
-        current_price = fetcher.get_current_price(task["stock_code"], client)
         task["last_price"] = current_price
         return
 
-    current_price = fetcher.get_current_price(task["stock_code"], client)
     triggered, reason = evaluate_condition(task, current_price)
     if triggered:
         notifier.notify(task, current_price, reason)
@@ -60,10 +63,11 @@ def start_monitoring():
     client = fetcher.init_client()
     while True:
         tasks = task_manager.list_tasks()
+        # 所有启用任务的股票一次批量取价，每只股票每轮只请求一次
+        codes = {task["stock_code"] for task in tasks if task.get("enabled", True)}
+        prices = fetcher.get_current_prices(codes, client) if codes else {}
         for task in tasks:
-            monitor_task(task, client)
-            # 可以为每个任务启动线程或串行执行
-            monitor_task(task, client)
+            monitor_task(task, client, prices)
         # 保存 updated last_price
         task_manager.storage.save_tasks(tasks)
         time.sleep(DEFAULT_FREQUENCY_SEC)
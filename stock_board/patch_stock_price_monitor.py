@@ -6,7 +6,7 @@ import time
 
 # 如果 day_index 在上层目录（与你原来写法一致），保持导入
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from day_index import init_create_client, get_price_and_change_percent
+from day_index import init_create_client, get_quotes
 
 def clear_screen():
     """跨平台清屏：Windows 使用 cls，其他系统使用 clear"""
@@ -86,14 +86,20 @@ def monitor_stock_prices(stock_data, interval):
             # print(header)
             # print("-" * len(header))
 
-            # 获取并打印所有股票的最新数据（每只一行）
+            # 所有股票的行情一次批量获取，再逐只打印（每只一行）
+            try:
+                quotes = get_quotes([code for code, _ in stock_data], client)
+                error = None
+            except Exception as e:
+                quotes, error = None, e
             for code, name in stock_data:
-                try:
-                    price, change = get_price_and_change_percent(code, client)
-                    line = format_stock_line(code, name, price, change)
-                except Exception as e:
+                if quotes is None:
                     # 获取失败时显示错误信息，但仍占据一行
-                    line = f"{code:8s} {name:20s} 获取失败: {str(e)}"
+                    line = f"{code:8s} {name:20s} 获取失败: {str(error)}"
+                elif quotes.loc[code].isna().all():
+                    line = f"{code:8s} {name:20s} 获取失败: 无行情数据"
+                else:
+                    line = format_stock_line(code, name, quotes.at[code, 'price'], quotes.at[code, 'change_pct'])
                 print(line)
 
             # 底部提示（不占用无穷行）
@@ -14,7 +14,7 @@ from io import BytesIO
 
 # 如果 day_index 在上层目录，保持导入
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from day_index import init_create_client, get_price_and_change_percent
+from day_index import init_create_client, get_quotes
 
 
 class StockMonitorGUI:
@@ -373,16 +373,31 @@ class StockMonitorGUI:
 		refresh_thread = threading.Thread(target=self.refresh_stock_data, daemon=True)
 		refresh_thread.start()
 	
+	def fetch_quotes(self):
+		"""所有股票的行情一次批量获取，返回 {股票代码: (价格, 涨跌幅) 或 错误信息}"""
+		codes = [widget['data'][0] for widget in self.stock_widgets]
+		try:
+			quotes = get_quotes(codes, self.client)
+		except Exception as e:
+			return {code: str(e) for code in codes}
+		result = {}
+		for code, row in quotes.iterrows():
+			if row.isna().all():
+				result[code] = "无行情数据"
+			else:
+				result[code] = (row['price'], row['change_pct'])
+		return result
+	
 	def refresh_stock_data(self):
 		"""刷新股票数据"""
 		try:
+			quotes = self.fetch_quotes()
 			for widget in self.stock_widgets:
-				code, name = widget['data']
-				try:
-					price, change = get_price_and_change_percent(code, self.client)
-					self.update_stock_row(widget, price, change)
-				except Exception as e:
-					self.update_stock_row_error(widget, str(e))
+				quote = quotes[widget['data'][0]]
+				if isinstance(quote, tuple):
+					self.update_stock_row(widget, *quote)
+				else:
+					self.update_stock_row_error(widget, quote)
 			
 			self.update_time_label()
 		
@@ -396,17 +411,17 @@ class StockMonitorGUI:
 		
 		while self.monitoring:
 			try:
+				quotes = self.fetch_quotes()
 				for widget in self.stock_widgets:
 					if not self.monitoring:
 						break
 					
-					code, name = widget['data']
-					try:
-						price, change = get_price_and_change_percent(code, self.client)
+					quote = quotes[widget['data'][0]]
+					if isinstance(quote, tuple):
 						# 在主线程中更新界面
-						self.root.after(0, self.update_stock_row, widget, price, change)
-					except Exception as e:
-						self.root.after(0, self.update_stock_row_error, widget, str(e))
+						self.root.after(0, self.update_stock_row, widget, *quote)
+					else:
+						self.root.after(0, self.update_stock_row_error, widget, quote)
 				
 				# 更新时间
 				self.root.after(0, self.update_time_label)
@@ -2,11 +2,14 @@ import pandas as pd
 import numpy as np
 import requests
 import json
-from mootdx.quotes import Quotes
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tdx_client_pool import get_client
 
 def init_create_client():
-    client = Quotes.factory(market='std')
-    return client
+    return get_client()
 
 
 import pandas as pd
@@ -2,7 +2,11 @@ import pandas as pd
 import numpy as np
 import requests
 import json
-from mootdx.quotes import Quotes
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tdx_client_pool import get_client
 
 import pandas as pd
 from openpyxl import Workbook
@@ -10,8 +14,7 @@ from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.styles import Font, Alignment
 
 def init_create_client():
-    client = Quotes.factory(market='std')
-    return client
+    return get_client()
 
 
 def get_stock_performance(client, code, date_str, n_days):
@@ -0,0 +1,263 @@
+# backtest.py - 量比策略多日回测（逐日扫描命中 + 后续N日收益/回撤统计）
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from daily_bar_store.bar_store import get_bar_array, update_all
+from day_index import init_create_client
+from tdx_client_pool import ClientPool
+from scanner import load_market_data, evaluate_market
+from sweep import expand_grid, parse_grid
+
+
+def get_trading_days(start, end, codes, sample=20):
+    """
+    从本地日线库取 [start, end] 区间内的交易日
+
+    取前 sample 只有数据的股票的日期并集，避免单只股票停牌导致漏日
+
+    参数:
+        start: 开始日期，如 '20250101'
+        end: 结束日期，如 '20251231'
+        codes: 股票代码列表
+        sample: 参与取日期的股票数，默认20
+
+    返回:
+        list[str]: 交易日列表，格式 'YYYYMMDD'，升序
+    """
+    days = set()
+    found = 0
+    for code in codes:
+        arr = get_bar_array(code, start, end)
+        if arr is None or len(arr) == 0:
+            continue
+        days.update(int(d) for d in arr['date'])
+        found += 1
+        if found >= sample:
+            break
+    return [str(d) for d in sorted(days)]
+
+
+def backtest(codes, start, end, strategy_id, configs, holds=(1, 3, 5), n=5, until_hour=None,
+             until_minute=None, change_min=-100, change_max=100, procs=None, workers=4):
+    """
+    回测：对区间内每个交易日扫描所有参数组合，记录命中并计算后续持有收益
+
+    买入价为扫描时刻价格（全天扫描即收盘价，--until 时为截至时刻价格），
+    持有 N 日收益 = 第N个交易日收盘价 / 买入价 - 1，
+    持有期回撤 = 持有期内最低价 / 买入价 - 1
+
+    参数:
+        codes: 股票代码列表
+        start: 开始日期，如 '20250101'
+        end: 结束日期，如 '20251231'
+        strategy_id: 策略ID
+        configs: 参数组合列表 list[dict]
+        holds: 持有天数列表，默认 (1, 3, 5)
+        n: 过去n个交易日，默认5
+        until_hour: 截至时间-小时，None表示全天
+        until_minute: 截至时间-分钟，None表示全天
+        change_min: 涨幅下限(%)
+        change_max: 涨幅上限(%)
+        procs: 进程数（按日期并行），None=CPU核数
+        workers: 每个进程内加载数据的并发连接数（仅本地未缓存时用到）
+
+    返回:
+        DataFrame: 每条命中一行，列: config, date, code, score, change_pct, entry, ret_N, dd_N ...
+    """
+    days = get_trading_days(start, end, codes)
+    if not days:
+        print("本地日线库无该区间数据，请先用 --update 补数")
+        return pd.DataFrame()
+
+    tasks = [(date, codes, strategy_id, configs, tuple(holds), n, until_hour, until_minute,
+              change_min, change_max) for date in days]
+
+    frames = []
+    total = len(tasks)
+    if procs == 1:
+        _init_worker(workers)
+        outputs = map(_backtest_day, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=procs, initializer=_init_worker, initargs=(workers,))
+        outputs = executor.map(_backtest_day, tasks)
+    try:
+        for i, (date, df) in enumerate(zip(days, outputs)):
+            print(f"\r回测中: {i+1}/{total} {date}  命中 {len(df)} 条", end='', flush=True)
+            frames.append(df)
+    finally:
+        if procs == 1:
+            _close_worker()
+        else:
+            executor.shutdown()
+    print()
+
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def summarize(signals, configs, holds=(1, 3, 5)):
+    """
+    按参数组合汇总回测结果
+
+    参数:
+        signals: backtest 的返回值
+        configs: 参数组合列表
+        holds: 持有天数列表
+
+    返回:
+        DataFrame: 每个参数组合一行，参数列 + 命中数/命中天数 + 各持有期的胜率、收益均值/中位数、平均/最大回撤（%）
+    """
+    rows = []
+    for config_id, params in enumerate(configs):
+        row = dict(params)
+        sub = signals[signals['config'] == config_id] if not signals.empty else signals
+        row['命中数'] = len(sub)
+        row['命中天数'] = sub['date'].nunique() if len(sub) else 0
+        for hold in holds:
+            ret = sub[f'ret_{hold}'].dropna().values if len(sub) else np.array([])
+            dd = sub[f'dd_{hold}'].dropna().values if len(sub) else np.array([])
+            if len(ret):
+                row[f'{hold}日胜率%'] = round(float(np.mean(ret > 0)) * 100, 1)
+                row[f'{hold}日收益均值%'] = round(float(np.mean(ret)) * 100, 2)
+                row[f'{hold}日收益中位%'] = round(float(np.median(ret)) * 100, 2)
+                row[f'{hold}日平均回撤%'] = round(float(np.mean(dd)) * 100, 2)
+                row[f'{hold}日最大回撤%'] = round(float(np.min(dd)) * 100, 2)
+            else:
+                for key in ('胜率%', '收益均值%', '收益中位%', '平均回撤%', '最大回撤%'):
+                    row[f'{hold}日{key}'] = None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def forward_returns(code, date, entry, holds):
+    """
+    计算买入后各持有期的收益和回撤（读取本地日线库）
+
+    参数:
+        code: 股票代码
+        date: 买入日期，如 '20250520'
+        entry: 买入价
+        holds: 持有天数列表
+
+    返回:
+        dict: {'ret_N': float, 'dd_N': float, ...}，后续日线不足的持有期为 NaN
+    """
+    result = {}
+    arr = get_bar_array(code, start=int(date) + 1)
+    max_hold = max(holds)
+    bars = arr[:max_hold] if arr is not None else []
+    for hold in holds:
+        if len(bars) >= hold and entry > 0:
+            result[f'ret_{hold}'] = float(bars['close'][hold - 1]) / entry - 1
+            result[f'dd_{hold}'] = min(float(np.min(bars['low'][:hold])) / entry - 1, 0.0)
+        else:
+            result[f'ret_{hold}'] = np.nan
+            result[f'dd_{hold}'] = np.nan
+    return result
+
+
+_worker = {}    # 本进程复用的 {'pool', 'client', 'executor'}，由 _init_worker 创建
+
+
+def _init_worker(workers):
+    """
+    子进程初始化：创建本进程的连接池和加载线程池，所有交易日的任务共用，不再每天重新建连
+
+    连接池在子进程内新建，不复用父进程（如 --update 补数时）创建的全局连接池，避免多个进程共用同一个 socket
+    """
+    workers = max(workers, 1)
+    pool = ClientPool(size=workers)
+    _worker.update(pool=pool, client=pool.client(), executor=ThreadPoolExecutor(max_workers=workers))
+
+
+def _close_worker():
+    executor, pool = _worker.pop('executor', None), _worker.pop('pool', None)
+    _worker.pop('client', None)
+    if executor is not None:
+        executor.shutdown()
+    if pool is not None:
+        pool.close()
+
+
+def _backtest_day(task):
+    """子进程：加载一个交易日的数据，评估所有参数组合并计算后续收益（连接和线程池见 _init_worker）"""
+    (date, codes, strategy_id, configs, holds, n, until_hour, until_minute,
+     change_min, change_max) = task
+
+    market = load_market_data(codes, date, n, until_hour, until_minute, verbose=False,
+                              client=_worker.get('client'), executor=_worker.get('executor'))
+    entry_price = {}
+    for group in market:
+        for code, last_price in zip(group['codes'], group['price'][:, -1]):
+            entry_price[code] = float(last_price)
+
+    rows = []
+    for config_id, params in enumerate(configs):
+        for r in evaluate_market(market, strategy_id, change_min, change_max, date, **params):
+            entry = entry_price[r['code']]
+            row = {'config': config_id, 'date': date, 'code': r['code'], 'score': r['score'],
+                   'change_pct': r['change_pct'], 'entry': entry}
+            row.update(forward_returns(r['code'], date, entry, holds))
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="量比策略多日回测")
+    parser.add_argument("--strategy", help="策略: vr_slope / vr_anomaly，默认vr_slope", default="vr_slope")
+    parser.add_argument("--file", help="股票代码文件路径，每行一个代码", required=True)
+    parser.add_argument("--start", help="开始日期 YYYYMMDD", required=True)
+    parser.add_argument("--end", help="结束日期 YYYYMMDD", required=True)
+    parser.add_argument("--hold", help="持有天数，逗号分隔，默认1,3,5", default="1,3,5")
+    parser.add_argument("--n", help="过去n个交易日，默认5", type=int, default=5)
+    parser.add_argument("--until", help="截至时间，格式 HH:MM，模拟盘中该时间点买入", default="")
+    parser.add_argument("--change_min", help="涨幅下限(%%)，默认-100不限", type=float, default=-100)
+    parser.add_argument("--change_max", help="涨幅上限(%%)，默认100不限", type=float, default=100)
+    parser.add_argument("--grid", help="参数网格，如 --grid window=3,4 vr_slope=4,5；不传则用策略默认参数",
+                        nargs='*', default=[])
+    parser.add_argument("--procs", help="按日期并行的进程数，默认CPU核数", type=int, default=None)
+    parser.add_argument("--workers", help="每个进程的并发连接数，默认4", type=int, default=4)
+    parser.add_argument("--update", help="回测前先增量补齐本地日线库", action="store_true")
+    parser.add_argument("--csv", help="导出汇总和逐条命中明细到data目录", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        codes = [line.strip() for line in f if line.strip()]
+
+    until_hour, until_minute = None, None
+    if args.until:
+        parts = args.until.split(':')
+        until_hour, until_minute = int(parts[0]), int(parts[1])
+
+    holds = [int(h) for h in args.hold.split(',') if h.strip()]
+    configs = expand_grid(parse_grid(args.grid)) if args.grid else [{}]
+
+    if args.update:
+        update_all(codes, init_create_client)
+
+    print("策略: %s  区间: %s ~ %s  股票数: %d  参数组合: %d  持有: %s日" % (
+        args.strategy, args.start, args.end, len(codes), len(configs), args.hold))
+
+    signals = backtest(codes, args.start, args.end, args.strategy, configs, holds, args.n,
+                       until_hour, until_minute, args.change_min, args.change_max, args.procs, args.workers)
+    summary = summarize(signals, configs, holds)
+
+    print("-" * 140)
+    print(summary.to_string(index=False))
+    print("-" * 140)
+
+    if args.csv:
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        name = f"backtest_{args.strategy}_{args.start}_{args.end}"
+        summary.to_csv(os.path.join(data_dir, f"{name}.csv"), index=False)
+        signals.to_csv(os.path.join(data_dir, f"{name}_signals.csv"), index=False)
+        print(f"已导出: data/{name}.csv, data/{name}_signals.csv")
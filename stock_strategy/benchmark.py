@@ -0,0 +1,278 @@
+# benchmark.py - 策略 evaluate 性能基准 + 与逐窗口循环实现的一致性校验
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import math
+import timeit
+import numpy as np
+import pandas as pd
+from minute_volume_ratio.minute_vr_calc import calc_volume_ratio, calc_volume_ratio_matrix
+from strategies import get_strategy, get_batch_strategy
+from strategies import vr_slope as slope_strategy
+from strategies import vr_anomaly as anomaly_strategy
+
+
+# ==================== 合成数据 ====================
+
+def make_minute_frame(seed=0, minutes=240):
+    """
+    生成一天的合成分时数据（随机游走价格 + 对数正态成交量），并计算量比
+
+    参数:
+        seed: 随机种子
+        minutes: 分钟数，默认240（全天）
+
+    返回:
+        DataFrame，包含 price, vol, hour, minute, trade_date, time_index, cumulative_vol, volume_ratio
+    """
+    rng = np.random.default_rng(seed)
+    price = np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.002, minutes))), 2)
+    vol = np.round(rng.lognormal(8, 1, minutes))
+    # 9:30 起的分钟序号，跳过午休（11:30 之后接 13:00）
+    offset = np.arange(minutes) + 9 * 60 + 30
+    offset[120:] += 90
+
+    df = pd.DataFrame({
+        'price': price,
+        'vol': vol,
+        'hour': offset // 60,
+        'minute': offset % 60,
+        'trade_date': '2026-04-20',
+    })
+    return calc_volume_ratio(df, avg_vol_per_minute=AVG_VOL)
+
+
+AVG_VOL = float(np.exp(8.5))
+
+
+# ==================== 逐窗口循环参考实现 ====================
+
+def legacy_vr_slope(df, window=3, vr_slope=5, vr_up=True, price_up=True, min_hits=3, merge_gap=2):
+    """vr_slope.evaluate 向量化之前的逐窗口循环实现，仅用于一致性校验和速度对比"""
+    if df is None or len(df) < window + 1:
+        return None
+
+    price = df['price'].values
+    volume_ratio = df['volume_ratio'].values
+    time_index = df['time_index'].values
+    hour = df['hour'].values.astype(int)
+    minute = df['minute'].values.astype(int)
+
+    price_slope = slope_strategy._slope(time_index, price) / np.mean(price)
+    slope_threshold = math.tan(math.radians(vr_slope))
+
+    total_windows = len(df) - window
+    hit_count = 0
+    hit_indices = []
+    hit_slopes_deg = []
+
+    for i in range(total_windows):
+        end = i + window - 1
+        vr_start = volume_ratio[i]
+        vr_end = volume_ratio[end]
+        slope = (vr_end - vr_start) / (window - 1)
+        if slope < slope_threshold:
+            continue
+        if vr_up and vr_end <= vr_start:
+            continue
+        if price_up and price[end] < price[i]:
+            continue
+        hit_count += 1
+        hit_indices.append(i)
+        hit_slopes_deg.append(math.degrees(math.atan(slope)))
+
+    if hit_count < min_hits:
+        return None
+
+    hit_periods = slope_strategy._merge_indices_to_periods(hit_indices, window, hour, minute, merge_gap)
+    avg_vr_slope_deg = np.mean(hit_slopes_deg)
+    score = avg_vr_slope_deg * hit_count * price_slope
+
+    return {
+        'score': round(score, 4),
+        'avg_vr_slope_deg': round(avg_vr_slope_deg, 1),
+        'hit_windows': hit_count,
+        'total_windows': total_windows,
+        'price_slope': round(price_slope, 6),
+        'hit_periods': hit_periods,
+    }
+
+
+def legacy_vr_anomaly(df, window=3, steep=5, turn=8, price_up=True, min_hits=1, merge_gap=2):
+    """vr_anomaly.evaluate 向量化之前的逐位置循环实现，仅用于一致性校验和速度对比"""
+    if df is None or len(df) < 2 * window:
+        return None
+
+    price = df['price'].values
+    volume_ratio = df['volume_ratio'].values
+    hour = df['hour'].values.astype(int)
+    minute = df['minute'].values.astype(int)
+
+    time_index = df['time_index'].values
+    price_slope = anomaly_strategy._slope(time_index, price) / np.mean(price)
+
+    total_positions = len(df) - 2 * window + 1
+    hit_count = 0
+    hit_indices = []
+    hit_types = []
+    hit_angles = []
+
+    for i in range(total_positions):
+        front_end = i + window - 1
+        front_slope = (volume_ratio[front_end] - volume_ratio[i]) / (window - 1)
+        front_angle = math.degrees(math.atan(front_slope))
+
+        back_start = i + window
+        back_end = i + 2 * window - 1
+        back_slope = (volume_ratio[back_end] - volume_ratio[back_start]) / (window - 1)
+        back_angle = math.degrees(math.atan(back_slope))
+
+        if price_up and price[back_end] < price[back_start]:
+            continue
+
+        is_steep = back_angle >= steep
+        is_turn = (front_angle < 0 and back_angle > 0 and
+                   (back_angle - front_angle) >= turn)
+
+        if is_steep or is_turn:
+            hit_count += 1
+            hit_indices.append(i)
+            if is_steep and is_turn:
+                hit_types.append('both')
+                hit_angles.append(max(back_angle, back_angle - front_angle))
+            elif is_steep:
+                hit_types.append('steep')
+                hit_angles.append(back_angle)
+            else:
+                hit_types.append('turn')
+                hit_angles.append(back_angle - front_angle)
+
+    if hit_count < min_hits:
+        return None
+
+    steep_count = sum(1 for t in hit_types if t in ('steep', 'both'))
+    turn_count = sum(1 for t in hit_types if t in ('turn', 'both'))
+    max_angle_diff = max(hit_angles)
+
+    hit_periods = anomaly_strategy._merge_indices_to_periods(hit_indices, window, hour, minute, merge_gap)
+    score = max_angle_diff * hit_count * (1 + price_slope)
+
+    return {
+        'score': round(score, 4),
+        'steep_hits': steep_count,
+        'turn_hits': turn_count,
+        'max_angle_diff': round(max_angle_diff, 1),
+        'hit_windows': hit_count,
+        'total_windows': total_positions,
+        'price_slope': round(price_slope, 6),
+        'hit_periods': hit_periods,
+    }
+
+
+# 策略ID -> (当前实现, 循环参考实现, 校验用参数组合)
+CASES = {
+    'vr_slope': (slope_strategy.evaluate, legacy_vr_slope, [
+        {},
+        {'window': 2, 'vr_slope': 0},
+        {'window': 5, 'vr_slope': 1, 'min_hits': 1},
+        {'window': 3, 'vr_slope': 3, 'vr_up': False, 'price_up': False},
+        {'window': 10, 'vr_slope': 0.5, 'merge_gap': 5},
+    ]),
+    'vr_anomaly': (anomaly_strategy.evaluate, legacy_vr_anomaly, [
+        {},
+        {'window': 2, 'steep': 3, 'turn': 5},
+        {'window': 5, 'steep': 1, 'turn': 2, 'min_hits': 3},
+        {'window': 3, 'steep': 10, 'turn': 4, 'price_up': False},
+        {'window': 8, 'steep': 0.5, 'turn': 1, 'merge_gap': 5},
+    ]),
+}
+
+
+# ==================== 校验 + 计时 ====================
+
+def check_equal(strategy_id, seeds=200):
+    """
+    在多组随机数据 × 参数组合上比较当前实现与循环参考实现的输出，返回不一致的条数
+    """
+    fn, legacy_fn, param_list = CASES[strategy_id]
+    mismatch = 0
+    for seed in range(seeds):
+        df = make_minute_frame(seed)
+        for params in param_list:
+            if fn(df, **params) != legacy_fn(df, **params):
+                mismatch += 1
+                print(f"[不一致] {strategy_id} seed={seed} params={params}")
+    return mismatch
+
+
+def bench(strategy_id, frames=100, number=5):
+    """
+    计时：frames 组合成的 240 分钟数据逐只 evaluate，返回单只股票平均耗时（微秒）
+
+    合成数据中命中与不命中的股票都有，接近全市场扫描时的实际情况
+
+    返回:
+        tuple: (当前实现耗时, 循环实现耗时)
+    """
+    fn, legacy_fn, _ = CASES[strategy_id]
+    dfs = [make_minute_frame(seed) for seed in range(frames)]
+    total = frames * number
+    t_new = timeit.timeit(lambda: [fn(df) for df in dfs], number=number) / total * 1e6
+    t_old = timeit.timeit(lambda: [legacy_fn(df) for df in dfs], number=number) / total * 1e6
+    return t_new, t_old
+
+
+def bench_batch(strategy_id, stocks=1000, number=3):
+    """
+    批量模式计时：stocks 只合成股票，逐只（calc_volume_ratio + evaluate）与矩阵（calc_volume_ratio_matrix
+    + evaluate_batch）两种方式的全市场总耗时（毫秒），同时校验两种方式结果一致
+
+    返回:
+        tuple: (批量耗时, 逐只耗时, 是否一致)
+    """
+    fn = get_strategy(strategy_id)
+    batch_fn = get_batch_strategy(strategy_id)
+    raw = [make_minute_frame(seed)[['price', 'vol', 'hour', 'minute', 'trade_date']] for seed in range(stocks)]
+    price = np.array([df['price'].values for df in raw])
+    vol = np.array([df['vol'].values for df in raw])
+    first = make_minute_frame(0)
+    time_index, hour, minute = first['time_index'].values, first['hour'].values, first['minute'].values
+    avg_vol = np.full(stocks, AVG_VOL)
+
+    def _per_stock():
+        return [fn(calc_volume_ratio(df, AVG_VOL)) for df in raw]
+
+    def _batch():
+        volume_ratio = calc_volume_ratio_matrix(vol, time_index, avg_vol)
+        return batch_fn(price, volume_ratio, time_index, hour, minute)
+
+    same = _per_stock() == _batch()
+    t_batch = timeit.timeit(_batch, number=number) / number * 1e3
+    t_single = timeit.timeit(_per_stock, number=number) / number * 1e3
+    return t_batch, t_single, same
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="策略 evaluate 性能基准")
+    parser.add_argument("--strategy", help="策略ID，默认全部", choices=list(CASES.keys()), default=None)
+    parser.add_argument("--seeds", help="一致性校验的随机数据组数，默认200", type=int, default=200)
+    parser.add_argument("--frames", help="计时用的合成股票数，默认100", type=int, default=100)
+    parser.add_argument("--number", help="计时重复次数，默认5", type=int, default=5)
+    parser.add_argument("--stocks", help="批量模式计时的合成股票数，默认1000", type=int, default=1000)
+    args = parser.parse_args()
+
+    ids = [args.strategy] if args.strategy else list(CASES.keys())
+    print(f"{'策略':<12} {'一致性':>8} {'向量化(us)':>12} {'循环(us)':>10} {'加速':>7}")
+    for sid in ids:
+        mismatch = check_equal(sid, args.seeds)
+        t_new, t_old = bench(sid, args.frames, args.number)
+        status = 'OK' if mismatch == 0 else f'{mismatch}处'
+        print(f"{sid:<12} {status:>8} {t_new:>12.1f} {t_old:>10.1f} {t_old / t_new:>6.1f}x")
+
+    print(f"\n{'批量模式':<12} {'一致性':>8} {'矩阵(ms)':>10} {'逐只(ms)':>10} {'加速':>7}   ({args.stocks}只)")
+    for sid in ids:
+        t_batch, t_single, same = bench_batch(sid, args.stocks)
+        print(f"{sid:<12} {'OK' if same else '不一致':>8} {t_batch:>10.1f} {t_single:>10.1f} {t_single / t_batch:>6.1f}x")
@@ -23,6 +23,8 @@ if __name__ == "__main__":
     parser.add_argument("--change_min", help="涨幅下限(%%)，默认-100不限", type=float, default=-100)
     parser.add_argument("--change_max", help="涨幅上限(%%)，默认100不限", type=float, default=100)
     parser.add_argument("-p", "--print_codes", help="额外打印命中股票代码和名称", action="store_true")
+    parser.add_argument("--workers", help="并发连接数，默认1（串行），全市场扫描建议8~16", type=int, default=1)
+    parser.add_argument("--batch", help="批量模式：先加载全部数据再用矩阵一次评估", action="store_true", default=False)
 
     # vr_slope 策略参数
     parser.add_argument("--vr_slope_window", help="[vr_slope] 窗口大小（分钟），默认3", type=int, default=3)
@@ -120,7 +122,8 @@ if __name__ == "__main__":
 
     # 扫描
     results = scan(codes, date, strategy_id, args.n, until_hour=until_hour, until_minute=until_minute,
-                   change_min=args.change_min, change_max=args.change_max, **strategy_kwargs)
+                   change_min=args.change_min, change_max=args.change_max, workers=args.workers,
+                   batch=args.batch, **strategy_kwargs)
 
     # 输出
     print_results(results, strategy_id, date)
@@ -19,6 +19,8 @@ CONFIG = {
     'change_max': 100,               # 涨幅上限(%)
     'csv': False,                    # True=导出CSV
     'output': True,                  # True=导出命中个股代码
+    'workers': 8,                    # 并发连接数，1=串行
+    'batch': False,                  # True=批量模式（加载全部数据后矩阵一次评估）
 
     # vr_slope 策略参数
     'vr_slope_window': 4,            # 窗口大小（分钟）
@@ -136,7 +138,7 @@ def main():
     results = scan(codes, date, strategy_id, cfg['n'],
                    until_hour=until_hour, until_minute=until_minute,
                    change_min=cfg['change_min'], change_max=cfg['change_max'],
-                   **strategy_kwargs)
+                   workers=cfg['workers'], batch=cfg['batch'], **strategy_kwargs)
 
     # 输出
     print_results(results, strategy_id, date)
@@ -3,11 +3,15 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from day_index import init_create_client
 from minute_volume_ratio.minute_vr_fetcher import get_minute_data, get_prev_n_day_vol
-from minute_volume_ratio.minute_vr_calc import calc_avg_vol_per_minute, calc_volume_ratio
-from strategies import get_strategy
+from minute_volume_ratio.minute_vr_calc import (calc_avg_vol_per_minute, calc_volume_ratio,
+                                                calc_time_index, calc_volume_ratio_matrix)
+from strategies import get_strategy, get_batch_strategy
 
 
 def _load_stock_names():
@@ -20,7 +24,8 @@ def _load_stock_names():
     return dict(zip(df['代码'], df['名称']))
 
 
-def scan(codes, date, strategy_id, n=5, until_hour=None, until_minute=None, change_min=-100, change_max=100, **strategy_kwargs):
+def scan(codes, date, strategy_id, n=5, until_hour=None, until_minute=None, change_min=-100, change_max=100,
+         workers=1, batch=False, **strategy_kwargs):
     """
     扫描股票列表，按策略评分
 
@@ -33,14 +38,38 @@ def scan(codes, date, strategy_id, n=5, until_hour=None, until_minute=None, chan
         until_minute: 截至时间-分钟，None表示全天
         change_min: 涨幅下限(%)，默认-100不限
         change_max: 涨幅上限(%)，默认100不限
+        workers: 并发连接数，默认1（串行）；>1 时每个线程独立持有一个通达信客户端
+        batch: 批量模式，先加载全部股票数据组成矩阵，再用策略的 evaluate_batch 一次评估，结果与逐只评估一致
         **strategy_kwargs: 策略参数，透传给策略的evaluate函数
 
     返回:
         list[dict]: 命中结果，按 score 降序排列
     """
+    stock_names = _load_stock_names()
+
+    if batch:
+        results = _scan_batch(codes, date, strategy_id, n, until_hour, until_minute,
+                              change_min, change_max, stock_names, workers, **strategy_kwargs)
+        results.sort(key=lambda x: x['score'], reverse=True)
+        return results
+
     strategy_fn = get_strategy(strategy_id)
+    if workers > 1:
+        results = _scan_parallel(codes, date, strategy_fn, n, until_hour, until_minute,
+                                 change_min, change_max, stock_names, workers, **strategy_kwargs)
+    else:
+        results = _scan_serial(codes, date, strategy_fn, n, until_hour, until_minute,
+                               change_min, change_max, stock_names, **strategy_kwargs)
+
+    # 按综合评分降序（sort 为稳定排序，同分时保持 codes 原顺序，与串行结果一致）
+    results.sort(key=lambda x: x['score'], reverse=True)
+    return results
+
+
+def _scan_serial(codes, date, strategy_fn, n, until_hour, until_minute,
+                 change_min, change_max, stock_names, **strategy_kwargs):
+    """串行扫描：单个客户端逐只处理"""
     client = init_create_client()
-    stock_names = _load_stock_names()
     results = []
 
     total = len(codes)
@@ -55,12 +84,24 @@ def scan(codes, date, strategy_id, n=5, until_hour=None, until_minute=None, chan
             print(f"\n[Error] {code}: {e}")
 
     print()  # 换行
-
-    # 按综合评分降序
-    results.sort(key=lambda x: x['score'], reverse=True)
     return results
 
 
+def _scan_parallel(codes, date, strategy_fn, n, until_hour, until_minute,
+                   change_min, change_max, stock_names, workers, **strategy_kwargs):
+    """
+    并发扫描：用 _map_codes 的线程池逐只调用 _scan_single
+
+    - 结果按 codes 原顺序收集，保证与串行路径一致
+    - 单只股票异常（包括建连失败）只影响该股票，不影响其他任务
+    """
+    def _one(code, client):
+        return _scan_single(code, date, client, strategy_fn, n, until_hour, until_minute,
+                            change_min, change_max, stock_names, **strategy_kwargs)
+
+    return [r for r in _map_codes(codes, _one, workers, label="扫描中") if r is not None]
+
+
 def _scan_single(code, date, client, strategy_fn, n, until_hour=None, until_minute=None,
                  change_min=-100, change_max=100, stock_names=None, **strategy_kwargs):
     """扫描单只股票"""
@@ -107,6 +148,186 @@ def _scan_single(code, date, client, strategy_fn, n, until_hour=None, until_minu
     return eval_result
 
 
+# ==================== 批量模式 ====================
+
+def load_market_data(codes, date, n=5, until_hour=None, until_minute=None, workers=1, verbose=True,
+                     client=None, executor=None):
+    """
+    加载多只股票一个交易日的分时数据，按分时长度分组组成矩阵，并计算量比
+
+    同一分组内各行的分钟序列完全相同（分时按 09:30 起逐分钟排列），
+    因此 time_index / hour / minute 每组只存一份
+
+    参数:
+        codes: 股票代码列表
+        date: 日期，格式 '20260519'
+        n: 过去n个交易日，默认5
+        until_hour: 截至时间-小时，None表示全天
+        until_minute: 截至时间-分钟，None表示全天
+        workers: 并发连接数，默认1（串行）
+        verbose: 是否打印加载进度
+        client: 线程安全的通达信客户端（如连接池的代理客户端），传入时各线程共用，见 _map_codes
+        executor: 复用的线程池，多次调用（如回测逐日加载）时避免每次新建，见 _map_codes
+
+    返回:
+        list[dict]: 每个分组一个 dict
+        {
+            'codes': list,              # 该组股票代码
+            'positions': ndarray,       # 各行在 codes 中的原始位置
+            'price': ndarray,           # (股票数, 分钟数) 分时价格
+            'vol': ndarray,             # (股票数, 分钟数) 每分钟成交量
+            'volume_ratio': ndarray,    # (股票数, 分钟数) 量比
+            'prev_close': ndarray,      # (股票数,) 昨收价
+            'time_index': ndarray,      # (分钟数,) 时间序号
+            'hour': ndarray,            # (分钟数,)
+            'minute': ndarray,          # (分钟数,)
+        }
+    """
+    def _load(code, client):
+        return _load_single(code, date, client, n, until_hour, until_minute)
+
+    records = _map_codes(codes, _load, workers, label="加载中" if verbose else None,
+                         client=client, executor=executor)
+
+    groups = {}
+    for pos, (code, rec) in enumerate(zip(codes, records)):
+        if rec is not None:
+            groups.setdefault(len(rec['price']), []).append((pos, code, rec))
+
+    market = []
+    for length in sorted(groups):
+        rows = groups[length]
+        first = rows[0][2]
+        vol = np.array([rec['vol'] for _, _, rec in rows], dtype=float)
+        time_index = calc_time_index(first['hour'], first['minute'])
+        avg_vol = np.array([rec['avg_vol'] for _, _, rec in rows], dtype=float)
+        market.append({
+            'codes': [code for _, code, _ in rows],
+            'positions': np.array([pos for pos, _, _ in rows]),
+            'price': np.array([rec['price'] for _, _, rec in rows], dtype=float),
+            'vol': vol,
+            'volume_ratio': calc_volume_ratio_matrix(vol, time_index, avg_vol),
+            'prev_close': np.array([rec['prev_close'] for _, _, rec in rows], dtype=float),
+            'time_index': time_index,
+            'hour': first['hour'],
+            'minute': first['minute'],
+        })
+    return market
+
+
+def evaluate_market(market, strategy_id, change_min=-100, change_max=100, date='', stock_names=None,
+                    **strategy_kwargs):
+    """
+    对 load_market_data 的结果批量执行策略，并按涨幅范围过滤
+
+    返回:
+        list[dict]: 命中结果，按 codes 原顺序排列（未排序）
+    """
+    batch_fn = get_batch_strategy(strategy_id)
+    hits = []
+    for group in market:
+        evals = batch_fn(group['price'], group['volume_ratio'], group['time_index'],
+                         group['hour'], group['minute'], **strategy_kwargs)
+        for row, eval_result in enumerate(evals):
+            if eval_result is None:
+                continue
+            prev_close = group['prev_close'][row]
+            change_pct = (group['price'][row, -1] - prev_close) / prev_close * 100
+            if change_pct < change_min or change_pct > change_max:
+                continue
+
+            code = group['codes'][row]
+            eval_result['code'] = code
+            eval_result['name'] = stock_names.get(code, '') if stock_names else ''
+            eval_result['date'] = date
+            eval_result['change_pct'] = round(change_pct, 2)
+            hits.append((group['positions'][row], eval_result))
+
+    hits.sort(key=lambda x: x[0])
+    return [r for _, r in hits]
+
+
+def _scan_batch(codes, date, strategy_id, n, until_hour, until_minute,
+                change_min, change_max, stock_names, workers, **strategy_kwargs):
+    """批量扫描：先加载全部数据组成矩阵，再一次性评估"""
+    market = load_market_data(codes, date, n, until_hour, until_minute, workers)
+    return evaluate_market(market, strategy_id, change_min, change_max, date, stock_names, **strategy_kwargs)
+
+
+def _load_single(code, date, client, n, until_hour=None, until_minute=None):
+    """
+    加载单只股票的分时数组和日线均量（截断逻辑与 _scan_single 一致）
+
+    返回:
+        dict: {'price', 'vol', 'hour', 'minute', 'avg_vol', 'prev_close'}，无数据返回 None
+    """
+    minute_df = get_minute_data(code, date, client)
+    if minute_df.empty:
+        return None
+
+    hour = minute_df['hour'].values.astype(int)
+    minute = minute_df['minute'].values.astype(int)
+    if until_hour is not None and until_minute is not None:
+        mask = (hour < until_hour) | ((hour == until_hour) & (minute <= until_minute))
+        minute_df = minute_df[mask]
+        hour, minute = hour[mask], minute[mask]
+        if minute_df.empty:
+            return None
+
+    day_data = get_prev_n_day_vol(code, n, client, date=date)
+    if not day_data:
+        return None
+
+    return {
+        'price': minute_df['price'].values,
+        'vol': minute_df['vol'].values,
+        'hour': hour,
+        'minute': minute,
+        'avg_vol': calc_avg_vol_per_minute(day_data['vol_list'], n),
+        'prev_close': day_data['prev_close'],
+    }
+
+
+def _map_codes(codes, fn, workers=1, label="处理中", client=None, executor=None):
+    """
+    对每只股票执行 fn(code, client)，返回按 codes 顺序排列的结果列表
+
+    workers>1 时使用线程池，每个线程独立持有一个通达信客户端；单只股票异常（包括建连失败）记为 None
+    label 为 None 时不打印进度
+    client: 传入时所有线程共用该客户端（须线程安全，如连接池的代理客户端），不再每线程创建
+    executor: 传入时使用该线程池（调用方负责关闭），不再每次新建
+    """
+    local = threading.local()
+
+    def _task(code):
+        try:
+            cli = client or getattr(local, 'client', None)
+            if cli is None:
+                cli = local.client = init_create_client()    # 建连失败只记为该股票失败，下一只重试建连
+            return fn(code, cli)
+        except Exception as e:
+            print(f"\n[Error] {code}: {e}")
+            return None
+
+    total = len(codes)
+    results = []
+    own = executor is None
+    if own:
+        executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+    try:
+        futures = [executor.submit(_task, code) for code in codes]
+        for i, (code, future) in enumerate(zip(codes, futures)):
+            results.append(future.result())
+            if label:
+                print(f"\r{label}: {i+1}/{total} {code}", end='', flush=True)
+    finally:
+        if own:
+            executor.shutdown()
+    if label:
+        print()
+    return results
+
+
 def print_results(results, strategy_id, date):
     """打印扫描结果"""
     if not results:
@@ -1,12 +1,20 @@
 # strategies/__init__.py - 策略注册
 from strategies.vr_slope import evaluate as vr_slope_evaluate
+from strategies.vr_slope import evaluate_batch as vr_slope_evaluate_batch
 from strategies.vr_anomaly import evaluate as vr_anomaly_evaluate
+from strategies.vr_anomaly import evaluate_batch as vr_anomaly_evaluate_batch
 
 STRATEGIES = {
     'vr_slope': vr_slope_evaluate,
     'vr_anomaly': vr_anomaly_evaluate,
 }
 
+# 批量版：对 (股票数 × 分钟数) 矩阵一次评估，返回每行的结果列表
+BATCH_STRATEGIES = {
+    'vr_slope': vr_slope_evaluate_batch,
+    'vr_anomaly': vr_anomaly_evaluate_batch,
+}
+
 
 def get_strategy(strategy_id):
     """根据策略ID获取evaluate函数"""
@@ -15,6 +23,13 @@ def get_strategy(strategy_id):
     return STRATEGIES[strategy_id]
 
 
+def get_batch_strategy(strategy_id):
+    """根据策略ID获取evaluate_batch函数"""
+    if strategy_id not in BATCH_STRATEGIES:
+        raise ValueError(f"策略 {strategy_id} 不支持批量评估，可用策略: {list(BATCH_STRATEGIES.keys())}")
+    return BATCH_STRATEGIES[strategy_id]
+
+
 def list_strategies():
     """列出所有可用策略"""
     return list(STRATEGIES.keys())
@@ -1,5 +1,4 @@
 # strategies/vr_anomaly.py - 量比异动策略（显性+隐性）
-import math
 import numpy as np
 
 
@@ -7,7 +6,7 @@ def evaluate(df, window=3, steep=5, turn=8, price_up=True, min_hits=1, merge_gap
     """
     量比异动策略：捕捉显性异动（量比急升）和隐性异动（量比拐点反转）
 
-    滑动窗口设计:
+    滑动窗口设计（所有位置一次性用数组运算完成）:
         对每个位置 i，取两个相邻窗口：
           前窗: [i, i+window-1]
           后窗: [i+window, i+2*window-1]
@@ -35,64 +34,108 @@ def evaluate(df, window=3, steep=5, turn=8, price_up=True, min_hits=1, merge_gap
 
     price = df['price'].values
     volume_ratio = df['volume_ratio'].values
+
+    scan = _scan_positions(price, volume_ratio, window, steep, turn, price_up)
+    hit_indices = np.flatnonzero(scan[-1]).tolist()  # 记录前窗起始位置
+    if len(hit_indices) < min_hits:
+        return None
+
+    # 以下只对命中的股票计算（全市场扫描时大部分股票在上面已返回）
+    time_index = df['time_index'].values
     hour = df['hour'].values.astype(int)
     minute = df['minute'].values.astype(int)
+    return _build_result(price, scan, hit_indices, time_index, hour, minute, window, merge_gap)
 
-    # 全天价格斜率（归一化）
-    time_index = df['time_index'].values
-    price_slope = _slope(time_index, price) / np.mean(price)
 
-    # 滑动扫描
-    total_positions = len(df) - 2 * window + 1
-    hit_count = 0
-    hit_indices = []  # 记录后窗起始位置
-    hit_types = []    # 'steep' 或 'turn'
-    hit_angles = []   # 显性: 后窗角度; 隐性: 角度差
-
-    for i in range(total_positions):
-        # 前窗 [i, i+window-1]
-        front_end = i + window - 1
-        vr_front_start = volume_ratio[i]
-        vr_front_end = volume_ratio[front_end]
-        front_slope = (vr_front_end - vr_front_start) / (window - 1)
-        front_angle = math.degrees(math.atan(front_slope))
-
-        # 后窗 [i+window, i+2*window-1]
-        back_start = i + window
-        back_end = i + 2 * window - 1
-        vr_back_start = volume_ratio[back_start]
-        vr_back_end = volume_ratio[back_end]
-        back_slope = (vr_back_end - vr_back_start) / (window - 1)
-        back_angle = math.degrees(math.atan(back_slope))
-
-        # 价格不跌（后窗首尾）
-        if price_up and price[back_end] < price[back_start]:
-            continue
-
-        is_steep = back_angle >= steep
-        is_turn = (front_angle < 0 and back_angle > 0 and
-                   (back_angle - front_angle) >= turn)
-
-        if is_steep or is_turn:
-            hit_count += 1
-            hit_indices.append(i)
-            if is_steep and is_turn:
-                hit_types.append('both')
-                hit_angles.append(max(back_angle, back_angle - front_angle))
-            elif is_steep:
-                hit_types.append('steep')
-                hit_angles.append(back_angle)
-            else:
-                hit_types.append('turn')
-                hit_angles.append(back_angle - front_angle)
-
-    if hit_count < min_hits:
-        return None
+def evaluate_batch(price, volume_ratio, time_index, hour, minute, window=3, steep=5, turn=8,
+                   price_up=True, min_hits=1, merge_gap=2):
+    """
+    批量版 evaluate：一次评估同一交易日、分时长度相同的多只股票
+
+    前后窗角度和显性/隐性判断在 (股票数 × 位置数) 矩阵上一次完成，
+    只对命中的行构造结果，每行结果与对该行单独调用 evaluate 完全一致
+
+    参数:
+        price: 二维数组 (股票数, 分钟数)，分时价格
+        volume_ratio: 二维数组 (股票数, 分钟数)，量比
+        time_index: 一维数组 (分钟数,)，时间序号，所有行共用
+        hour: 一维数组 (分钟数,)，小时
+        minute: 一维数组 (分钟数,)，分钟
+        其余参数同 evaluate
+
+    返回:
+        list: 长度为股票数，每个元素为 evaluate 的返回值（dict 或 None）
+    """
+    price = np.asarray(price, dtype=float)
+    volume_ratio = np.asarray(volume_ratio, dtype=float)
+    n_rows, length = price.shape
+    results = [None] * n_rows
+    if length < 2 * window:
+        return results
+
+    scan = _scan_positions(price, volume_ratio, window, steep, turn, price_up)
+    hit_mask = scan[-1]
+    hit_counts = np.count_nonzero(hit_mask, axis=1)
+
+    hour = np.asarray(hour).astype(int)
+    minute = np.asarray(minute).astype(int)
+    for row in np.flatnonzero(hit_counts >= min_hits):
+        hit_indices = np.flatnonzero(hit_mask[row]).tolist()
+        row_scan = tuple(arr[row] for arr in scan)
+        results[row] = _build_result(price[row], row_scan, hit_indices, time_index, hour, minute,
+                                     window, merge_gap)
+    return results
+
+
+def _scan_positions(price, volume_ratio, window, steep, turn, price_up):
+    """
+    前后窗滑动扫描（向量化），一维（单只股票）或二维（股票数 × 分钟数）均可，沿最后一维计算
+
+    位置 i 的前窗 [i, i+window-1]，后窗 [i+window, i+2*window-1]，共 分钟数-2*window+1 个位置
 
-    # 统计
-    steep_count = sum(1 for t in hit_types if t in ('steep', 'both'))
-    turn_count = sum(1 for t in hit_types if t in ('turn', 'both'))
-    max_angle_diff = max(hit_angles)
+    返回:
+        tuple: (back_angle 后窗角度, angle_diff 角度差, is_steep 显性, is_turn 隐性, hit_mask 是否命中)
+    """
+    total_positions = price.shape[-1] - 2 * window + 1
+    front_start = volume_ratio[..., :total_positions]
+    front_end = volume_ratio[..., window - 1:window - 1 + total_positions]
+    back_start = volume_ratio[..., window:window + total_positions]
+    back_end = volume_ratio[..., 2 * window - 1:2 * window - 1 + total_positions]
+
+    front_angle = np.degrees(np.arctan((front_end - front_start) / (window - 1)))
+    back_angle = np.degrees(np.arctan((back_end - back_start) / (window - 1)))
+    angle_diff = back_angle - front_angle
+
+    # ① 显性异动  ② 隐性异动
+    is_steep = back_angle >= steep
+    is_turn = (front_angle < 0) & (back_angle > 0) & (angle_diff >= turn)
+    hit_mask = is_steep | is_turn
+
+    # ③ 价格不跌（后窗首尾）
+    if price_up:
+        hit_mask &= ~(price[..., 2 * window - 1:2 * window - 1 + total_positions] <
+                      price[..., window:window + total_positions])
+
+    return back_angle, angle_diff, is_steep, is_turn, hit_mask
+
+
+def _build_result(price, scan, hit_indices, time_index, hour, minute, window, merge_gap):
+    """由单只股票的扫描结果计算评分，构造返回 dict"""
+    back_angle, angle_diff, is_steep, is_turn, hit_mask = scan
+    hit_count = len(hit_indices)
+
+    # 统计（两类都命中时取后窗角度与角度差中较大者）
+    hit_steep = is_steep[hit_indices]
+    hit_turn = is_turn[hit_indices]
+    hit_angles = np.where(hit_steep & hit_turn,
+                          np.maximum(back_angle[hit_indices], angle_diff[hit_indices]),
+                          np.where(hit_steep, back_angle[hit_indices], angle_diff[hit_indices]))
+    steep_count = int(np.count_nonzero(hit_steep))
+    turn_count = int(np.count_nonzero(hit_turn))
+    max_angle_diff = float(hit_angles.max())
+
+    # 全天价格斜率（归一化）
+    price_slope = _slope(time_index, price) / np.mean(price)
 
     # 合并连续命中为时段
     hit_periods = _merge_indices_to_periods(hit_indices, window, hour, minute, merge_gap)
@@ -106,7 +149,7 @@ def evaluate(df, window=3, steep=5, turn=8, price_up=True, min_hits=1, merge_gap
         'turn_hits': turn_count,
         'max_angle_diff': round(max_angle_diff, 1),
         'hit_windows': hit_count,
-        'total_windows': total_positions,
+        'total_windows': len(hit_mask),
         'price_slope': round(price_slope, 6),
         'hit_periods': hit_periods,
     }
@@ -8,7 +8,7 @@ def evaluate(df, window=3, vr_slope=5, vr_up=True, price_up=True, min_hits=3, me
     量比斜率策略：滑动窗口扫描量比斜率+价格上涨的时段
 
     判断逻辑:
-        滑动窗口逐段扫描:
+        滑动窗口扫描（所有窗口一次性用数组运算完成）:
           ① 量比斜率角度 ≥ vr_slope → 量比上升够陡
           ② VR[end] > VR[start] → 量比确实增加（vr_up=True时）
           ③ price[end] >= price[start] → 窗口内价格不下跌（price_up=True时）
@@ -46,47 +46,96 @@ def evaluate(df, window=3, vr_slope=5, vr_up=True, price_up=True, min_hits=3, me
 
     price = df['price'].values
     volume_ratio = df['volume_ratio'].values
+
+    slopes, hit_mask = _scan_windows(price, volume_ratio, window, vr_slope, vr_up, price_up)
+    hit_indices = np.flatnonzero(hit_mask).tolist()
+    if len(hit_indices) < min_hits:
+        return None
+
+    # 以下只对命中的股票计算（全市场扫描时大部分股票在上面已返回）
     time_index = df['time_index'].values
     hour = df['hour'].values.astype(int)
     minute = df['minute'].values.astype(int)
+    return _build_result(price, slopes, hit_indices, time_index, hour, minute, window, merge_gap)
 
-    # 全天价格斜率（归一化）
-    price_slope = _slope(time_index, price) / np.mean(price)
 
+def evaluate_batch(price, volume_ratio, time_index, hour, minute, window=3, vr_slope=5, vr_up=True,
+                   price_up=True, min_hits=3, merge_gap=2):
+    """
+    批量版 evaluate：一次评估同一交易日、分时长度相同的多只股票
+
+    所有股票的窗口斜率和命中判断在 (股票数 × 窗口数) 矩阵上一次完成，
+    只对命中的行构造结果，每行结果与对该行单独调用 evaluate 完全一致
+
+    参数:
+        price: 二维数组 (股票数, 分钟数)，分时价格
+        volume_ratio: 二维数组 (股票数, 分钟数)，量比
+        time_index: 一维数组 (分钟数,)，时间序号，所有行共用
+        hour: 一维数组 (分钟数,)，小时
+        minute: 一维数组 (分钟数,)，分钟
+        其余参数同 evaluate
+
+    返回:
+        list: 长度为股票数，每个元素为 evaluate 的返回值（dict 或 None）
+    """
+    price = np.asarray(price, dtype=float)
+    volume_ratio = np.asarray(volume_ratio, dtype=float)
+    n_rows, length = price.shape
+    results = [None] * n_rows
+    if length < window + 1:
+        return results
+
+    slopes, hit_mask = _scan_windows(price, volume_ratio, window, vr_slope, vr_up, price_up)
+    hit_counts = np.count_nonzero(hit_mask, axis=1)
+
+    hour = np.asarray(hour).astype(int)
+    minute = np.asarray(minute).astype(int)
+    for row in np.flatnonzero(hit_counts >= min_hits):
+        hit_indices = np.flatnonzero(hit_mask[row]).tolist()
+        results[row] = _build_result(price[row], slopes[row], hit_indices, time_index, hour, minute,
+                                     window, merge_gap)
+    return results
+
+
+def _scan_windows(price, volume_ratio, window, vr_slope, vr_up, price_up):
+    """
+    滑动窗口扫描（向量化），一维（单只股票）或二维（股票数 × 分钟数）均可，沿最后一维计算
+
+    第 i 个窗口为 [i, i+window-1]，共 分钟数-window 个窗口
+
+    返回:
+        tuple: (slopes 各窗口量比斜率, hit_mask 各窗口是否命中)
+    """
     # 将角度阈值转为斜率阈值
     slope_threshold = math.tan(math.radians(vr_slope))
 
-    # 滑动窗口扫描
-    total_windows = len(df) - window
-    hit_count = 0
-    hit_indices = []
-    hit_slopes_deg = []
+    total_windows = price.shape[-1] - window
+    vr_start = volume_ratio[..., :total_windows]
+    vr_end = volume_ratio[..., window - 1:window - 1 + total_windows]
 
-    for i in range(total_windows):
-        end = i + window - 1
+    # ① 量比斜率 = (VR[end] - VR[start]) / (window - 1)
+    slopes = (vr_end - vr_start) / (window - 1)
+    # 条件写成"不满足淘汰条件"的形式，NaN 的判定与逐窗口比较保持一致
+    hit_mask = ~(slopes < slope_threshold)
 
-        # ① 量比斜率 = (VR[end] - VR[start]) / window
-        vr_start = volume_ratio[i]
-        vr_end = volume_ratio[end]
-        slope = (vr_end - vr_start) / (window - 1)
+    # ② 量比增加（窗口首尾比较）
+    if vr_up:
+        hit_mask &= ~(vr_end <= vr_start)
 
-        if slope < slope_threshold:
-            continue
+    # ③ 价格不下跌（窗口首尾比较）
+    if price_up:
+        hit_mask &= ~(price[..., window - 1:window - 1 + total_windows] < price[..., :total_windows])
 
-        # ② 量比增加（窗口首尾比较）
-        if vr_up and vr_end <= vr_start:
-            continue
+    return slopes, hit_mask
 
-        # ③ 价格不下跌（窗口首尾比较）
-        if price_up and price[end] < price[i]:
-            continue
 
-        hit_count += 1
-        hit_indices.append(i)
-        hit_slopes_deg.append(math.degrees(math.atan(slope)))
+def _build_result(price, slopes, hit_indices, time_index, hour, minute, window, merge_gap):
+    """由单只股票的窗口扫描结果计算评分，构造返回 dict"""
+    hit_count = len(hit_indices)
+    hit_slopes_deg = np.degrees(np.arctan(slopes[hit_indices]))
 
-    if hit_count < min_hits:
-        return None
+    # 全天价格斜率（归一化）
+    price_slope = _slope(time_index, price) / np.mean(price)
 
     # 合并连续命中窗口为时段
     hit_periods = _merge_indices_to_periods(hit_indices, window, hour, minute, merge_gap)
@@ -101,7 +150,7 @@ def evaluate(df, window=3, vr_slope=5, vr_up=True, price_up=True, min_hits=3, me
         'score': round(score, 4),
         'avg_vr_slope_deg': round(avg_vr_slope_deg, 1),
         'hit_windows': hit_count,
-        'total_windows': total_windows,
+        'total_windows': len(slopes),
         'price_slope': round(price_slope, 6),
         'hit_periods': hit_periods,
     }
@@ -0,0 +1,190 @@
+# sweep.py - 策略参数网格扫描（数据只加载一次，多进程评估所有参数组合）
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scanner import load_market_data, evaluate_market
+
+# 默认参数网格，命令行 --grid 中出现的参数会覆盖对应项
+DEFAULT_GRIDS = {
+    'vr_slope': {
+        'window': [3, 4, 5],
+        'vr_slope': [3, 4, 5, 6],
+        'min_hits': [1, 2, 3],
+        'merge_gap': [2],
+    },
+    'vr_anomaly': {
+        'window': [2, 3, 4],
+        'steep': [3, 5, 8],
+        'turn': [5, 8, 12],
+    },
+}
+
+_market = None   # 子进程内共享的行情数据，由 _init_worker 设置
+
+
+def expand_grid(grid):
+    """
+    展开参数网格为参数组合列表
+
+    参数:
+        grid: dict，参数名 -> 取值列表，如 {'window': [3, 4], 'vr_slope': [4, 5]}
+
+    返回:
+        list[dict]: 所有参数组合（笛卡尔积），顺序与 grid 中的键顺序一致
+    """
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def sweep(market, strategy_id, grid, change_min=-100, change_max=100, procs=None):
+    """
+    在同一份行情数据上评估所有参数组合
+
+    参数:
+        market: load_market_data 的返回值
+        strategy_id: 策略ID
+        grid: 参数网格 dict
+        change_min: 涨幅下限(%)
+        change_max: 涨幅上限(%)
+        procs: 进程数，None=CPU核数，1=当前进程串行
+
+    返回:
+        DataFrame: 每个参数组合一行，参数列 + 命中数/评分分布/涨幅均值
+    """
+    combos = expand_grid(grid)
+    tasks = [(strategy_id, params, change_min, change_max) for params in combos]
+
+    if procs == 1:
+        _init_worker(market)
+        rows = [_eval_combo(task) for task in tasks]
+    else:
+        # 行情数据每个子进程只传一次，之后各参数组合只传参数
+        with ProcessPoolExecutor(max_workers=procs, initializer=_init_worker, initargs=(market,)) as executor:
+            rows = list(executor.map(_eval_combo, tasks, chunksize=max(1, len(tasks) // 64)))
+
+    return pd.DataFrame(rows)
+
+
+def print_sweep(df, strategy_id, date, top=30):
+    """打印扫描结果，按命中数和评分中位数排序"""
+    if df.empty:
+        print("无参数组合")
+        return
+
+    print(f"\n策略: {strategy_id}  日期: {date}  参数组合: {len(df)}  (显示前{min(top, len(df))}组)")
+    print("-" * 120)
+    print(df.head(top).to_string(index=False))
+    print("-" * 120)
+
+
+def export_sweep(df, strategy_id, date):
+    """导出扫描结果到CSV"""
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    output_file = os.path.join(data_dir, f"sweep_{strategy_id}_{date}.csv")
+    df.to_csv(output_file, index=False)
+    print(f"已导出: {output_file}")
+
+
+def _init_worker(market):
+    global _market
+    _market = market
+
+
+def _eval_combo(task):
+    """评估单个参数组合，返回一行统计"""
+    strategy_id, params, change_min, change_max = task
+    results = evaluate_market(_market, strategy_id, change_min, change_max, **params)
+    scores = np.array([r['score'] for r in results], dtype=float)
+    changes = np.array([r['change_pct'] for r in results], dtype=float)
+
+    row = dict(params)
+    row['命中数'] = len(results)
+    if len(results):
+        row['评分均值'] = round(float(np.mean(scores)), 4)
+        row['评分中位数'] = round(float(np.median(scores)), 4)
+        row['评分P90'] = round(float(np.percentile(scores, 90)), 4)
+        row['评分最大'] = round(float(np.max(scores)), 4)
+        row['涨幅均值%'] = round(float(np.mean(changes)), 2)
+    else:
+        row.update({'评分均值': None, '评分中位数': None, '评分P90': None, '评分最大': None, '涨幅均值%': None})
+    return row
+
+
+def parse_grid(items):
+    """
+    解析命令行网格参数
+
+    ['window=3,4,5', 'vr_up=true'] -> {'window': [3, 4, 5], 'vr_up': [True]}
+    """
+    grid = {}
+    for item in items:
+        key, _, values = item.partition('=')
+        if not values:
+            raise ValueError(f"网格参数格式错误: {item}，应为 name=v1,v2,...")
+        grid[key.strip()] = [_parse_value(v.strip()) for v in values.split(',') if v.strip()]
+    return grid
+
+
+def _parse_value(val):
+    if val.lower() in ('true', 'false'):
+        return val.lower() == 'true'
+    try:
+        return int(val)
+    except ValueError:
+        try:
+            return float(val)
+        except ValueError:
+            return val
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="策略参数网格扫描")
+    parser.add_argument("--strategy", help="策略: vr_slope / vr_anomaly，默认vr_slope", default="vr_slope")
+    parser.add_argument("--file", help="股票代码文件路径，每行一个代码", required=True)
+    parser.add_argument("--date", help="日期，格式 YYYYMMDD，默认今天", default="")
+    parser.add_argument("--n", help="过去n个交易日，默认5", type=int, default=5)
+    parser.add_argument("--until", help="截至时间，格式 HH:MM", default="")
+    parser.add_argument("--change_min", help="涨幅下限(%%)，默认-100不限", type=float, default=-100)
+    parser.add_argument("--change_max", help="涨幅上限(%%)，默认100不限", type=float, default=100)
+    parser.add_argument("--grid", help="参数网格，如 --grid window=3,4,5 vr_slope=4,5", nargs='*', default=[])
+    parser.add_argument("--workers", help="加载数据的并发连接数，默认8", type=int, default=8)
+    parser.add_argument("--procs", help="评估进程数，默认CPU核数", type=int, default=None)
+    parser.add_argument("--sort", help="排序列，默认命中数", default="命中数")
+    parser.add_argument("--top", help="打印前N组，默认30", type=int, default=30)
+    parser.add_argument("--csv", help="导出CSV到data目录", action="store_true")
+    args = parser.parse_args()
+
+    if args.strategy not in DEFAULT_GRIDS:
+        print("未知策略: %s" % args.strategy)
+        sys.exit(1)
+
+    date = args.date or datetime.now().strftime('%Y%m%d')
+    until_hour, until_minute = None, None
+    if args.until:
+        parts = args.until.split(':')
+        until_hour, until_minute = int(parts[0]), int(parts[1])
+
+    with open(args.file, 'r', encoding='utf-8') as f:
+        codes = [line.strip() for line in f if line.strip()]
+
+    grid = dict(DEFAULT_GRIDS[args.strategy])
+    grid.update(parse_grid(args.grid))
+    print("策略: %s  日期: %s  股票数: %d  参数组合: %d" % (
+        args.strategy, date, len(codes), len(expand_grid(grid))))
+
+    market = load_market_data(codes, date, args.n, until_hour, until_minute, args.workers)
+    result = sweep(market, args.strategy, grid, args.change_min, args.change_max, args.procs)
+    result = result.sort_values(args.sort, ascending=False, kind='stable', na_position='last')
+
+    print_sweep(result, args.strategy, date, args.top)
+    if args.csv:
+        export_sweep(result, args.strategy, date)
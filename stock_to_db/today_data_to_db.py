@@ -17,10 +17,12 @@ import pandas as pd
 import numpy as np
 import pymysql
 from sqlalchemy import create_engine
-from mootdx.quotes import Quotes
-import tdx_indicator as tdx_indicator
+from tdx_client_pool import get_client
+from tdx_async import download_bars
+from indicator_engine import compute_indicators, register_indicator
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
 import threading
 import time
 import mysql.connector
@@ -100,83 +102,68 @@ def df_to_mysql(df, table_name=table_name,
 
 # ---------------- 指标函数 ---------------- #
 
-def ZX_short_term_trend(close):
-    ema1 = tdx_indicator.EMA(close, 10)
-    return tdx_indicator.EMA(ema1, 10)
+def _zx_trend(g):
+    ema1 = g.node('EMA', 'close', 10)
+    return {'zx_short_term_trend': g[g.node('EMA', ema1, 10)]}
 
 
-def ZX_bull_bear_line(close, M1=14, M2=28, M3=57, M4=114):
-    ma1 = tdx_indicator.MA(close, M1)
-    ma2 = tdx_indicator.MA(close, M2)
-    ma3 = tdx_indicator.MA(close, M3)
-    ma4 = tdx_indicator.MA(close, M4)
-    return (ma1 + ma2 + ma3 + ma4) / 4
+def _zx_bull(g, M1=14, M2=28, M3=57, M4=114):
+    ma = [g[g.node('MA', 'close', m)] for m in (M1, M2, M3, M4)]
+    return {'zx_bull_bear_line': (ma[0] + ma[1] + ma[2] + ma[3]) / 4}
+
+
+def _zxt(g):
+    # 砖型图
+    hhv, llv = g.node('HHV', 'high', 4), g.node('LLV', 'low', 4)
+    close, hhv_high_4, llv_low_4 = g['close'], g[hhv], g[llv]
+    var1a = g.derive('VAR1A', lambda: (hhv_high_4 - close) / (hhv_high_4 - llv_low_4) * 100 - 90)
+    var3a = g.derive('VAR3A', lambda: (close - llv_low_4) / (hhv_high_4 - llv_low_4) * 100)
+    var2a = g[g.node('SMA', var1a, 4, 1)] + 100
+    var4a = g.node('SMA', var3a, 6, 1)
+    var5a = g[g.node('SMA', var4a, 6, 1)] + 100
+    var6a = var5a - var2a
+    return {'zxt': np.where(var6a > 4, var6a - 4, 0.0)}
+
+
+def _dz(g, n1=3, n2=21):
+    # 单针
+    close = g['close']
+    out = {}
+    for col, n in (('dzs', n1), ('dzt', n2)):
+        llv, hhv = g[g.node('LLV', 'low', n)], g[g.node('HHV', 'close', n)]
+        out[col] = (close - llv) / (hhv - llv) * 100
+    return out
+
+
+register_indicator('ZX_TREND', _zx_trend)
+register_indicator('ZX_BULL', _zx_bull)
+register_indicator('ZXT', _zxt)
+register_indicator('DZ', _dz)
+
+FEATURE_SPEC = ['KDJ', 'BBI'] + [f'MA({n})' for n in [5, 7, 10, 20, 30, 40, 45, 60, 90, 250]] + \
+               ['MACD', 'ZX_TREND', 'ZX_BULL', 'ZXT', 'DZ']
 
 
 # ---------------- 单支股票逻辑：不再创建 client ---------------- #
 
-def save_stock_features(code, client, offset=400):
+def save_stock_features(code, client, offset=400, df=None):
     """
-    单支股票任务（client 由线程创建，不再每个code创建）
+    单支股票任务（client 由线程创建，不再每个code创建）；df 为已下载的日线时不再请求
     """
     try:
-        df = client.bars(symbol=code, frequency="day", offset=offset)
+        if df is None:
+            df = client.bars(symbol=code, frequency="day", offset=offset)
         df.index = pd.RangeIndex(1, len(df) + 1)
 
-        close, high, low = df["close"], df["high"], df["low"]
         df['dt'] = pd.to_datetime(df[['year', 'month', 'day']])
         # df = df[(df['dt'] >= start_dt) & (df['dt'] <= end_dt)]
         # df = df[(df['dt']>'2026-01-08') & (df['dt']<'2026-01-13')]
         
 
-        # --- 指标 ---
-        K, D, J = tdx_indicator.KDJ(close, high, low)
-        BBI = tdx_indicator.BBI(close)
-        DIF, DEA, MACD = tdx_indicator.MACD(close)
-        # RSI1, RSI2, RSI3 = tdx_indicator.RSI(close)
-        
-        hhv_high_4 = tdx_indicator.HHV(high, 4)
-        llv_low_4 = tdx_indicator.LLV(low, 4)
-        var1a = (hhv_high_4 - close) / (hhv_high_4 - llv_low_4) * 100 - 90
-        var2a = tdx_indicator.SMA(var1a, 4, 1) + 100
-        var3a = (close - llv_low_4) / (hhv_high_4 - llv_low_4) * 100
-        var4a = tdx_indicator.SMA(var3a, 6, 1)
-        var5a = tdx_indicator.SMA(var4a, 6, 1) + 100
-        var6a = var5a - var2a
-        # 砖型图
-        zxt = np.where(var6a > 4, var6a - 4, 0.0)
-        
-        n1 = 3
-        n2 = 21
-        llv_low_n1 = tdx_indicator.LLV(low, n1)
-        llv_low_n2 = tdx_indicator.LLV(low, n2)
-        hhv_close_n1 = tdx_indicator.HHV(close, n1)
-        hhv_close_n2 = tdx_indicator.HHV(close, n2)
-        # 单针
-        dzs = (close - llv_low_n1) / (hhv_close_n1 - llv_low_n1) * 100
-        dzt = (close - llv_low_n2) / (hhv_close_n2 - llv_low_n2) * 100
-
-        zx_trend = ZX_short_term_trend(close)
-        zx_bull = ZX_bull_bear_line(close)
-
-        df["K"], df["D"], df["J"] = np.round(K, 2), np.round(D, 2), np.round(J, 2)
-        df["BBI"] = np.round(BBI, 2)
-
-        for n in [5, 7, 10, 20, 30, 40, 45, 60, 90, 250]:
-            df[f"MA{n}"] = np.round(tdx_indicator.MA(close, n), 2)
-
-        df["DIF"], df["DEA"], df["MACD"] = np.round(DIF, 2), np.round(DEA, 2), np.round(MACD, 2)
-
-        df["zx_short_term_trend"] = np.round(zx_trend, 2)
-        df["zx_bull_bear_line"] = np.round(zx_bull, 2)
-        
-        # df["RSI1"] = np.round(RSI1, 2)
-        # df["RSI2"] = np.round(RSI2, 2)
-        # df["RSI3"] = np.round(RSI3, 2)
-        
-        df["zxt"] = np.round(zxt, 2)
-        df["dzs"] = np.round(dzs, 2)
-        df["dzt"] = np.round(dzt, 2)
+        # --- 指标（共用一张依赖图，MA/EMA/HHV/LLV等中间序列只算一次） ---
+        features = compute_indicators(df, FEATURE_SPEC)
+        for col in features.columns:
+            df[col] = np.round(features[col].values, 2)
 
         df["trade_date"] = pd.to_datetime(df[["year", "month", "day"]])
         df["code"] = code
@@ -214,45 +201,52 @@ def get_all_codes():
 
 # ---------------- 每个线程只创建一个 client ---------------- #
 
-def worker(codes, offset):
+def worker(codes, offset, bars=None):
     """
-    单线程：创建一个 client 后处理多个 code
+    单线程：创建一个 client 后处理多个 code；bars 为预先下载的 {code: 日线}，下载失败的 code 再用 client 单独请求
     """
-    client = Quotes.factory(market="std")   # 线程只创建一次
+    client = get_client()   # 线程只创建一次，连接从连接池借用
     print('*'*100)
     results = []
     for code in codes:
-        results.append(save_stock_features(code, client, offset))
+        results.append(save_stock_features(code, client, offset, (bars or {}).get(code)))
     return results
 
 
 # ---------------- 多线程执行 ---------------- #
 
-def run_all_codes(offset=400, max_workers=5):
+DOWNLOAD_CHUNK = 300   # 每批异步下载的股票数：下载完一批交给线程计算入库，同时下载下一批
+
+
+def run_all_codes(offset=400, max_workers=5, connections=4, download_chunk=DOWNLOAD_CHUNK):
     codes = get_all_codes()
     print(codes)
-    print(f"✔ 共 {len(codes)} 个股票，启动 {max_workers} 线程")
-
-    # 分割 codes 到每个线程
-    chunk = (len(codes) + max_workers - 1) // max_workers
-    code_groups = [codes[i:i + chunk] for i in range(0, len(codes), chunk)]
+    print(f"✔ 共 {len(codes)} 个股票，启动 {max_workers} 线程，每批下载 {download_chunk} 只")
 
     success, fail = [], []
+    in_flight = deque()   # 已提交计算的批次，最多保留两批，内存只占几批日线而不是全市场
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(worker, group, offset): group for group in code_groups
-        }
-
-        for future in as_completed(futures):
-            results = future.result()
-            for code, msg in results:
-                if msg == "OK":
-                    print(f"✔ {code} 完成")
-                    success.append(code)
-                else:
-                    print(f"❌ {code} 失败：{msg}")
-                    fail.append(code)
+        for start in range(0, len(codes), download_chunk):
+            batch = codes[start:start + download_chunk]
+            # 日线用异步客户端下载（几个连接上流水线请求），与上一批的计算入库重叠
+            try:
+                bars = download_bars(batch, frequency="day", offset=offset, connections=connections)
+                print(f"✔ 日线下载 {start + len(batch)}/{len(codes)}，"
+                      f"本批成功 {sum(df is not None for df in bars.values())}/{len(batch)}")
+            except ConnectionError as e:
+                print(f"❌ 异步下载失败，本批改为逐只请求：{e}")
+                bars = {}
+
+            # 分割本批 codes 到每个线程
+            chunk = (len(batch) + max_workers - 1) // max_workers
+            in_flight.append([executor.submit(worker, batch[i:i + chunk], offset, bars)
+                              for i in range(0, len(batch), chunk)])
+            if len(in_flight) > 1:
+                _collect(in_flight.popleft(), success, fail)
+
+        while in_flight:
+            _collect(in_flight.popleft(), success, fail)
 
     print("\n========== 运行完成 ==========")
     print("成功：", len(success))
@@ -261,6 +255,17 @@ def run_all_codes(offset=400, max_workers=5):
         print("失败股票：", fail)
 
 
+def _collect(futures, success, fail):
+    for future in as_completed(futures):
+        for code, msg in future.result():
+            if msg == "OK":
+                print(f"✔ {code} 完成")
+                success.append(code)
+            else:
+                print(f"❌ {code} 失败：{msg}")
+                fail.append(code)
+
+
 # ---------------- 运行 ---------------- #
 
 import time
@@ -0,0 +1,454 @@
+# tdx_async.py - 基于 asyncio 的通达信行情客户端：非阻塞 socket、少量连接上多路复用大量并发请求
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import asyncio
+import itertools
+import struct
+import zlib
+import numpy as np
+import pandas as pd
+
+# 用法:
+#   async with AsyncTdxClient(connections=4) as client:
+#       df = await client.bars('000400', frequency='day', offset=1800)
+#       dfs = await asyncio.gather(*(client.bars(code) for code in codes))
+#   bars = download_bars(codes, offset=1800)          # 同步调用，返回 {股票代码: DataFrame}
+# 返回的 DataFrame 列名与 mootdx 的 client.bars / minutes / quotes 一致，可直接交给原有的计算代码。
+# 每个连接上的请求不等待上一个响应就继续发送（流水线），响应按请求序号匹配；
+# 全市场下载的速度取决于服务器吞吐，而不是线程数。协议格式与 pytdx 相同。
+
+BARS_PER_REQUEST = 800      # 单次K线请求最多800根
+QUOTES_PER_REQUEST = 80     # 单次行情请求最多80只
+
+BAR_COLUMNS = ['open', 'close', 'high', 'low', 'vol', 'amount', 'year', 'month', 'day', 'hour', 'minute',
+               'datetime', 'volume']
+
+# mootdx frequency -> 通达信K线类型
+CATEGORIES = {
+    '5m': 0, '15m': 1, '30m': 2, '1h': 3, 'days': 4, 'week': 5, 'mon': 6, 'month': 6, 'ex_1m': 7, '1m': 8,
+    'day': 9, 'd': 9, 'w': 5, 'm': 6, '3mon': 10, 'quarter': 10, 'year': 11, 'y': 11,
+}
+
+_HEADER = struct.Struct('<BIBHHH')           # 请求头: 0x0c, 序号, 类型, 长度, 长度, 命令
+_RESPONSE_HEADER = struct.Struct('<IBIBHHH')  # 响应头: 标志, 0x0c, 序号, 类型, 命令, 压缩长度, 原始长度
+
+CMD_SETUP1 = 0x000d
+CMD_SETUP2 = 0x0fdb
+CMD_BARS = 0x052d
+CMD_MINUTES = 0x0fb4
+CMD_QUOTES = 0x053e
+
+# 建连后的握手请求 (序号, 类型, 命令, 数据)
+_SETUP = [
+    (0x00931802, 1, CMD_SETUP1, b'\x01'),
+    (0x00941802, 1, CMD_SETUP1, b'\x02'),
+    (0x00991803, 1, CMD_SETUP2, bytes.fromhex('d5d0c9ccd6a4a8af0000008fc22540130000d500c9ccbdf0d7ea00000002')),
+]
+
+
+class AsyncTdxClient:
+    """
+    asyncio 通达信行情客户端
+
+    connections 个 TCP 连接，每个连接最多 max_inflight 个未返回的请求；新请求发往待处理请求最少的连接。
+    连接断开或请求超时时该连接上的请求全部失败，请求换连接重试 retries 次，断开的连接下次使用时重连。
+    """
+
+    def __init__(self, servers=None, connections=4, timeout=10, max_inflight=8, retries=1):
+        """
+        参数:
+            servers: 服务器列表 [(ip, port)]，连接轮流分配到各服务器；默认取 tdx_client_pool 测速最快的几台
+            connections: 连接数
+            timeout: 建连/单个请求的超时(秒)
+            max_inflight: 每个连接上同时未返回的请求数上限
+            retries: 连接断开导致请求失败后换连接重试的次数
+        """
+        self.servers = list(servers) if servers else None
+        self.n_connections = connections
+        self.timeout = timeout
+        self.max_inflight = max_inflight
+        self.retries = retries
+        self._connections = []
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def connect(self):
+        """建立全部连接（握手完成后返回），全部连接失败时抛出 ConnectionError"""
+        if not self.servers:
+            self.servers = await asyncio.get_running_loop().run_in_executor(None, _fastest_servers,
+                                                                            self.n_connections)
+        self._connections = [_Connection(self.servers[i % len(self.servers)], self.timeout, self.max_inflight)
+                             for i in range(self.n_connections)]
+        # 部分连接失败时用其余连接工作，失败的连接在使用时重连
+        results = await asyncio.gather(*(conn.open() for conn in self._connections), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        for conn, result in zip(self._connections, results):
+            if isinstance(result, BaseException):
+                conn.close()
+        if len(errors) == len(results):
+            raise ConnectionError(f"无法连接通达信服务器 {self.servers}: {errors[0]}")
+
+    async def close(self):
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+    async def _request(self, flag, cmd, body):
+        if not self._connections:
+            await self.connect()
+        error = None
+        for _ in range(self.retries + 1):
+            conn = min(self._connections, key=lambda c: (not c.alive, c.load))
+            try:
+                if not conn.alive:
+                    await conn.open()
+                return await conn.request(flag, cmd, body)
+            except (ConnectionError, OSError, asyncio.TimeoutError) as e:
+                conn.close()
+                error = e
+        raise ConnectionError(f"通达信请求失败: {error}")
+
+    # ---------- 接口（与 mootdx 同名同参） ----------
+
+    async def bars(self, symbol, frequency='day', offset=800, start=0):
+        """
+        K线，最近 offset 根（start 为从最新一根往前跳过的根数），超过800根时分段并发请求
+
+        返回:
+            DataFrame: 列见 BAR_COLUMNS，按时间升序；offset<=0 或没有数据时为空 DataFrame
+        """
+        category = CATEGORIES[frequency] if isinstance(frequency, str) else int(frequency)
+        market, code = _market(symbol), symbol[-6:].encode()
+        chunks = [(start + i, min(BARS_PER_REQUEST, offset - i)) for i in range(0, offset, BARS_PER_REQUEST)]
+        bodies = await asyncio.gather(*(
+            self._request(1, CMD_BARS, struct.pack('<H6sHHHHIIH', market, code, category, 1, s, n, 0, 0, 0))
+            for s, n in chunks))
+        parts = [_parse_bars(body, category) for body in reversed(bodies)]
+        if not parts:
+            return pd.DataFrame(columns=BAR_COLUMNS)
+        df = pd.DataFrame({col: np.concatenate([part[col] for part in parts]) for col in parts[0]})
+        df['volume'] = df['vol']
+        return df
+
+    async def minutes(self, symbol, date):
+        """
+        历史分时，date 为 'YYYYMMDD' / YYYYMMDD
+
+        返回:
+            DataFrame: price, vol，每分钟一行
+        """
+        body = struct.pack('<IB6s', int(str(date).replace('-', '')), _market(symbol), symbol[-6:].encode())
+        return pd.DataFrame(_parse_minutes(await self._request(1, CMD_MINUTES, body)), columns=['price', 'vol'])
+
+    async def quotes(self, symbol):
+        """
+        实时行情，symbol 为代码或代码列表，超过80只时分批并发请求
+
+        返回:
+            DataFrame: market, code, price, last_close, open, high, low, servertime, vol, cur_vol, amount,
+                       s_vol, b_vol, bid1~5, ask1~5, bid_vol1~5, ask_vol1~5 ...
+        """
+        symbols = [symbol] if isinstance(symbol, str) else list(symbol)
+        batches = [symbols[i:i + QUOTES_PER_REQUEST] for i in range(0, len(symbols), QUOTES_PER_REQUEST)]
+        bodies = await asyncio.gather(*(self._request(2, CMD_QUOTES, _quotes_body(batch)) for batch in batches))
+        return pd.DataFrame([row for body in bodies for row in _parse_quotes(body)])
+
+
+class _Connection:
+    """一个 TCP 连接：写请求不等响应，后台任务读响应并按序号交给等待的请求"""
+
+    _seq = itertools.count(1)
+
+    def __init__(self, server, timeout, max_inflight):
+        self.server = server
+        self.timeout = timeout
+        self.pending = {}           # 序号 -> (命令, future)，按发送顺序
+        self.load = 0               # 已分配到本连接、还没返回的请求数（含排队等待发送的）
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._reader = self._writer = self._task = None
+        self._opening = None
+
+    @property
+    def alive(self):
+        return self._writer is not None
+
+    async def open(self):
+        # 多个请求同时发现连接断开时只重连一次
+        if self._opening is None:
+            self._opening = asyncio.ensure_future(self._open())
+        try:
+            await asyncio.shield(self._opening)
+        finally:
+            if self._opening is not None and self._opening.done():
+                self._opening = None
+
+    async def _open(self):
+        if self.alive:
+            return
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(*self.server), self.timeout)
+        self._task = asyncio.ensure_future(self._read_loop(self._reader))
+        for seq, flag, cmd, body in _SETUP:
+            await self._send(seq, flag, cmd, body)
+
+    async def request(self, flag, cmd, body):
+        self.load += 1
+        try:
+            async with self._slots:
+                if not self.alive:
+                    await self.open()
+                return await self._send(next(self._seq) & 0x7fffffff, flag, cmd, body)
+        finally:
+            self.load -= 1
+
+    async def _send(self, seq, flag, cmd, body):
+        future = asyncio.get_running_loop().create_future()
+        self.pending[seq] = (cmd, future)
+        self._writer.write(_HEADER.pack(0x0c, seq, flag, len(body) + 2, len(body) + 2, cmd) + body)
+        try:
+            await self._writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # 响应丢失后序号对应关系不再可信，关闭连接
+            self.close(ConnectionError(f"{self.server[0]}:{self.server[1]} 请求超时"))
+            raise
+        finally:
+            self.pending.pop(seq, None)
+
+    async def _read_loop(self, reader):
+        try:
+            while True:
+                head = await reader.readexactly(_RESPONSE_HEADER.size)
+                _, _, seq, _, cmd, zip_size, size = _RESPONSE_HEADER.unpack(head)
+                body = await reader.readexactly(zip_size)
+                if zip_size != size:
+                    body = zlib.decompress(body)
+                item = self.pending.get(seq)
+                if item is None or item[0] != cmd:
+                    # 序号对不上时按发送顺序交给最早的请求（服务器按顺序处理同一连接上的请求）
+                    item = next(iter(self.pending.values()), None)
+                if item is not None and not item[1].done():
+                    item[1].set_result(body)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError, zlib.error) as e:
+            self.close(ConnectionError(f"{self.server[0]}:{self.server[1]} 连接断开: {e}"))
+
+    def close(self, error=None):
+        if self._writer is not None:
+            self._writer.close()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        self._reader = self._writer = self._task = None
+        for _, future in list(self.pending.values()):
+            if not future.done():
+                future.set_exception(error or ConnectionError("连接已关闭"))
+        self.pending.clear()
+
+
+# ==================== 同步批量接口 ====================
+
+def download_bars(codes, frequency='day', offset=800, connections=4, **client_kwargs):
+    """
+    批量下载K线（全市场补数），单只股票失败不影响其他股票
+
+    返回:
+        dict: {股票代码: DataFrame}，失败的股票为 None
+    """
+    return asyncio.run(_download(codes, lambda client, code: client.bars(code, frequency, offset),
+                                 connections, client_kwargs))
+
+
+def download_minutes(codes, date, connections=4, **client_kwargs):
+    """批量下载某一天的历史分时，返回 {股票代码: DataFrame}，失败的股票为 None"""
+    return asyncio.run(_download(codes, lambda client, code: client.minutes(code, date),
+                                 connections, client_kwargs))
+
+
+async def _download(codes, fetch, connections, client_kwargs):
+    async with AsyncTdxClient(connections=connections, **client_kwargs) as client:
+        async def _one(code):
+            try:
+                return await fetch(client, code)
+            except Exception as e:
+                print(f"[Error] {code}: {e}")
+                return None
+
+        return dict(zip(codes, await asyncio.gather(*(_one(code) for code in codes))))
+
+
+def _fastest_servers(n):
+    from tdx_client_pool import get_pool
+    pool = get_pool()
+    ranking = pool.ranking or pool.rank_servers()
+    if not ranking:
+        raise ConnectionError("没有可用的通达信服务器")
+    return [server for _, server in ranking[:n]]
+
+
+# ==================== 协议编解码（与 pytdx 一致） ====================
+
+def _market(symbol):
+    """股票代码 -> 市场：0 深圳，1 上海，2 北京（与 mootdx get_stock_market 一致）"""
+    prefix = symbol[:2].lower()
+    if prefix in ('sh', 'sz', 'bj'):
+        return {'sz': 0, 'sh': 1, 'bj': 2}[prefix]
+    if symbol.startswith(('50', '51', '60', '68', '90', '110', '113', '132', '204')):
+        return 1
+    if symbol.startswith(('00', '13', '18', '15', '16', '20', '30', '39', '115', '1318')):
+        return 0
+    if symbol.startswith(('5', '6', '9', '7')):
+        return 1
+    if symbol.startswith(('4', '8')):
+        return 2
+    return 1
+
+
+def _quotes_body(symbols):
+    body = bytearray(struct.pack('<HIHH', 5, 0, 0, len(symbols)))
+    for symbol in symbols:
+        body += struct.pack('<B6s', _market(symbol), symbol[-6:].encode())
+    return bytes(body)
+
+
+def _get_price(data, pos):
+    """变长有符号整数：首字节 bit7 续位、bit6 符号、低6位数据，之后每字节 bit7 续位、低7位数据"""
+    b = data[pos]
+    value, shift, negative = b & 0x3f, 6, b & 0x40
+    while b & 0x80:
+        pos += 1
+        b = data[pos]
+        value += (b & 0x7f) << shift
+        shift += 7
+    return (-value if negative else value), pos + 1
+
+
+def _get_volume(raw):
+    """通达信成交量/成交额的4字节浮点编码"""
+    logpoint = raw >> 24
+    hleax, lheax, lleax = (raw >> 16) & 0xff, (raw >> 8) & 0xff, raw & 0xff
+    ecx, edx, esi, eax = logpoint * 2 - 0x7f, logpoint * 2 - 0x86, logpoint * 2 - 0x8e, logpoint * 2 - 0x96
+    xmm6 = pow(2.0, abs(ecx))
+    if ecx < 0:
+        xmm6 = 1.0 / xmm6
+    if hleax > 0x80:
+        xmm4 = pow(2.0, edx) * 128.0 + (hleax & 0x7f) * pow(2.0, edx + 1)
+    elif edx >= 0:
+        xmm4 = pow(2.0, edx) * hleax
+    else:
+        xmm4 = (1 / pow(2.0, edx)) * hleax
+    xmm3, xmm1 = pow(2.0, esi) * lheax, pow(2.0, eax) * lleax
+    if hleax & 0x80:
+        xmm3 *= 2.0
+        xmm1 *= 2.0
+    return xmm6 + xmm4 + xmm3 + xmm1
+
+
+def _get_volumes(raws):
+    """批量解码；正常量级（logpoint 0x43~0x7e）的编码与 IEEE float32 位布局相同，直接按 float32 读取，其余逐个解码"""
+    raws = np.asarray(raws, dtype=np.uint32)
+    with np.errstate(invalid='ignore'):     # NaN 位模式只出现在 logpoint>=0x7f，下面逐个重算
+        out = raws.view(np.float32).astype(float)
+    logpoint = raws >> 24
+    for i in np.flatnonzero((logpoint < 0x43) | (logpoint >= 0x7f)):
+        out[i] = _get_volume(int(raws[i]))
+    return out
+
+
+def _parse_bars(data, category):
+    """返回 (按列的K线 dict, 根数)"""
+    (count,) = struct.unpack_from('<H', data, 0)
+    pos, base = 2, 0
+    minute_bar = category < 4 or category in (7, 8)
+    dates, prices, raws = [], [], []
+    for _ in range(count):
+        dates.append(struct.unpack_from('<HH' if minute_bar else '<I', data, pos))
+        open_diff, pos = _get_price(data, pos + 4)
+        close_diff, pos = _get_price(data, pos)
+        high_diff, pos = _get_price(data, pos)
+        low_diff, pos = _get_price(data, pos)
+        raws.append(struct.unpack_from('<II', data, pos))
+        pos += 8
+        open_ = open_diff + base
+        base = open_ + close_diff
+        prices.append((open_, base, open_ + high_diff, open_ + low_diff))
+
+    prices = np.array(prices, dtype=float).reshape(-1, 4) / 1000
+    raws = np.array(raws, dtype=np.uint32).reshape(-1, 2)
+    if minute_bar:
+        zipday, minutes = np.array(dates, dtype=np.int64).reshape(-1, 2).T
+        year, month, day = (zipday >> 11) + 2004, (zipday % 2048) // 100, (zipday % 2048) % 100
+        hour, minute = minutes // 60, minutes % 60
+    else:
+        zipday = np.array(dates, dtype=np.int64).reshape(-1)
+        year, month, day = zipday // 10000, zipday % 10000 // 100, zipday % 100
+        hour, minute = np.full(count, 15), np.zeros(count, dtype=np.int64)
+    columns = {'open': prices[:, 0], 'close': prices[:, 1], 'high': prices[:, 2], 'low': prices[:, 3],
+               'vol': _get_volumes(raws[:, 0]), 'amount': _get_volumes(raws[:, 1]),
+               'year': year, 'month': month, 'day': day, 'hour': hour, 'minute': minute}
+    columns['datetime'] = [f'{y:04d}-{mo:02d}-{d:02d} {h:02d}:{mi:02d}'
+                           for y, mo, d, h, mi in zip(year.tolist(), month.tolist(), day.tolist(),
+                                                      hour.tolist(), minute.tolist())]
+    return columns
+
+
+def _parse_minutes(data):
+    (count,) = struct.unpack_from('<H', data, 0)
+    pos, price, rows = 6, 0, []
+    for _ in range(count):
+        diff, pos = _get_price(data, pos)
+        _, pos = _get_price(data, pos)
+        vol, pos = _get_price(data, pos)
+        price += diff
+        rows.append((price / 100, vol))
+    return rows
+
+
+def _format_time(stamp):
+    stamp = str(stamp).zfill(6)
+    text = stamp[:-6] + ':'
+    if int(stamp[-6:-4]) < 60:
+        return text + f'{stamp[-6:-4]}:{int(stamp[-4:]) * 60 / 10000.0:06.3f}'
+    return text + f'{int(int(stamp[-6:]) * 60 / 1000000):02d}:{(int(stamp[-6:]) * 60 % 1000000) * 60 / 1000000.0:06.3f}'
+
+
+def _parse_quotes(data):
+    (count,) = struct.unpack_from('<H', data, 2)
+    pos, rows = 4, []
+    for _ in range(count):
+        market, code, active1 = struct.unpack_from('<B6sH', data, pos)
+        pos += 9
+        values = []
+        for _ in range(9):          # price, last_close/open/high/low 差值, servertime, 保留, vol, cur_vol
+            v, pos = _get_price(data, pos)
+            values.append(v)
+        (amount_raw,) = struct.unpack_from('<I', data, pos)
+        pos += 4
+        for _ in range(4 + 20):     # s_vol, b_vol, 保留×2, 五档 (买价, 卖价, 买量, 卖量)
+            v, pos = _get_price(data, pos)
+            values.append(v)
+        pos += 2
+        for _ in range(4):
+            _, pos = _get_price(data, pos)
+        _, active2 = struct.unpack_from('<hH', data, pos)
+        pos += 4
+
+        price = values[0]
+        row = {'market': market, 'code': code.decode('utf-8'), 'active1': active1, 'price': price / 100,
+               'last_close': (price + values[1]) / 100, 'open': (price + values[2]) / 100,
+               'high': (price + values[3]) / 100, 'low': (price + values[4]) / 100,
+               'servertime': _format_time(values[5]), 'vol': values[7], 'cur_vol': values[8],
+               'amount': _get_volume(amount_raw), 's_vol': values[9], 'b_vol': values[10]}
+        for level in range(5):
+            bid, ask, bid_vol, ask_vol = values[13 + level * 4: 17 + level * 4]
+            row[f'bid{level + 1}'] = (price + bid) / 100
+            row[f'ask{level + 1}'] = (price + ask) / 100
+            row[f'bid_vol{level + 1}'] = bid_vol
+            row[f'ask_vol{level + 1}'] = ask_vol
+        row['active2'] = active2
+        rows.append(row)
+    return rows
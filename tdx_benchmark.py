@@ -0,0 +1,363 @@
+# tdx_benchmark.py - tdx_indicator 性能基准：全部指标函数的耗时/峰值内存 + 基线对比；0级函数 numpy / pandas 实现对比
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import inspect
+import json
+import time
+import timeit
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+import tdx_indicator as tdx_indicator
+
+# ==================== 0级函数 numpy / pandas 对比 ====================
+
+# 函数名 -> 调用方式（S 为一维序列）
+CASES = {
+    'REF': lambda S: tdx_indicator.REF(S, 1),
+    'DIFF': lambda S: tdx_indicator.DIFF(S, 1),
+    'STD': lambda S: tdx_indicator.STD(S, 20),
+    'SUM': lambda S: tdx_indicator.SUM(S, 10),
+    'HHV': lambda S: tdx_indicator.HHV(S, 20),
+    'LLV': lambda S: tdx_indicator.LLV(S, 20),
+    'MA': lambda S: tdx_indicator.MA(S, 20),
+    'EMA': lambda S: tdx_indicator.EMA(S, 12),
+    'SMA': lambda S: tdx_indicator.SMA(S, 9, 1),
+    'DMA': lambda S: tdx_indicator.DMA(S, 0.1),
+    'RANGE': lambda S: tdx_indicator.RANGE(S, 9, 11),
+}
+
+LENGTHS = (240, 300, 1800)
+SUITE_LENGTHS = (240, 300, 1800, 10000)
+PANEL_SHAPE = (5500, 300)    # 全市场面板：股票数 × K线数
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tdx_benchmark_baseline.json')
+
+
+def legacy_range(A, B, C):
+    """RANGE 改写前的实现（DataFrame + 逐元素 lambda），仅用于对比"""
+    df = pd.DataFrame()
+    df['select'] = A.tolist()
+    df['select'] = df['select'].apply(lambda x: True if (x >= B and x <= C) else False)
+    return df['select']
+
+
+# 没有 pandas backend 的函数，用改写前的实现作对照
+LEGACY = {
+    'RANGE': lambda S: legacy_range(S, 9, 11),
+}
+
+
+def make_series(n, seed=0):
+    """生成 n 根K线的合成收盘价（随机游走，保留2位小数）"""
+    rng = np.random.default_rng(seed)
+    return np.round(10 * np.exp(np.cumsum(rng.normal(0, 0.02, n))), 2)
+
+
+def make_rough_series(n, seed=0):
+    """
+    带异常值的合成序列：make_series 之上加一段 1e12 量级的大数、几个 ±inf 和 NaN
+
+    用于检查 numpy 实现在大数/inf 离开窗口后能恢复到与 pandas 一致（前缀和相减的实现在这里会失准）
+    """
+    S = make_series(n, seed)
+    k = max(n // 10, 1)
+    S[k:2 * k] *= 1e12
+    S[3 * k] = np.inf
+    S[5 * k] = -np.inf
+    S[7 * k] = np.nan
+    return S
+
+
+def max_rel_diff(a, b):
+    """两个结果的最大相对误差，NaN 位置不一致返回 inf；相等的 ±inf 视为无误差"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if a.shape != b.shape or not np.array_equal(np.isnan(a), np.isnan(b)):
+        return np.inf
+    mask = ~np.isnan(a) & (a != b)
+    if not mask.any():
+        return 0.0
+    return float(np.max(np.abs(a[mask] - b[mask]) / np.maximum(np.abs(a[mask]), 1e-12)))
+
+
+def bench(name, n, number=200):
+    """
+    单个函数在 n 根K线上的计时
+
+    返回:
+        tuple: (numpy耗时us, pandas耗时us（无pandas backend的函数为改写前实现）, 最大相对误差, 异常数据上的最大相对误差)
+    """
+    fn = CASES[name]
+    S = make_series(n)
+    rough = make_rough_series(n)
+    result = {}
+    for backend in ('numpy', 'pandas'):
+        tdx_indicator.set_backend(backend)
+        call = LEGACY.get(name, fn) if backend == 'pandas' else fn
+        result[backend] = call(S)
+        result[backend + '_rough'] = call(rough)
+        result[backend + '_us'] = timeit.timeit(lambda: call(S), number=number) / number * 1e6
+    tdx_indicator.set_backend('numpy')
+    return (result['numpy_us'], result['pandas_us'], max_rel_diff(result['pandas'], result['numpy']),
+            max_rel_diff(result['pandas_rough'], result['numpy_rough']))
+
+
+# ==================== 全部指标函数 ====================
+
+# 参数名 -> 合成数据列（见 make_bars），参数名沿用 tdx_indicator 中的写法（含 VOl、CLSOE 等笔误）
+INPUTS = {
+    'CLOSE': 'close', 'C': 'close', 'CLSOE': 'close', 'S': 'close', 'S1': 'close', 'X': 'close', 'X1': 'close',
+    'A': 'close', 'P': 'close', 'data': 'close', 'S2': 'ma5',
+    'OPEN': 'open', 'HIGH': 'high', 'LOW': 'low', 'B': 'low',
+    'VOL': 'vol', 'VOl': 'vol', 'AMOUNT': 'amount', 'CAPITAL': 'capital', 'HSL': 'hsl',
+    'INDEXC': 'index_close', 'INDEXO': 'index_open', 'INDEXH': 'index_high', 'INDEXL': 'index_low',
+    'INDEXV': 'index_vol',
+}
+
+# 没有默认值的数值参数
+PARAMS = {'N': 10, 'M': 3, 'n': 1}
+
+# 个别函数的参数取值（同名参数在这些函数里含义不同）
+OVERRIDES = {
+    'LAST': {'A': 5, 'B': 1},
+    'DMA': {'A': 0.1},
+}
+
+MUTATES = {'FILTER'}    # 原地修改输入的函数，每次调用传入副本
+
+
+def make_bars(n, stocks=None, seed=0):
+    """
+    生成合成 OHLCV 数据（随机游走），stocks 不为 None 时生成 股票×K线 面板
+
+    返回:
+        dict: 列名 -> 序列/面板，列见 INPUTS
+    """
+    rng = np.random.default_rng(seed)
+    shape = (n,) if stocks is None else (stocks, n)
+
+    def walk(base):
+        return np.round(base * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=-1)), 2)
+
+    bars = {}
+    for prefix, base in (('', 10), ('index_', 3000)):
+        close = walk(base)
+        spread = rng.uniform(0, 0.03, shape)
+        bars[prefix + 'close'] = close
+        bars[prefix + 'high'] = np.round(close * (1 + spread), 2)
+        bars[prefix + 'low'] = np.round(close * (1 - spread), 2)
+        bars[prefix + 'open'] = np.round(close * (1 + rng.uniform(-1, 1, shape) * spread), 2)
+        bars[prefix + 'vol'] = np.round(rng.lognormal(10, 1, shape))
+    bars['amount'] = bars['vol'] * bars['close'] * 100
+    bars['capital'] = np.full(shape, 1e7)
+    bars['hsl'] = bars['vol'] / 1e5
+    bars['ma5'] = tdx_indicator.MA(bars['close'], 5)
+    return bars
+
+
+def indicator_functions():
+    """tdx_indicator 中的全部指标函数（大写函数名），按名字排序"""
+    return {name: fn for name, fn in inspect.getmembers(tdx_indicator, inspect.isfunction)
+            if name[:1].isupper() and fn.__module__ == tdx_indicator.__name__}
+
+
+def build_call(fn, bars):
+    """
+    按参数名从 bars 取输入，组成无参调用
+
+    返回:
+        callable，参数名无法识别时返回 None
+    """
+    args = []
+    overrides = OVERRIDES.get(fn.__name__, {})
+    for p in inspect.signature(fn).parameters.values():
+        if p.default is not p.empty:
+            continue
+        if p.name in overrides:
+            args.append(overrides[p.name])
+        elif p.name in INPUTS:
+            args.append(bars[INPUTS[p.name]])
+        elif p.name in PARAMS:
+            args.append(PARAMS[p.name])
+        else:
+            return None
+    if fn.__name__ in MUTATES:
+        return lambda: fn(*[a.copy() if isinstance(a, np.ndarray) else a for a in args])
+    return lambda: fn(*args)
+
+
+def measure(call, budget=0.2, max_number=1000):
+    """
+    计时 + 峰值内存
+
+    先调用一次（预热，同时估计单次耗时），再按 budget 秒决定重复次数；峰值内存用 tracemalloc 单独跑一次
+
+    返回:
+        dict: {'us': 单次耗时(微秒), 'peak_kb': 峰值内存(KB), 'number': 重复次数}
+    """
+    start = time.perf_counter()
+    call()
+    first = time.perf_counter() - start
+    number = int(min(max(budget / max(first, 1e-9), 1), max_number))
+    us = first * 1e6 if number == 1 else timeit.timeit(call, number=number) / number * 1e6
+
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'us': us, 'peak_kb': peak / 1024, 'number': number}
+
+
+def run_suite(names=None, lengths=SUITE_LENGTHS, panel=PANEL_SHAPE, budget=0.2, verbose=True):
+    """
+    对全部（或指定）指标函数在各长度的合成数据上计时
+
+    参数:
+        names: 函数名列表，None 表示全部
+        lengths: K线数列表
+        panel: (股票数, K线数)，None 表示不测面板；函数不支持面板（报错或结果不是二维）时记为不支持
+        budget: 每项计时的目标总时长（秒）
+        verbose: 是否逐项打印
+
+    返回:
+        dict: {'函数名/K线数' 或 '函数名/panel': {'us', 'peak_kb', 'number'} 或 {'error': 原因}}
+    """
+    funcs = indicator_functions()
+    names = names or list(funcs)
+    datasets = [(str(n), make_bars(n)) for n in lengths]
+    if panel:
+        datasets.append(('panel', make_bars(panel[1], stocks=panel[0])))
+
+    results = {}
+    for name in names:
+        for label, bars in datasets:
+            key = f"{name}/{label}"
+            call = build_call(funcs[name], bars)
+            if call is None:
+                results[key] = {'error': '参数无法识别'}
+            else:
+                try:
+                    results[key] = measure(call, budget)
+                    if label == 'panel' and not _is_panel(call(), panel):
+                        results[key] = {'error': '不支持面板'}
+                except Exception as e:
+                    reason = f"{type(e).__name__}: {str(e)[:60]}"
+                    results[key] = {'error': f"不支持面板（{reason}）" if label == 'panel' else reason}
+            if verbose:
+                print(_format_row(key, results[key]), flush=True)
+    return results
+
+
+def compare_baseline(results, baseline, threshold=1.3, min_us=20):
+    """
+    与基线对比，找出变慢的函数
+
+    参数:
+        results: run_suite 的返回值
+        baseline: 之前保存的 run_suite 结果
+        threshold: 耗时超过基线的倍数视为变慢
+        min_us: 耗时增加不足该值（微秒）的忽略，避免小函数的计时噪声
+
+    返回:
+        list[tuple]: [(键, 当前耗时us, 基线耗时us)]，当前失败而基线正常的项当前耗时为 None
+    """
+    slow = []
+    for key, old in baseline.items():
+        new = results.get(key)
+        if new is None or 'us' not in old:
+            continue
+        if 'us' not in new:
+            slow.append((key, None, old['us']))
+        elif new['us'] > old['us'] * threshold and new['us'] - old['us'] > min_us:
+            slow.append((key, new['us'], old['us']))
+    return slow
+
+
+def load_baseline(path=BASELINE_FILE):
+    """读取基线，文件不存在返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    """保存基线（只保存成功的项）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({k: v for k, v in results.items() if 'us' in v}, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+def _is_panel(result, panel):
+    parts = result if isinstance(result, tuple) else (result,)
+    return all(np.shape(p) == tuple(panel) for p in parts)
+
+
+def _format_row(key, r):
+    if 'error' in r:
+        return f"{key:<24} {'-':>12} {'-':>10}  {r['error']}"
+    return f"{key:<24} {r['us']:>12.1f} {r['peak_kb']:>10.1f}"
+
+
+def _run_compare(names, number):
+    """打印对比表，有函数在异常数据上与 pandas 不一致（相对误差超过1e-9）时返回 False"""
+    print(f"{'函数':<8} {'K线数':>6} {'numpy(us)':>10} {'pandas(us)':>11} {'加速':>7} {'最大相对误差':>12} {'异常数据误差':>12}")
+    ok = True
+    for name in names:
+        for n in LENGTHS:
+            t_np, t_pd, diff, rough = bench(name, n, number)
+            ok &= rough <= 1e-9
+            print(f"{name:<8} {n:>6} {t_np:>10.1f} {t_pd:>11.1f} {t_pd / t_np:>6.1f}x {diff:>12.1e} {rough:>12.1e}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="tdx_indicator 性能基准")
+    parser.add_argument("--backend", help="只做0级函数 numpy/pandas 实现对比", action="store_true")
+    parser.add_argument("--func", help="函数名，逗号分隔，默认全部", default="")
+    parser.add_argument("--number", help="--backend 模式的计时重复次数，默认200", type=int, default=200)
+    parser.add_argument("--budget", help="每项计时的目标总时长(秒)，默认0.2", type=float, default=0.2)
+    parser.add_argument("--lengths", help="K线数，逗号分隔，默认240,300,1800,10000",
+                        default=",".join(str(n) for n in SUITE_LENGTHS))
+    parser.add_argument("--no-panel", help="不测 5500只股票 的面板", action="store_true")
+    parser.add_argument("--baseline", help=f"基线文件，默认 {os.path.relpath(BASELINE_FILE)}", default=BASELINE_FILE)
+    parser.add_argument("--save", help="把本次结果保存为基线", action="store_true")
+    parser.add_argument("--threshold", help="耗时超过基线的倍数视为变慢，默认1.3", type=float, default=1.3)
+    parser.add_argument("--top", help="最后列出最慢的N项，默认20", type=int, default=20)
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+    names = [n.strip() for n in args.func.split(',') if n.strip()] or None
+
+    if args.backend:
+        sys.exit(0 if _run_compare(names or list(CASES.keys()), args.number) else 1)
+
+    print(f"{'函数/K线数':<24} {'耗时(us)':>12} {'峰值(KB)':>10}")
+    results = run_suite(names, [int(n) for n in args.lengths.split(',') if n.strip()],
+                        None if args.no_panel else PANEL_SHAPE, args.budget)
+
+    timed = sorted(((k, v) for k, v in results.items() if 'us' in v), key=lambda kv: -kv[1]['us'])
+    print(f"\n最慢的 {min(args.top, len(timed))} 项:")
+    for key, r in timed[:args.top]:
+        print(_format_row(key, r))
+    failed = sorted({k.split('/')[0] for k, v in results.items() if 'error' in v and not v['error'].startswith('不支持面板')})
+    if failed:
+        print(f"\n无法运行的函数({len(failed)}): {', '.join(failed)}")
+
+    baseline = load_baseline(args.baseline)
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"\n已保存基线: {args.baseline}")
+    elif baseline is not None:
+        slow = compare_baseline(results, baseline, args.threshold)
+        print(f"\n与基线对比（阈值 {args.threshold}x）: {len(slow)} 项变慢")
+        for key, new, old in slow:
+            print(f"{key:<24} {'失败' if new is None else f'{new:.1f}':>12} 基线 {old:.1f}")
+        if slow:
+            sys.exit(1)
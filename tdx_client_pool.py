@@ -0,0 +1,335 @@
+# tdx_client_pool.py - 通达信行情连接池：测速选择最快服务器、有上限的连接池、心跳保活、断线重连与故障切换
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from mootdx.quotes import Quotes
+from tdx_request_cache import CachedClient, shared_cache
+
+try:
+    from mootdx.consts import HQ_HOSTS
+    DEFAULT_SERVERS = [(host[-2], int(host[-1])) for host in HQ_HOSTS]
+except (ImportError, IndexError, TypeError, ValueError):
+    DEFAULT_SERVERS = []
+
+# 用法:
+#   client = get_client()            # 代替 Quotes.factory(market='std')，可在多个线程间共用，相同请求合并（见 tdx_request_cache）
+#   df = client.bars(symbol='000400', frequency='day', offset=300)
+# client 不持有连接，每次调用从池中借一个连接，用完归还；调用出错且连接已断开时关闭该连接，在另一个连接（另一台服务器）上重试。
+# 服务器按 TCP 建连耗时排序，新连接优先连最快的几台；连不上或心跳失败的服务器冷却一段时间后再用。
+# 服务器全部不可用时退回 Quotes.factory(market='std') 的默认选服方式。
+
+
+class ClientPool:
+    """
+    有上限的 mootdx 连接池
+
+    用法:
+        pool = ClientPool(size=8)
+        client = pool.client()                     # 线程安全的代理客户端，方法与 mootdx 客户端相同
+        with pool.borrow() as raw:                 # 或直接借出一个连接
+            raw.bars(symbol='000400', frequency='day', offset=10)
+    """
+
+    def __init__(self, servers=None, size=8, timeout=5, heartbeat=30, probe_interval=600, cooldown=60,
+                 spread=3, retries=1):
+        """
+        参数:
+            servers: 服务器列表 [(ip, port)]，默认 mootdx 自带的行情服务器列表
+            size: 最大连接数，连接全部借出时 acquire 等待
+            timeout: 建连/测速超时(秒)
+            heartbeat: 心跳间隔(秒)，空闲超过该时间的连接发一次轻量请求，失败的连接关闭；0 不启动心跳
+            probe_interval: 重新测速排序的间隔(秒)
+            cooldown: 服务器出错后暂停使用的时间(秒)
+            spread: 新连接轮流分布在最快的前几台服务器上
+            retries: 连接断开导致调用失败后换连接重试的次数
+        """
+        self.servers = list(DEFAULT_SERVERS if servers is None else servers)
+        self.size = size
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        self.probe_interval = probe_interval
+        self.cooldown = cooldown
+        self.spread = spread
+        self.retries = retries
+
+        self.ranking = []           # [(延迟秒, (ip, port))]，按延迟升序，只含测速成功的服务器
+        self._probed_at = None
+        self._probe_lock = threading.Lock()
+        self._down = {}             # 服务器 -> 冷却结束时间
+        self._idle = deque()        # 空闲连接，后进先出（最近用过的连接最可能还活着）
+        self._total = 0             # 已创建（空闲+借出）的连接数
+        self._created = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+
+    # ---------- 服务器测速 ----------
+
+    def rank_servers(self):
+        """并发测量每台服务器的 TCP 建连耗时，按耗时排序，返回 [(延迟秒, (ip, port))]"""
+        def _probe(server):
+            start = time.perf_counter()
+            try:
+                with socket.create_connection(server, timeout=self.timeout):
+                    return time.perf_counter() - start, server
+            except OSError:
+                return None
+
+        ranking = []
+        if self.servers:
+            with ThreadPoolExecutor(max_workers=min(16, len(self.servers))) as executor:
+                ranking = sorted(r for r in executor.map(_probe, self.servers) if r is not None)
+        with self._cond:
+            self.ranking = ranking
+            self._probed_at = time.monotonic()
+        return ranking
+
+    def _candidates(self):
+        """新连接依次尝试的服务器：最快的前 spread 台轮流作为首选，其余按延迟排在后面，冷却中的排除"""
+        with self._probe_lock:
+            if self._probed_at is None or time.monotonic() - self._probed_at > self.probe_interval:
+                self.rank_servers()
+        now = time.monotonic()
+        with self._cond:
+            healthy = [server for _, server in self.ranking if self._down.get(server, 0) <= now]
+            first = self._created % min(self.spread, len(healthy)) if healthy else 0
+            self._created += 1
+        return healthy[first:] + healthy[:first]
+
+    def _mark_down(self, server):
+        if server is not None:
+            with self._cond:
+                self._down[server] = time.monotonic() + self.cooldown
+
+    # ---------- 连接 ----------
+
+    def _connect(self):
+        for server in self._candidates():
+            try:
+                client = Quotes.factory(market='std', server=server, timeout=self.timeout)
+                if _ping(client):
+                    return _Conn(client, server)
+                _close(client)
+            except Exception as e:
+                print(f"[TDX] 连接 {server[0]}:{server[1]} 失败: {e}")
+            self._mark_down(server)
+        # 测速全部失败（或没有服务器列表）时交给 mootdx 自己选服
+        return _Conn(Quotes.factory(market='std'), None)
+
+    def acquire(self, wait=None):
+        """
+        借出一个连接（没有空闲连接且未达上限时新建）
+
+        参数:
+            wait: 连接全部借出时的最长等待时间(秒)，默认一直等待
+
+        返回:
+            _Conn: conn.client 为 mootdx 客户端，用完必须 release
+        """
+        deadline = None if wait is None else time.monotonic() + wait
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("连接池已关闭")
+                if self._idle:
+                    return self._idle.pop()
+                if self._total < self.size:
+                    self._total += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"等待行情连接超时（{self.size}个连接全部在用）")
+                self._cond.wait(remaining)
+        self._start_heartbeat()
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, broken=False):
+        """归还连接；broken=True 时关闭连接，该服务器进入冷却"""
+        if broken:
+            self._mark_down(conn.server)
+        with self._cond:
+            drop = broken or self._closed
+            if drop:
+                self._total -= 1
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+        if drop:
+            _close(conn.client)
+
+    @contextmanager
+    def borrow(self, wait=None):
+        """with pool.borrow() as client: ... 出异常且连接心跳失败时视为连接损坏"""
+        conn = self.acquire(wait)
+        try:
+            yield conn.client
+        except Exception:
+            self.release(conn, broken=not _ping(conn.client))
+            raise
+        self.release(conn)
+
+    def call(self, method, *args, **kwargs):
+        """
+        借一个连接调用 client.method(*args, **kwargs)
+
+        出错后连接仍能通过心跳的（如参数错误）直接抛出异常；心跳失败的关闭该连接，换连接重试 retries 次
+        """
+        for attempt in range(self.retries + 1):
+            conn = self.acquire()
+            try:
+                result = getattr(conn.client, method)(*args, **kwargs)
+            except Exception:
+                broken = not _ping(conn.client)
+                self.release(conn, broken=broken)
+                if not broken or attempt == self.retries:
+                    raise
+                continue
+            self.release(conn)
+            return result
+
+    def client(self):
+        """线程安全的代理客户端，接口与 mootdx 客户端相同"""
+        return PooledClient(self)
+
+    # ---------- 心跳 ----------
+
+    def _start_heartbeat(self):
+        if self.heartbeat <= 0 or self._heartbeat_thread is not None:
+            return
+        with self._cond:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='tdx-heartbeat',
+                                                          daemon=True)
+                self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat):
+            now = time.monotonic()
+            with self._cond:
+                stale = [conn for conn in self._idle if now - conn.last_used >= self.heartbeat]
+                for conn in stale:
+                    self._idle.remove(conn)     # 检查期间不借出，仍计入连接数
+            for conn in stale:
+                self.release(conn, broken=not _ping(conn.client))
+            with self._probe_lock:
+                if self._probed_at is not None and time.monotonic() - self._probed_at > self.probe_interval:
+                    self.rank_servers()
+
+    def close(self):
+        """关闭所有空闲连接并停止心跳，借出中的连接归还时关闭"""
+        self._stop.set()
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            _close(conn.client)
+
+    def stats(self):
+        """连接数统计 {'total', 'idle', 'in_use', 'servers'}"""
+        with self._cond:
+            servers = {}
+            for conn in self._idle:
+                servers[conn.server] = servers.get(conn.server, 0) + 1
+            return {'total': self._total, 'idle': len(self._idle), 'in_use': self._total - len(self._idle),
+                    'servers': servers}
+
+
+class _Conn:
+    __slots__ = ('client', 'server', 'last_used')
+
+    def __init__(self, client, server):
+        self.client = client
+        self.server = server
+        self.last_used = time.monotonic()
+
+
+class PooledClient:
+    """
+    连接池的代理客户端：client.bars(...) 等调用转发到池中的某个连接
+
+    本身不持有连接，可在多个线程间共用，连接断开后下一次调用自动换连接
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def _method(*args, **kwargs):
+            return self._pool.call(name, *args, **kwargs)
+
+        _method.__name__ = name
+        return _method
+
+    def __repr__(self):
+        return f"PooledClient({self._pool.stats()})"
+
+
+def _ping(client):
+    """轻量请求（沪市股票数量）检查连接是否可用"""
+    try:
+        return client.stock_count(market=1) is not None
+    except Exception:
+        return False
+
+
+def _close(client):
+    try:
+        getattr(client, 'close', lambda: None)()
+    except Exception:
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_options = {}
+
+
+def configure_pool(**options):
+    """设置全局连接池的参数（见 ClientPool），已创建的全局连接池会关闭并按新参数重建"""
+    global _pool
+    with _pool_lock:
+        _pool_options.update(options)
+        old, _pool = _pool, None
+    if old is not None:
+        old.close()
+
+
+def get_pool():
+    """全局连接池，第一次使用时创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool(**_pool_options)
+        return _pool
+
+
+def get_client(cache=True):
+    """
+    全局连接池的代理客户端，代替 Quotes.factory(market='std')
+
+    参数:
+        cache: 是否经过进程内共用的请求合并与短时缓存（tdx_request_cache），同一进程中多个工具
+               在同一时间请求相同数据时只发一次请求
+    """
+    client = get_pool().client()
+    return CachedClient(client, shared_cache()) if cache else client
@@ -0,0 +1,293 @@
+# tdx_fake_server.py - 本地模拟通达信行情服务器，用于验证 tdx_async 的协议编解码、多路复用和吞吐
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import asyncio
+import multiprocessing
+import struct
+import time
+import zlib
+from datetime import date, timedelta
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import tdx_async as tdx_async
+
+# 用法:
+#   python tdx_fake_server.py --codes 500 --offset 1800 --latency 0.005
+# 在子进程中启动本地服务器，用 AsyncTdxClient 下载K线/分时/行情并与服务器端的原始数据逐项比对，打印吞吐；
+# 不一致时退出码为1。服务器按请求顺序逐个处理同一连接上的请求（与真实服务器一致），latency 模拟每个请求的处理耗时。
+
+N_BARS = 2400       # 每只股票每个周期的K线数
+LAST_DAY = date(2026, 5, 20)
+
+
+class FakeTdxServer:
+    """按股票代码生成确定性数据的通达信协议服务器"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, compress=True):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.compress = compress
+        self.requests = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                _, seq, flag, size, _, cmd = tdx_async._HEADER.unpack(await reader.readexactly(tdx_async._HEADER.size))
+                body = await reader.readexactly(size - 2)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                self.requests += 1
+                payload = self._dispatch(cmd, body)
+                packed = zlib.compress(payload) if self.compress and len(payload) > 64 else payload
+                writer.write(tdx_async._RESPONSE_HEADER.pack(0x0074cbb1, 0x0c, seq, 0, cmd, len(packed), len(payload))
+                             + packed)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, cmd, body):
+        if cmd == tdx_async.CMD_BARS:
+            market, code, category, _, start, count = struct.unpack_from('<H6sHHHH', body)
+            return encode_bars(fake_bars(code.decode(), category), category, start, count)
+        if cmd == tdx_async.CMD_MINUTES:
+            day, _, code = struct.unpack('<IB6s', body)
+            return encode_minutes(fake_minutes(code.decode(), day))
+        if cmd == tdx_async.CMD_QUOTES:
+            (n,) = struct.unpack_from('<H', body, 8)
+            codes = [struct.unpack_from('<B6s', body, 10 + i * 7) for i in range(n)]
+            return encode_quotes([(market, code.decode()) for market, code in codes])
+        return b'\x00' * 8     # 握手
+
+
+# ==================== 模拟数据 ====================
+
+def _rng(*key):
+    return np.random.default_rng(zlib.crc32(repr(key).encode()))
+
+
+@lru_cache(maxsize=None)
+def fake_bars(code, category):
+    """整数价格（厘）的K线: dict 数组 open/close/high/low/vol/amount/date/minutes"""
+    rng = _rng(code, category)
+    close = np.round(10000 * np.exp(np.cumsum(rng.normal(0, 0.02, N_BARS)))).astype(np.int64) + 500
+    open_ = np.round(close * (1 + rng.normal(0, 0.005, N_BARS))).astype(np.int64)
+    high = np.maximum(open_, close) + rng.integers(0, 200, N_BARS)
+    low = np.maximum(np.minimum(open_, close) - rng.integers(0, 200, N_BARS), 1)
+    vol = rng.integers(1000, 10 ** 8, N_BARS).astype(np.float32).astype(float)
+    amount = (vol * close / 1000).astype(np.float32).astype(float)
+    days, d = [], LAST_DAY
+    while len(days) < N_BARS:
+        if d.weekday() < 5:
+            days.append(d)
+        d -= timedelta(days=1)
+    days = days[::-1]
+    return {'open': open_, 'close': close, 'high': high, 'low': low, 'vol': vol, 'amount': amount,
+            'date': np.array([x.year * 10000 + x.month * 100 + x.day for x in days]),
+            'minutes': np.full(N_BARS, 15 * 60)}
+
+
+def fake_minutes(code, day):
+    """整数价格（分）的分时: (price, vol)"""
+    rng = _rng(code, day)
+    price = np.round(1000 * np.exp(np.cumsum(rng.normal(0, 0.002, 240)))).astype(np.int64)
+    return price, rng.integers(1, 50000, 240)
+
+
+def fake_quote(code):
+    """整数价格（分）的行情 dict"""
+    rng = _rng(code, 'quote')
+    last_close = int(rng.integers(500, 5000))
+    price = last_close + int(rng.integers(-50, 50))
+    quote = {'price': price, 'last_close': last_close, 'open': last_close + int(rng.integers(-20, 20)),
+             'high': price + int(rng.integers(0, 30)), 'low': price - int(rng.integers(0, 30)),
+             'vol': int(rng.integers(1000, 10 ** 7)), 'cur_vol': int(rng.integers(1, 1000)),
+             'amount': float(np.float32(rng.integers(10 ** 6, 10 ** 9))),
+             's_vol': int(rng.integers(0, 10 ** 6)), 'b_vol': int(rng.integers(0, 10 ** 6))}
+    for level in range(1, 6):
+        quote[f'bid{level}'] = price - level
+        quote[f'ask{level}'] = price + level
+        quote[f'bid_vol{level}'] = int(rng.integers(1, 10000))
+        quote[f'ask_vol{level}'] = int(rng.integers(1, 10000))
+    return quote
+
+
+# ==================== 编码（tdx_async 解码的逆过程） ====================
+
+def _price(v):
+    v = int(v)
+    negative, v = v < 0, abs(v)
+    out = bytearray([(v & 0x3f) | (0x40 if negative else 0)])
+    v >>= 6
+    while v:
+        out[-1] |= 0x80
+        out.append(v & 0x7f)
+        v >>= 7
+    return bytes(out)
+
+
+def _volume(v):
+    # 4字节浮点编码与 IEEE float32 的位布局相同（正数、值不小于128时两者解码一致）
+    return struct.pack('<f', v)
+
+
+def encode_bars(bars, category, start, count):
+    end = max(N_BARS - start, 0)
+    begin = max(end - count, 0)
+    out = bytearray(struct.pack('<H', end - begin))
+    prev_close = 0
+    for i in range(begin, end):
+        d = int(bars['date'][i])
+        if category < 4 or category in (7, 8):
+            zipday = ((d // 10000 - 2004) << 11) + d % 10000 // 100 * 100 + d % 100
+            out += struct.pack('<HH', zipday, int(bars['minutes'][i]))
+        else:
+            out += struct.pack('<I', d)
+        o = int(bars['open'][i])
+        out += _price(o - prev_close) + _price(bars['close'][i] - o) + _price(bars['high'][i] - o) + \
+            _price(bars['low'][i] - o) + _volume(bars['vol'][i]) + _volume(bars['amount'][i])
+        prev_close = int(bars['close'][i])
+    return bytes(out)
+
+
+def encode_minutes(data):
+    price, vol = data
+    out = bytearray(struct.pack('<H', len(price)) + b'\x00' * 4)
+    last = 0
+    for p, v in zip(price, vol):
+        out += _price(p - last) + _price(0) + _price(v)
+        last = int(p)
+    return bytes(out)
+
+
+def encode_quotes(codes):
+    out = bytearray(b'\xb1\xcb' + struct.pack('<H', len(codes)))
+    for market, code in codes:
+        q = fake_quote(code)
+        p = q['price']
+        out += struct.pack('<B6sH', market, code.encode(), 1)
+        out += b''.join(_price(v) for v in (p, q['last_close'] - p, q['open'] - p, q['high'] - p, q['low'] - p,
+                                             14300000, 0, q['vol'], q['cur_vol']))
+        out += _volume(q['amount'])
+        out += b''.join(_price(v) for v in (q['s_vol'], q['b_vol'], 0, 0))
+        for level in range(1, 6):
+            out += _price(q[f'bid{level}'] - p) + _price(q[f'ask{level}'] - p) + \
+                _price(q[f'bid_vol{level}']) + _price(q[f'ask_vol{level}'])
+        out += struct.pack('<H', 0) + _price(0) * 4 + struct.pack('<hH', 0, 1)
+    return bytes(out)
+
+
+# ==================== 自检 ====================
+
+def _check_bars(code, df, offset):
+    truth = fake_bars(code, tdx_async.CATEGORIES['day'])
+    sl = slice(N_BARS - min(offset, N_BARS), N_BARS)
+    expect = pd.DataFrame({c: truth[c][sl] / 1000 for c in ('open', 'close', 'high', 'low')})
+    ok = len(df) == len(expect)
+    ok = ok and all(np.allclose(df[c].values, expect[c].values, rtol=0, atol=1e-9) for c in expect)
+    ok = ok and np.array_equal(df['vol'].values, truth['vol'][sl]) and np.array_equal(df['amount'].values,
+                                                                                     truth['amount'][sl])
+    dates = df['year'].values * 10000 + df['month'].values * 100 + df['day'].values
+    return ok and np.array_equal(dates, truth['date'][sl])
+
+
+def _check_minutes(code, day, df):
+    price, vol = fake_minutes(code, day)
+    return np.allclose(df['price'].values, price / 100, rtol=0, atol=1e-9) and np.array_equal(df['vol'].values, vol)
+
+
+def _check_quotes(df, codes):
+    if list(df['code']) != list(codes):
+        return False
+    for _, row in df.iterrows():
+        q = fake_quote(row['code'])
+        if any(abs(row[k] - q[k] / 100) > 1e-9 for k in ('price', 'last_close', 'open', 'high', 'low', 'bid5')):
+            return False
+        if any(row[k] != q[k] for k in ('vol', 'cur_vol', 'amount', 's_vol', 'b_vol', 'ask_vol3')):
+            return False
+    return True
+
+
+def serve(port_queue, stats_queue, latency=0.0):
+    """在子进程中运行服务器（与客户端不争抢同一个解释器），收到 stats_queue 的请求时回报请求数"""
+    async def _main():
+        server = await FakeTdxServer(latency=latency).start()
+        port_queue.put(server.port)
+        loop = asyncio.get_running_loop()
+        while True:
+            if await loop.run_in_executor(None, stats_queue.get) is None:
+                break
+            port_queue.put(server.requests)
+            server.requests = 0
+        await server.stop()
+
+    asyncio.run(_main())
+
+
+async def self_check(n_codes=500, offset=1800, connections=4, latency=0.0, day=20260420):
+    port_queue, stats_queue = multiprocessing.Queue(), multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(port_queue, stats_queue, latency), daemon=True)
+    process.start()
+    address = ('127.0.0.1', port_queue.get(timeout=30))
+
+    def _requests():
+        stats_queue.put(True)
+        return port_queue.get(timeout=30)
+
+    codes = [f'{600000 + i:06d}' if i % 2 else f'{i:06d}' for i in range(n_codes)]
+    failed = 0
+    try:
+        async with tdx_async.AsyncTdxClient(servers=[address], connections=connections) as client:
+            _requests()
+            for name, fetch, check in [
+                ('K线', lambda c: client.bars(c, 'day', offset), lambda c, df: _check_bars(c, df, offset)),
+                ('分时', lambda c: client.minutes(c, day), lambda c, df: _check_minutes(c, day, df)),
+            ]:
+                start = time.perf_counter()
+                dfs = await asyncio.gather(*(fetch(code) for code in codes))
+                elapsed = time.perf_counter() - start
+                requests = _requests()
+                bad = [code for code, df in zip(codes, dfs) if not check(code, df)]
+                failed += len(bad)
+                print(f"{name}: {n_codes}只 {requests}个请求 {elapsed:.2f}s "
+                      f"({requests / elapsed:.0f} 请求/s)  不一致 {len(bad)} {bad[:5]}")
+
+            start = time.perf_counter()
+            df = await client.quotes(codes)
+            ok = _check_quotes(df, codes)
+            failed += not ok
+            print(f"行情: {n_codes}只 {time.perf_counter() - start:.2f}s  {'一致' if ok else '不一致'}")
+    finally:
+        stats_queue.put(None)
+        process.join(10)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟通达信服务器，验证 tdx_async 客户端")
+    parser.add_argument("--codes", help="股票数，默认500", type=int, default=500)
+    parser.add_argument("--offset", help="每只股票K线根数，默认1800", type=int, default=1800)
+    parser.add_argument("--connections", help="连接数，默认4", type=int, default=4)
+    parser.add_argument("--latency", help="服务器处理每个请求的耗时(秒)，默认0", type=float, default=0.0)
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(self_check(args.codes, args.offset, args.connections, args.latency)) else 0)
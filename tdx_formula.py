@@ -0,0 +1,293 @@
+# tdx_formula.py - 通达信公式编译器（词法分析 -> Pratt语法分析 -> 表达式DAG(公共子表达式消除) -> 可复用的计算函数）
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import re
+import numpy as np
+import tdx_indicator as tdx_indicator
+
+# 行情列名（不区分大小写）-> 输入数据中的列名
+INPUTS = {
+    'C': 'close', 'CLOSE': 'close',
+    'O': 'open', 'OPEN': 'open',
+    'H': 'high', 'HIGH': 'high',
+    'L': 'low', 'LOW': 'low',
+    'V': 'vol', 'VOL': 'vol', 'VOLUME': 'vol',
+    'AMO': 'amount', 'AMOUNT': 'amount',
+}
+
+CONSTANTS = {'DRAWNULL': np.nan}
+
+# tdx_indicator 之外补充的通达信函数，以及调用前需要包装的 tdx_indicator 函数
+BUILTINS = {
+    'NOT': np.logical_not,
+    'SQRT': np.sqrt,
+    'POW': np.power,
+    'LN': np.log,
+    'LOG': np.log10,
+    'EXP': np.exp,
+    'SIGN': np.sign,
+    'FILTER': lambda S, N: tdx_indicator.FILTER(np.array(S), N),    # tdx_indicator.FILTER 原地修改，传入副本，避免改动被复用的中间结果
+}
+
+_TOKEN = re.compile(r'''
+    (?P<skip>\s+|\{[^}]*\}|//[^\n]*)
+  | (?P<num>\d+\.?\d*|\.\d+)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op>:=|>=|<=|<>|!=|==|&&|\|\||[-+*/()<>=:;,])
+''', re.X)
+
+_WORD_OPS = {'AND': '&&', 'OR': '||'}
+
+# 二元运算符：绑定优先级, 计算函数
+_BINARY = {
+    '||': (10, np.logical_or),
+    '&&': (20, np.logical_and),
+    '=': (30, np.equal), '==': (30, np.equal),
+    '<>': (30, np.not_equal), '!=': (30, np.not_equal),
+    '>': (30, np.greater), '<': (30, np.less),
+    '>=': (30, np.greater_equal), '<=': (30, np.less_equal),
+    '+': (40, np.add), '-': (40, np.subtract),
+    '*': (50, np.multiply), '/': (50, np.divide),
+}
+_UNARY_BP = 60
+_COMMUTATIVE = {'||', '&&', '=', '==', '<>', '!=', '+', '*'}
+
+
+class Formula:
+    """
+    编译后的公式，可反复调用
+
+    调用:
+        formula(data)  data 为 DataFrame 或 dict，包含公式用到的列（close/open/high/low/vol/amount），
+                       每列可以是1维序列，也可以是2维面板(股票×K线，见 tdx_indicator.to_panel)
+    返回:
+        dict: {输出名: 序列}，按公式中的输出顺序
+    """
+
+    def __init__(self, steps, outputs, inputs):
+        self._steps = steps       # [(函数, 参数)]，参数为 ('node', id) 或常量，已按依赖排好序
+        self.outputs = outputs    # {输出名: 节点id 或 常量}
+        self.inputs = inputs      # 用到的输入列
+
+    def __call__(self, data):
+        values = []
+        for fn, args in self._steps:
+            if fn is None:
+                values.append(np.array(data[args], dtype=float))     # 复制，不修改调用方的数据
+                continue
+            values.append(fn(*[values[a[1]] if isinstance(a, tuple) else a for a in args]))
+        return {name: values[ref[1]] if isinstance(ref, tuple) else ref for name, ref in self.outputs.items()}
+
+    def __repr__(self):
+        return f"Formula(outputs={list(self.outputs)}, inputs={self.inputs}, nodes={len(self._steps)})"
+
+
+def compile_formula(text, **params):
+    """
+    编译通达信公式
+
+    支持 ':=' 中间变量、':' 输出、未命名输出、{...} 和 // 注释、AND/OR/&&/||、NOT()、
+    比较 = <> != > < >= <=、以及输出行后的绘图属性（,COLORRED ,NODRAW 等，忽略）。
+    函数调用映射到 tdx_indicator 中的同名函数，相同的子表达式（如 KDJ 中两次出现的 LLV(LOW,N)）只计算一次。
+
+    参数:
+        text: 公式文本，如 'RSV:=(C-LLV(L,N))/(HHV(H,N)-LLV(L,N))*100;K:SMA(RSV,3,1);'
+        params: 公式参数，如 N=9
+
+    返回:
+        Formula: 可调用对象，见 Formula
+    """
+    return _Compiler(_tokenize(text), {k.upper(): v for k, v in params.items()}).compile()
+
+
+def load_formula(path, **params):
+    """从文件读取并编译通达信公式（params_data 的替代）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return compile_formula(f.read(), **params)
+
+
+# ==================== 词法分析 ====================
+
+def _tokenize(text):
+    """返回 [(类型, 值, 行号)]，类型为 num / name / op / end"""
+    tokens = []
+    pos, line = 0, 1
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if m is None:
+            raise ValueError(f"公式第{line}行无法识别的字符: {text[pos]!r}")
+        kind, value = m.lastgroup, m.group()
+        if kind == 'num':
+            num = float(value)
+            tokens.append(('num', int(num) if num.is_integer() else num, line))
+        elif kind == 'name':
+            upper = value.upper()
+            if upper in _WORD_OPS:
+                tokens.append(('op', _WORD_OPS[upper], line))
+            else:
+                tokens.append(('name', upper, line))
+        elif kind == 'op':
+            tokens.append(('op', value, line))
+        line += value.count('\n')
+        pos = m.end()
+    tokens.append(('end', None, line))
+    return tokens
+
+
+# ==================== 语法分析 + DAG ====================
+
+class _Compiler:
+    def __init__(self, tokens, params):
+        self.tokens = tokens
+        self.pos = 0
+        self.params = params
+        self.names = {}       # 公式变量 -> 节点
+        self.nodes = {}       # (运算, 参数) -> 节点id，用于公共子表达式消除
+        self.steps = []
+        self.inputs = []
+
+    # ---------- token 操作 ----------
+
+    def _peek(self):
+        return self.tokens[self.pos]
+
+    def _next(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def _expect(self, value):
+        tok = self._next()
+        if tok[1] != value:
+            self._error(tok, f"缺少 '{value}'")
+        return tok
+
+    def _error(self, tok, msg):
+        found = '公式结尾' if tok[0] == 'end' else repr(tok[1])
+        raise ValueError(f"公式第{tok[2]}行语法错误: {msg}（在 {found} 处）")
+
+    # ---------- 语句 ----------
+
+    def compile(self):
+        outputs = {}
+        while self._peek()[0] != 'end':
+            if self._peek()[1] == ';':
+                self._next()
+                continue
+            name, is_output = None, True
+            tok, nxt = self._peek(), self.tokens[self.pos + 1]
+            if tok[0] == 'name' and nxt[1] in (':=', ':'):
+                name, is_output = tok[1], nxt[1] == ':'
+                self.pos += 2
+            ref = self._expr()
+            if self._peek()[1] == ',':
+                # 绘图属性，如 ,COLORRED ,NODRAW ,LINETHICK2
+                while self._peek()[1] not in (';', None):
+                    self._next()
+            if self._peek()[0] != 'end':
+                self._expect(';')
+            if name is None:
+                name = f'NONAME{len(outputs)}'
+            self.names[name] = ref
+            if is_output:
+                outputs[name] = ref
+        return Formula(self.steps, outputs, self.inputs)
+
+    # ---------- 表达式（Pratt） ----------
+
+    def _expr(self, rbp=0):
+        left = self._nud(self._next())
+        while True:
+            tok = self._peek()
+            bp = _BINARY[tok[1]][0] if tok[0] == 'op' and tok[1] in _BINARY else 0
+            if bp <= rbp:
+                return left
+            self._next()
+            left = self._binary(tok[1], left, self._expr(bp))
+
+    def _nud(self, tok):
+        kind, value = tok[0], tok[1]
+        if kind == 'num':
+            return value
+        if kind == 'op' and value == '(':
+            ref = self._expr()
+            self._expect(')')
+            return ref
+        if kind == 'op' and value == '-':
+            operand = self._expr(_UNARY_BP)
+            return -operand if not isinstance(operand, tuple) else self._node('NEG', np.negative, (operand,))
+        if kind == 'op' and value == '+':
+            return self._expr(_UNARY_BP)
+        if kind == 'name':
+            if self._peek()[1] == '(':
+                return self._call(tok)
+            return self._variable(tok)
+        self._error(tok, "缺少表达式")
+
+    def _call(self, tok):
+        name = tok[1]
+        fn = BUILTINS.get(name) or getattr(tdx_indicator, name, None)
+        if fn is None or name.startswith('_'):
+            self._error(tok, f"未知函数 {name}")
+        self._expect('(')
+        args = []
+        if self._peek()[1] != ')':
+            args.append(self._expr())
+            while self._peek()[1] == ',':
+                self._next()
+                args.append(self._expr())
+        self._expect(')')
+        return self._node(name, fn, tuple(args))
+
+    def _variable(self, tok):
+        name = tok[1]
+        if name in self.names:
+            return self.names[name]
+        if name in self.params:
+            return self.params[name]
+        if name in CONSTANTS:
+            return CONSTANTS[name]
+        if name in INPUTS:
+            column = INPUTS[name]
+            key = ('INPUT', column)
+            if key not in self.nodes:
+                self.nodes[key] = ('node', len(self.steps))
+                self.steps.append((None, column))
+                self.inputs.append(column)
+            return self.nodes[key]
+        self._error(tok, f"未定义的变量 {name}")
+
+    def _binary(self, op, left, right):
+        fn = _BINARY[op][1]
+        if fn in (np.add, np.subtract, np.multiply, np.divide):
+            fn = _ARITH[op]
+        if not isinstance(left, tuple) and not isinstance(right, tuple):
+            with np.errstate(all='ignore'):
+                return fn(left, right)      # 常量折叠
+        args = (left, right)
+        if op in _COMMUTATIVE:
+            args = tuple(sorted(args, key=repr))
+        return self._node(op, fn, args)
+
+    def _node(self, op, fn, args):
+        """同一运算作用于同一组参数时复用已有节点"""
+        key = (op, args)
+        if key not in self.nodes:
+            self.nodes[key] = ('node', len(self.steps))
+            self.steps.append((fn, args))
+        return self.nodes[key]
+
+
+def _num(x):
+    # 比较结果为布尔序列，参与四则运算时按通达信习惯当作 1/0
+    return x.astype(float) if isinstance(x, np.ndarray) and x.dtype == bool else x
+
+
+_ARITH = {
+    '+': lambda a, b: np.add(_num(a), _num(b)),
+    '-': lambda a, b: np.subtract(_num(a), _num(b)),
+    '*': lambda a, b: np.multiply(_num(a), _num(b)),
+    '/': lambda a, b: np.divide(_num(a), _num(b)),
+}
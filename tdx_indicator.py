@@ -4,6 +4,162 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from chip_distribution import chip_indicators
+try:
+    from numba import njit
+    _NUMBA = True
+except ImportError:       #numba为可选依赖，未安装时使用纯NumPy实现
+    _NUMBA = False
+
+def _jit(fn):
+    #有numba时编译循环内核，否则原样返回Python函数
+    return njit(cache=True)(fn) if _NUMBA else fn
+
+def _ts(S, fn):
+    #按时间序列计算：1维序列转Series；2维面板(股票×K线，时间为最后一维)转置成DataFrame按列计算，结果转回原形状
+    if np.ndim(S) == 2: return fn(pd.DataFrame(np.asarray(S).T)).values.T
+    return fn(pd.Series(S)).values
+
+def to_panel(series_list, length=None):
+    #多只股票的序列组成2维面板(股票×K线)，右对齐（最后一根K线对齐），历史较短的股票前面补NaN
+    #length为面板K线数，默认取最长的序列；更长的序列只保留最近length根
+    #前置NaN不影响MA/EMA/SMA/HHV/LLV等的结果，与逐只计算一致
+    arrs = [np.asarray(S, dtype=float) for S in series_list]
+    if length is None: length = max((len(a) for a in arrs), default=0)
+    out = np.full((len(arrs), length), np.nan)
+    for i, a in enumerate(arrs):
+        a = a[len(a)-length:] if len(a) > length else a
+        if len(a): out[i, length-len(a):] = a
+    return out
+
+#------------------   0级函数的NumPy实现（默认），set_backend('pandas') 切回 pd.Series 实现作对照 ------------------
+_BACKEND = 'numpy'
+
+def set_backend(name):
+    #切换0级函数(REF/DIFF/STD/SUM/HHV/LLV/MA/EMA/SMA/DMA)的实现：'numpy'(默认) / 'pandas'
+    #numpy与pandas结果一致：REF/DIFF/HHV/LLV逐位相同；MA/SUM/EMA/SMA/DMA因求和顺序不同有<1e-12的相对误差；
+    #STD用两遍法，比pandas滑动在线算法更精确，两者差异约1e-12~1e-9（来自pandas一侧）
+    global _BACKEND
+    if name not in ('numpy', 'pandas'): raise ValueError(f"未知backend: {name}")
+    _BACKEND = name
+
+def _use_np(N=1):
+    #N为正整数且使用numpy实现时返回True；N为0/序列等特殊参数仍走pandas实现
+    return _BACKEND == 'numpy' and isinstance(N, (int, np.integer)) and N >= 1
+
+def _shift(S, N):         #沿最后一维下移N（N<0上移），空出的位置为NaN
+    S = np.asarray(S, dtype=float)
+    out = np.full(S.shape, np.nan)
+    n = S.shape[-1]
+    if 0 <= N < n: out[..., N:] = S[..., :n-N]
+    elif -n < N < 0: out[..., :n+N] = S[..., -N:]
+    return out
+
+def _win_sum(S, N):       #N周期滑动求和，O(n)，窗口含NaN或±inf为NaN（与pandas rolling一致）；整数序列(如COUNT的0/1)结果精确，全0窗口恰为0
+    #按N分块：窗口和 = 起点所在块的后缀和 + 终点所在块的前缀和，只累加窗口内的值（不用前缀和相减，
+    #大数离开窗口后不影响后面的结果，精度与逐窗口求和相同）
+    n = S.shape[-1]
+    out = np.full(S.shape, np.nan)
+    if N > n: return out
+    nan = ~np.isfinite(S)
+    has_nan = nan.any()
+    nb = -(-n // N)
+    X = np.zeros(S.shape[:-1] + (nb * N,))
+    X[..., :n] = np.where(nan, 0.0, S) if has_nan else S
+    blocks = X.reshape(S.shape[:-1] + (nb, N))
+    pre = np.cumsum(blocks, axis=-1).reshape(X.shape)                       #块内前缀和
+    suf = np.cumsum(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(X.shape)  #块内后缀和
+    m = n - N + 1
+    out[..., N-1:] = suf[..., :m] + pre[..., N-1:n]
+    out[..., N-1::N] = suf[..., :m:N]            #窗口恰好是一整块
+    if has_nan: out[..., N-1:][_win_any(nan, N)] = np.nan
+    return out
+
+def _win_any(mask, N):    #布尔序列的N周期滑动窗口内是否有True，返回窗口终点 N-1..n-1 处的结果
+    k = np.zeros(mask.shape[:-1] + (mask.shape[-1]+1,), dtype=np.int64)
+    np.cumsum(mask, axis=-1, out=k[..., 1:])
+    return k[..., N:] - k[..., :-N] > 0
+
+def _win_ext(S, N, fn):   #N周期滑动最值，倍增合并 O(n·logN)，fn=np.maximum/np.minimum（NaN自然传播，窗口含±inf为NaN，与pandas rolling一致）
+    n = S.shape[-1]
+    out = np.full(S.shape, np.nan)
+    if N > n: return out
+    m, k = S, 1
+    while 2 * k <= N:
+        m = fn(m[..., :-k], m[..., k:])          #m[i] = S[i..i+2k-1] 的最值
+        k *= 2
+    out[..., N-1:] = fn(m[..., :n-N+1], m[..., N-k:N-k+n-N+1])
+    inf = np.isinf(S)
+    if inf.any(): out[..., N-1:][_win_any(inf, N)] = np.nan
+    return out
+
+def _recur(X, beta, z0):  #线性递推 z[t]=beta*z[t-1]+X[t]，z[-1]=z0，沿最后一维分块闭式求解（块长保证beta^-k不溢出）
+    n = X.shape[-1]
+    if beta == 0 or n == 0: return X.copy()
+    B = n if beta >= 1 else max(1, min(n, int(300 / -np.log(beta))))
+    inv, pw = _powers(beta, B)
+    out = np.empty(X.shape)
+    z = np.asarray(z0, dtype=float)
+    for s in range(0, n, B):
+        m = min(B, n - s)
+        acc = np.cumsum(X[..., s:s+m] * inv[:m], axis=-1) * pw[:m] / beta
+        out[..., s:s+m] = acc + pw[:m] * z[..., None]
+        z = out[..., s+m-1]
+    return out
+
+_power_cache = {}
+
+def _powers(beta, B):     #(beta^-k, beta^(k+1))，k=0..B-1，按(beta, B)缓存
+    key = (beta, B)
+    if key not in _power_cache:
+        if len(_power_cache) > 256: _power_cache.clear()
+        k = np.arange(B, dtype=float)
+        _power_cache[key] = (beta ** -k, beta ** (k + 1))
+    return _power_cache[key]
+
+def _lead(S):             #(前置NaN掩码, 第一个有效值)；中间有NaN时返回None（pandas ewm对中间NaN有专门处理，交给pandas实现）
+    n = S.shape[-1]
+    nan = np.isnan(S)
+    if n == 0: return nan, np.zeros(S.shape[:-1])
+    if not nan.any(): return nan, S[..., 0]
+    first = np.where(nan.all(axis=-1), n, np.argmax(~nan, axis=-1))
+    lead = np.arange(n) < np.expand_dims(first, -1)
+    if (nan & ~lead).any(): return None, None
+    x0 = np.take_along_axis(S, np.expand_dims(np.minimum(first, n-1), -1), -1)[..., 0]
+    return lead, np.nan_to_num(x0)
+
+def _ewm(S, alpha):       #ewm(alpha, adjust=False)：y[t]=(1-alpha)*y[t-1]+alpha*x[t]，从第一个有效值开始
+    lead, x0 = _lead(S)
+    if lead is None: return None
+    X = np.where(lead, np.expand_dims(x0, -1), S)
+    out = _recur(alpha * X, 1 - alpha, x0)
+    return _ewm_fix(out, S, lead, x0)
+
+def _ewm_fix(out, S, lead, x0):
+    #前置NaN位置置NaN；开头与第一个有效值相等的一段取精确值（pandas此时结果恰好等于输入，避免CROSS等比较在首根K线翻转）
+    x0 = np.expand_dims(x0, -1)
+    same = np.logical_and.accumulate(lead | (S == x0), axis=-1) & ~lead
+    out[same] = np.broadcast_to(x0, out.shape)[same]
+    out[lead] = np.nan
+    return out
+
+def _rolling_view(S, N):
+    #返回 (float序列, N周期滑动窗口视图, 窗口是否含NaN)，序列长度不足N时视图为None；2维面板沿最后一维滑动
+    #与pandas rolling(N)一致：窗口内有NaN的位置结果为NaN
+    S = np.asarray(S, dtype=float)
+    if N <= 0 or S.shape[-1] < N:
+        return S, None, None
+    w = sliding_window_view(S, N, axis=-1)
+    return S, w, np.isnan(w).any(axis=-1)
+
+def _pad(S, vals, N, fill=np.nan):
+    #把长度 len(S)-N+1 的窗口结果补齐到 len(S)，前N-1个为fill
+    out = np.full(np.shape(S), fill, dtype=float)
+    if vals is not None:
+        out[..., N-1:] = vals
+    return out
+
 def RD(N,D=3):   
     #四舍五入取3位小数 
     return np.round(N,D)        
@@ -33,64 +189,166 @@ def RANGE(A,B,C):
     期间函数
     B<=A<=C
     '''
-    df=pd.DataFrame()
-    df['select']=A.tolist()
-    df['select']=df['select'].apply(lambda x: True if (x>=B and x<=C) else False)
-    return df['select']
+    A = np.asarray(A, dtype=float)
+    return (A >= B) & (A <= C)            #NaN为False
 
+#以下0级函数的S可以是1维序列，也可以是2维面板(股票×K线)，面板沿时间轴(最后一维)计算，见 to_panel
 def REF(S, N=1):          #对序列整体下移动N,返回序列(shift后会产生NAN)    
-    return pd.Series(S).shift(N).values  
+    if _BACKEND == 'numpy' and isinstance(N, (int, np.integer)): return _shift(S, N)
+    return _ts(S, lambda s: s.shift(N))
 
 def DIFF(S, N=1):         #前一个值减后一个值,前面会产生nan 
-    return pd.Series(S).diff(N).values     #np.diff(S)直接删除nan，会少一行
+    if _BACKEND == 'numpy' and isinstance(N, (int, np.integer)): return np.asarray(S, dtype=float) - _shift(S, N)
+    return _ts(S, lambda s: s.diff(N))     #np.diff(S)直接删除nan，会少一行
 
 def STD(S,N):             #求序列的N日标准差，返回序列    
-    return  pd.Series(S).rolling(N).std(ddof=0).values     
+    if _use_np(N):
+        S = np.asarray(S, dtype=float)
+        if S.shape[-1] < N: return _pad(S, None, N)
+        w = sliding_window_view(S, N, axis=-1)
+        d = w - w[..., :1]                 #相对窗口首个值的偏差，避免大数相减；窗口内全相等时结果恰为0（与pandas一致）
+        mean = d @ np.ones(N) / N
+        var = np.maximum(np.einsum('...i,...i->...', d, d) / N - mean * mean, 0)
+        return _pad(S, np.sqrt(var), N)    #窗口含NaN时std为NaN
+    return _ts(S, lambda s: s.rolling(N).std(ddof=0))
 
 def SUM(S, N):            #对序列求N天累计和，返回序列    N=0对序列所有依次求和         
-    return pd.Series(S).rolling(N).sum().values if N>0 else pd.Series(S).cumsum().values  
+    if _use_np(N): return _win_sum(np.asarray(S, dtype=float), N)
+    return _ts(S, lambda s: s.rolling(N).sum() if N>0 else s.cumsum())
 
 def CONST(S):             #返回序列S最后的值组成常量序列
-    return np.full(len(S),S[-1])
+    S = np.asarray(S)
+    return np.full(S.shape, S[..., -1:])
   
 def HHV(S,N):             #HHV(C, 5) 最近5天收盘最高价        
-    return pd.Series(S).rolling(N).max().values     
+    if _use_np(N): return _win_ext(np.asarray(S, dtype=float), N, np.maximum)
+    return _ts(S, lambda s: s.rolling(N).max())
 
 def LLV(S,N):             #LLV(C, 5) 最近5天收盘最低价     
-    return pd.Series(S).rolling(N).min().values    
+    if _use_np(N): return _win_ext(np.asarray(S, dtype=float), N, np.minimum)
+    return _ts(S, lambda s: s.rolling(N).min())
     
 def HHVBARS(S,N):         #求N周期内S最高值到当前周期数, 返回序列
-    return pd.Series(S).rolling(N).apply(lambda x: np.argmax(x[::-1]),raw=True).values 
+    if _NUMBA and np.ndim(S) == 1: return _argext_bars(np.asarray(S, dtype=float), N, True)
+    S, w, nan = _rolling_view(S, N)
+    if w is None: return _pad(S, None, N)
+    return _pad(S, np.where(nan, np.nan, np.argmax(w[..., ::-1], axis=-1)), N)    #同值取最近一根
 
 def LLVBARS(S,N):         #求N周期内S最低值到当前周期数, 返回序列
-    return pd.Series(S).rolling(N).apply(lambda x: np.argmin(x[::-1]),raw=True).values    
+    if _NUMBA and np.ndim(S) == 1: return _argext_bars(np.asarray(S, dtype=float), N, False)
+    S, w, nan = _rolling_view(S, N)
+    if w is None: return _pad(S, None, N)
+    return _pad(S, np.where(nan, np.nan, np.argmin(w[..., ::-1], axis=-1)), N)
+
+@_jit
+def _argext_bars(S, N, is_max):  #HHVBARS/LLVBARS的O(n)单调队列内核，同值取最近一根，窗口含NaN为NaN
+    n = len(S)
+    out = np.full(n, np.nan)
+    dq = np.empty(n, dtype=np.int64)
+    head, tail, last_nan = 0, 0, -1
+    if N <= 0: return out
+    for i in range(n):
+        v = S[i]
+        if v != v:
+            last_nan = i
+        else:
+            while tail > head and ((S[dq[tail-1]] <= v) if is_max else (S[dq[tail-1]] >= v)):
+                tail -= 1
+            dq[tail] = i
+            tail += 1
+        while tail > head and dq[head] <= i - N:
+            head += 1
+        if i >= N - 1 and last_nan <= i - N and tail > head:
+            out[i] = i - dq[head]
+    return out
   
 def MA(S,N):              #求序列的N日简单移动平均值，返回序列                    
-    return pd.Series(S).rolling(N).mean().values  
+    if _use_np(N): return _win_sum(np.asarray(S, dtype=float), N) / N
+    return _ts(S, lambda s: s.rolling(N).mean())
   
 def EMA(S,N):             #指数移动平均,为了精度 S>4*N  EMA至少需要120周期     alpha=2/(span+1)    
-    return pd.Series(S).ewm(span=N, adjust=False).mean().values     
+    out = _ewm(np.asarray(S, dtype=float), 2 / (N + 1)) if _BACKEND == 'numpy' else None
+    return out if out is not None else _ts(S, lambda s: s.ewm(span=N, adjust=False).mean())
 
 def SMA(S, N, M=1):       #中国式的SMA,至少需要120周期才精确 (雪球180周期)    alpha=1/(1+com)    
-    return pd.Series(S).ewm(alpha=M/N,adjust=False).mean().values           #com=N-M/M
+    out = _ewm(np.asarray(S, dtype=float), M / N) if _BACKEND == 'numpy' else None
+    return out if out is not None else _ts(S, lambda s: s.ewm(alpha=M/N, adjust=False).mean())           #com=N-M/M
 
 def DMA(S, A):            #求S的动态移动平均，A作平滑因子,必须 0<A<1  (此为核心函数，非指标）
-    return pd.Series(S).ewm(alpha=A, adjust=True).mean().values
+    #通达信 Y=A*X+(1-A)*Y'：A为常数或序列(如 DMA(C,VOL/CAPITAL))是同一个递推，常数A与 np.full(len(S),A) 结果相同
+    if np.ndim(A) > 0: return _dma_var(S, A)
+    A = min(max(float(A), 0.0), 1.0)
+    if _BACKEND == 'pandas': return _ts(S, lambda s: s.ewm(alpha=A, adjust=False).mean())
+    out = _ewm(np.asarray(S, dtype=float), A)      #常数A即 ewm(alpha=A, adjust=False)
+    return out if out is not None else _dma_var(S, A)    #中间有NaN时与序列A一样沿用上一个值
+
+def _dma_var(S, A):       #逐K线平滑因子的DMA，O(n)；A截断到[0,1]，S或A无效的K线沿用上一个值，第一个有效值作初值
+    S, A = np.broadcast_arrays(np.asarray(S, dtype=float), np.asarray(A, dtype=float))
+    if S.ndim == 1: return _dma_kernel(S, A)
+    if _NUMBA: return np.array([_dma_kernel(s, a) for s, a in zip(S, A)])
+    A = np.clip(A, 0, 1)                            #无numba时按K线循环，股票维向量化
+    out = np.empty(S.shape)
+    y = np.full(S.shape[0], np.nan)
+    for i in range(S.shape[1]):
+        x, a = S[:, i], A[:, i]
+        y = np.where((x == x) & (a == a), np.where(y == y, a * x + (1 - a) * y, x), y)
+        out[:, i] = y
+    return out
+
+@_jit
+def _dma_kernel(S, A):
+    n = len(S)
+    out = np.empty(n)
+    y = np.nan
+    for i in range(n):
+        x, a = S[i], A[i]
+        if x == x and a == a:
+            a = 1.0 if a > 1 else (0.0 if a < 0 else a)
+            y = x if y != y else a * x + (1 - a) * y
+        out[i] = y
+    return out
 
 def WMA(S, N):            #通达信S序列的N日加权移动平均 Yn = (1*X1+2*X2+3*X3+...+n*Xn)/(1+2+3+...+Xn)
-    return pd.Series(S).rolling(N).apply(lambda x:x[::-1].cumsum().sum()*2/N/(N+1),raw=True).values 
+    S, w, nan = _rolling_view(S, N)
+    if w is None: return _pad(S, None, N)
+    return _pad(S, w @ np.arange(1, N+1, dtype=float) * 2 / N / (N+1), N)    #含NaN的窗口点积自然为NaN
   
 def AVEDEV(S, N):         #平均绝对偏差  (序列与其平均值的绝对差的平均值)   
-    return pd.Series(S).rolling(N).apply(lambda x: (np.abs(x - x.mean())).mean()).values 
+    S, w, nan = _rolling_view(S, N)
+    if w is None: return _pad(S, None, N)
+    return _pad(S, np.abs(w - w.mean(axis=-1, keepdims=True)).mean(axis=-1), N)
+
+def _linreg(S, N):        #N周期线性回归(x=0..N-1)的闭式解，返回 (S, 斜率, 窗口均值)，长度不足时斜率为None
+    S, w, nan = _rolling_view(S, N)
+    if w is None: return S, None, None
+    x = np.arange(N, dtype=float) - (N - 1) / 2
+    sxx = float(x @ x)
+    slope = w @ x / sxx if sxx else np.where(nan, np.nan, 0.0)    #N=1时polyfit斜率为0
+    return S, slope, w.mean(axis=-1)
 
 def SLOPE(S, N):          #返S序列N周期回线性回归斜率            
-    return pd.Series(S).rolling(N).apply(lambda x: np.polyfit(range(N),x,deg=1)[0],raw=True).values
+    S, slope, mean = _linreg(S, N)
+    return _pad(S, slope, N)
 
 def FORCAST(S, N):        #返回S序列N周期回线性回归后的预测值， jqz1226改进成序列出    
-    return pd.Series(S).rolling(N).apply(lambda x:np.polyval(np.polyfit(range(N),x,deg=1),N-1),raw=True).values  
+    S, slope, mean = _linreg(S, N)
+    if slope is None: return _pad(S, None, N)
+    return _pad(S, mean + slope * (N - 1) / 2, N)     #回归线过(均值x, 均值y)，x=N-1处的值
 
 def LAST(S, A, B):        #从前A日到前B日一直满足S_BOOL条件, 要求A>B & A>0 & B>=0 
-    return np.array(pd.Series(S).rolling(A+1).apply(lambda x:np.all(x[::-1][B:]),raw=True),dtype=bool)
+    #前A个周期及窗口含NaN的位置为True（与原rolling实现中NaN转bool的结果一致）
+    S = np.asarray(S, dtype=float)
+    n = S.shape[-1]
+    out = np.ones(S.shape, dtype=bool)
+    if n <= A: return out
+    zero = np.zeros(S.shape[:-1] + (1,), dtype=np.int64)
+    false_cnt = np.concatenate((zero, np.cumsum(S == 0, axis=-1)), axis=-1)     #NaN按真值处理
+    nan_cnt = np.concatenate((zero, np.cumsum(np.isnan(S), axis=-1)), axis=-1)
+    t = np.arange(A, n)
+    all_true = false_cnt[..., t - B + 1] - false_cnt[..., t - A] == 0          #S[t-A .. t-B] 全部成立
+    has_nan = nan_cnt[..., t + 1] - nan_cnt[..., t - A] > 0                    #整个A+1窗口含NaN
+    out[..., A:] = all_true | has_nan
+    return out
   
 #------------------   1级：应用层函数(通过0级核心函数实现） ----------------------------------
 def COUNT(S, N):                       # COUNT(CLOSE>O, N):  最近N天满足S_BOO的天数  True的天数
@@ -103,41 +361,127 @@ def EXIST(S, N):                       # EXIST(CLOSE>3010, N=5)  n日内是否
     return IF(SUM(S,N)>0,True,False)
 
 def FILTER(S, N):                      # FILTER函数，S满足条件后，将其后N周期内的数据置为0, FILTER(C==H,5)
-    for i in range(len(S)): S[i+1:i+1+N]=0  if S[i] else S[i+1:i+1+N]        
+    cond = np.asarray(S) != 0                      #原地修改，NaN按成立处理；面板逐只股票计算
+    S[_filter_mask(cond, N) if cond.ndim == 1 else np.array([_filter_mask(c, N) for c in cond])] = 0
     return S                           # 例：FILTER(C==H,5) 涨停后，后5天不再发出信号 
+
+@_jit
+def _filter_mask(cond, N):             #FILTER内核：返回需要置0的位置，被置0的周期不会再次触发
+    n = len(cond)
+    mask = np.zeros(n, dtype=np.bool_)
+    i = 0
+    while i < n:
+        if cond[i] and N > 0:
+            end = min(i + 1 + N, n)
+            mask[i+1:end] = True
+            i = end
+        else:
+            i += 1
+    return mask
   
 def BARSLAST(S):                       #上一次条件成立到当前的周期, BARSLAST(C/REF(C,1)>=1.1) 上一次涨停到今天的天数 
-    M=np.concatenate(([0],np.where(S,1,0)))  
-    for i in range(1, len(M)):  M[i]=0 if M[i] else M[i-1]+1    
-    return M[1:]                       
+    S = np.asarray(S)
+    idx = np.arange(1, S.shape[-1]+1)  #从未成立时从序列开头计数
+    return idx - np.maximum.accumulate(np.where(S != 0, idx, 0), axis=-1)
 
 def BARSLASTCOUNT(S):                  # 统计连续满足S条件的周期数        by jqz1226
-    rt = np.zeros(len(S)+1)            # BARSLASTCOUNT(CLOSE>OPEN)表示统计连续收阳的周期数
-    for i in range(len(S)): rt[i+1]=rt[i]+1  if S[i] else rt[i+1]
-    return rt[1:]  
+    S = np.asarray(S)                  # BARSLASTCOUNT(CLOSE>OPEN)表示统计连续收阳的周期数
+    idx = np.arange(1, S.shape[-1]+1)
+    return (idx - np.maximum.accumulate(np.where(S != 0, 0, idx), axis=-1)).astype(float)
   
 def BARSSINCEN(S, N):                  # N周期内第一次S条件成立到现在的周期数,N为常量  by jqz1226
-    return pd.Series(S).rolling(N).apply(lambda x:N-1-np.argmax(x) if np.argmax(x) or x[0] else 0,raw=True).fillna(0).values.astype(int)
+    S, w, nan = _rolling_view(S, N)
+    if w is None: return np.zeros(S.shape, dtype=int)
+    first = np.argmax(w, axis=-1)
+    vals = np.where((first > 0) | (w[..., 0] != 0), N - 1 - first, 0)
+    return _pad(S, np.where(nan, 0, vals), N, fill=0).astype(int)
 
   
+def _rise(A):                          #布尔序列/面板由False变True的位置，第一根为False
+    A = np.asarray(A, dtype=bool)
+    out = np.zeros(A.shape, dtype=bool)
+    out[..., 1:] = ~A[..., :-1] & A[..., 1:]
+    return out
+
 def CROSS(S1, S2):                     #判断向上金叉穿越 CROSS(MA(C,5),MA(C,10))  判断向下死叉穿越 CROSS(MA(C,10),MA(C,5))   
-    return np.concatenate(([False], np.logical_not((S1>S2)[:-1]) & (S1>S2)[1:]))    # 不使用0级函数,移植方便  by jqz1226
+    return _rise(np.asarray(S1) > np.asarray(S2))    # 不使用0级函数,移植方便  by jqz1226
 def CROSS_UP(S1, S2):                     #判断向上金叉穿越 CROSS(MA(C,5),MA(C,10))  判断向下死叉穿越 CROSS(MA(C,10),MA(C,5))   
-    return np.concatenate(([False], np.logical_not((S1>S2)[:-1]) & (S1>S2)[1:]))    # 不使用0级函数,移植方便  by jqz1226
+    return _rise(np.asarray(S1) > np.asarray(S2))    # 不使用0级函数,移植方便  by jqz1226
 def CROSS_DOWN(S1, S2):                     
-    return np.concatenate(([False], np.logical_not((S1<S2)[:-1]) & (S1<S2)[1:]))    # 不使用0级函数,移植方便  by jqz1226
+    return _rise(np.asarray(S1) < np.asarray(S2))    # 不使用0级函数,移植方便  by jqz1226
 
 def LONGCROSS(S1,S2,N):                #两条线维持一定周期后交叉,S1在N周期内都小于S2,本周期从S1下方向上穿过S2时返回1,否则返回0         
     return  np.array(np.logical_and(LAST(S1<S2,N,1),(S1>S2)),dtype=bool)            # N=1时等同于CROSS(S1, S2)
     
 def VALUEWHEN(S, X):                   #当S条件成立时,取X的当前值,否则取VALUEWHEN的上个成立时的X值   by jqz1226
-    return pd.Series(np.where(S,X,np.nan)).ffill().values  
+    return _ts(np.where(S,X,np.nan), lambda s: s.ffill())
+
+def WINNER(P, CLOSE, HIGH, LOW, VOL, CAPITAL):   #获利盘比例(0~1)，成本低于P的筹码占比，WINNER(CLOSE,...)；VOL与CAPITAL单位相同，筹码模型见chip_distribution
+    return chip_indicators(HIGH, LOW, CLOSE, _turnover(VOL, CAPITAL), winner={'WINNER': P})['WINNER']
+
+def COST(N, CLOSE, HIGH, LOW, VOL, CAPITAL):     #成本分布，N%的筹码成本低于该价格，COST(85,...)
+    return chip_indicators(HIGH, LOW, CLOSE, _turnover(VOL, CAPITAL), cost=(N,))[f'COST{N}']
+
+def _turnover(VOL, CAPITAL):           #换手率(小数)
+    return np.asarray(VOL, dtype=float) / np.asarray(CAPITAL, dtype=float)
+
+def ZIG(S, N):                         #之字转向，S反向变动超过N%时转向，转折点之间直线连接（最后一段连到最后一根K线，用到未来数据，与通达信一致）
+    if np.ndim(S) == 2: return np.array([ZIG(s, N) for s in S])
+    S = np.asarray(S, dtype=float)
+    out = np.full(len(S), np.nan)
+    valid = np.flatnonzero(S == S)
+    if len(valid) == 0: return out
+    pos = np.unique(np.concatenate(([valid[0]], _zig_pivots(S, N / 100)[0], [valid[-1]])))
+    out[valid[0]:] = np.interp(np.arange(valid[0], len(S)), pos, S[pos])
+    out[np.isnan(S)] = np.nan
+    return out
+
+def _zig_ref(S, N, M, kind):           #前M个ZIG波峰(kind=1)/波谷(kind=-1)的值
+    if np.ndim(S) == 2: return np.array([_zig_ref(s, N, M, kind) for s in S])
+    S = np.asarray(S, dtype=float)
+    pos, kinds = _zig_pivots(S, N / 100)
+    pos = pos[kinds == kind]
+    out = np.full(len(S), np.nan)
+    if len(pos) == 0: return out
+    c = np.searchsorted(pos, np.arange(len(S)), side='right') - M      #截至当前已出现的转折点中倒数第M个
+    out[c >= 0] = S[pos[c[c >= 0]]]
+    return out
+
+@_jit
+def _zig_pivots(S, pct):               #ZIG内核：O(n)找转折点，返回 (位置, 类型 1波峰/-1波谷)，NaN跳过
+    n = len(S)
+    pos = np.empty(n, dtype=np.int64)
+    kind = np.empty(n, dtype=np.int64)
+    m, trend, hi, lo = 0, 0, -1, -1
+    for i in range(n):
+        x = S[i]
+        if x != x: continue
+        if hi < 0:
+            hi, lo = i, i
+            continue
+        if trend == 0:                 #方向未定：同时跟踪最高和最低
+            if x > S[hi]: hi = i
+            if x < S[lo]: lo = i
+            if x >= S[lo] * (1 + pct) and lo < i:
+                pos[m], kind[m], m, trend, hi = lo, -1, m + 1, 1, i
+            elif x <= S[hi] * (1 - pct) and hi < i:
+                pos[m], kind[m], m, trend, lo = hi, 1, m + 1, -1, i
+        elif trend == 1:
+            if x >= S[hi]: hi = i
+            elif x <= S[hi] * (1 - pct):
+                pos[m], kind[m], m, trend, lo = hi, 1, m + 1, -1, i
+        else:
+            if x <= S[lo]: lo = i
+            elif x >= S[lo] * (1 + pct):
+                pos[m], kind[m], m, trend, hi = lo, -1, m + 1, 1, i
+    return pos[:m], kind[:m]
 #df,DATE,CLOSE,OPEN,LOW,HIGH,VOL,CAPITAL,HSL,AMOUNT=set_start_data()
 def params_data(test='test.txt',to_path='result.txt'):
     '''
     解析通达信公式
     test原来通达信公式文件
     to_path结果文件，python可以直接运行的文件
+    简单的字符串替换，不处理运算符优先级；推荐使用 tdx_formula.compile_formula / load_formula 编译成可直接计算的函数
     '''
     test=open(r'{}'.format(test),'r',encoding='utf-8')
     result=test.readlines()
@@ -412,14 +756,16 @@ def ACCER(CLOSE,N=8):
     ACCER=SLOPE(CLOSE,N)/CLOSE
     return ACCER
 #需要编写活力函数
-def CYD(CLOSE,CAPITAL,N=21):
+def CYD(CLOSE,HIGH,LOW,VOL,CAPITAL,N=21):
     '''
     承接因子
     输出CYDS:以收盘价计算的获利盘比例/(成交量(手)/当前流通股本(手))
     输出CYDN:以收盘价计算的获利盘比例/成交量(手)/当前流通股本(手)的N日简单移动平均
     '''
-    CYDS=WINNER(CLOSE)/(VOL/CAPITAL)
-    CYDN=WINNER(CLOSE)/MA(VOL/CAPITAL,N);   
+    HSL=_turnover(VOL,CAPITAL)
+    WIN=WINNER(CLOSE,CLOSE,HIGH,LOW,VOL,CAPITAL)
+    CYDS=WIN/HSL
+    CYDN=WIN/MA(HSL,N)
     return CYDS,CYDN
 def CYF(HSL,N=21):
     '''
@@ -631,7 +977,7 @@ def UOS(CLOSE,HIGH,LOW,N1=7,N2=14,N3=28,M=6):
     ACC2=SUM(CLOSE-TL,N2)/SUM(TH-TL,N2)
     ACC3=SUM(CLOSE-TL,N3)/SUM(TH-TL,N3)
     UOS=(ACC1*N2*N3+ACC2*N1*N3+ACC3*N1*N2)*100/(N1*N2+N1*N3+N2*N3)
-    MAUOS=EXPMEMA(pd.Series(UOS),M)
+    MAUOS=EXPMEMA(UOS,M)
     return UOS,np.array(MAUOS)
 def VTP(CLOSE,VOL,N=51,M=6):
     '''
@@ -810,7 +1156,7 @@ def EXPMEMA(CLOSE,M=5):
     '''
     指数平滑
     '''
-    return pd.Series(CLOSE).ewm(span=M, adjust=False).mean().values
+    return _ts(CLOSE, lambda s: s.ewm(span=M, adjust=False).mean())
 def PCNT(CLOSE,M=5):
     '''
     输出幅度比:(收盘价-1日前的收盘价)/收盘价*100
@@ -1194,46 +1540,50 @@ def SAR(HIGH,LOW,M=10,af= 2, amax=20):
     '''
     af=af/100
     amax=amax/100
-    data=pd.DataFrame()
-    data['high']=HIGH
-    data['low']=LOW
-    data['high - low']=data['high']-data['low']
-    high, low =data['high'].shift(M),data['low'].shift(M)
+    high=pd.Series(HIGH).shift(M)
+    low=pd.Series(LOW).shift(M)
+    sar0=low.values[0]-(pd.Series(HIGH)-pd.Series(LOW)).std()
+    return _sar_kernel(high.values.astype(float), low.values.astype(float), float(sar0), af, amax).tolist()
 
-        # Starting values
-    sig0, xpt0, af0 = True, high.tolist()[0], af
-    _sar = [low.tolist()[0] - data['high - low'].std()]
-
-    for i in range(1, len(LOW)):
+@_jit
+def _sar_kernel(high, low, sar0, af, amax):
+    #SAR的O(n)内核，min/max按Python内置函数的NaN规则（比较不成立时保留第一个参数）
+    n = len(low)
+    out = np.empty(n)
+    if n == 0: return out
+    out[0] = sar0
+    sig0, xpt0, af0 = True, high[0], af
+    for i in range(1, n):
         sig1, xpt1, af1 = sig0, xpt0, af0
+        prev = out[i-1]
 
-        lmin = min(low.tolist()[i - 1], low.tolist()[i])
-        lmax = max(high.tolist()[i - 1], high.tolist()[i])
+        lmin = low[i] if low[i] < low[i-1] else low[i-1]
+        lmax = high[i] if high[i] > high[i-1] else high[i-1]
 
         if sig1:
-            sig0 = low.tolist()[i] > _sar[-1]
-            xpt0 = max(lmax, xpt1)
+            sig0 = low[i] > prev
+            xpt0 = xpt1 if xpt1 > lmax else lmax
         else:
-            sig0 = high.tolist()[i] >= _sar[-1]
-            xpt0 = min(lmin, xpt1)
+            sig0 = high[i] >= prev
+            xpt0 = xpt1 if xpt1 < lmin else lmin
 
         if sig0 == sig1:
-            sari = _sar[-1] + (xpt1 - _sar[-1]) * af1
-            af0 = min(amax, af1 + af)
+            sari = prev + (xpt1 - prev) * af1
+            af0 = af1 + af if af1 + af < amax else amax
 
             if sig0:
                 af0 = af0 if xpt0 > xpt1 else af1
-                sari = min(sari, lmin)
+                sari = lmin if lmin < sari else sari
             else:
                 af0 = af0 if xpt0 < xpt1 else af1
-                sari = max(sari, lmax)
+                sari = lmax if lmax > sari else sari
         else:
             af0 = af
             sari = xpt0
 
-        _sar.append(sari)
+        out[i] = sari
 
-    return _sar
+    return out
 #*******************************
 #******************************
 #交易类型
@@ -1512,57 +1862,29 @@ def ADVOL(CLOSE,HIGH,LOW,VOL):
 #*********************************************
 #*********************************************
 #鬼系
-def CYC(code='sh600031',start_date='20210101',end_date='20221022',P1=5,P2=13,P3=34):
+def CYC(CLOSE,HIGH,LOW,AMOUNT,VOL,CAPITAL,P1=5,P2=13,P3=34):
     '''
     成本均线
-    JJJ赋值:如果总量>0.01,简单理解流通股,返回0.01*总金额/总量,否则返回昨收盘价
+    AMOUNT成交额(元)，VOL成交量(手)，CAPITAL流通股本(股)，可为常数或序列
+    JJJ赋值:如果总量>0.01,返回0.01*总金额/总量,否则返回昨收盘价
     DDD赋值:(最高价<0.01 或者 最低价<0.01)
-    JJJT赋值:如果DDD,返回1,否则返回(JJJ<(最高价+0.01)并且JJJ>(最低价-0.01))
+    JJJT赋值:如果DDD,返回0,否则返回(JJJ<(最高价+0.01)并且JJJ>(最低价-0.01))
     输出CYC1:如果JJJT,返回0.01*成交额(元)的P1日指数移动平均/成交量(手)的P1日指数移动平均,否则返回(最高价+最低价+收盘价)/3的P1日指数移动平均
     输出CYC2:如果JJJT,返回0.01*成交额(元)的P2日指数移动平均/成交量(手)的P2日指数移动平均,否则返回(最高价+最低价+收盘价)/3的P2日指数移动平均
     输出CYC3:如果JJJT,返回0.01*成交额(元)的P3日指数移动平均/成交量(手)的P3日指数移动平均,否则返回(最高价+最低价+收盘价)/3的P3日指数移动平均
     输出CYC∞:如果JJJT,返回以100*成交量(手)/流通股本(股)为权重成交额(元)/(100*成交量(手))的动态移动平均,否则返回(最高价+最低价+收盘价)/3的120日指数移动平均
-    '''
-    pass
-    def DYNAINFO_10(M=10):
-        '''
-        总金额=price*volume
-        '''
-        result=df['close']*df['volume']
-        return result
-    def DYNAINFO_3(M=3):
-        '''
-        昨日收盘价
-        '''
-        return df['close'].shift(1)
-    def DYNAINFO_5(M=5):
-        '''
-        最高价
-        '''
-        return df['high']
-    def DYNAINFO_6(M=6):
-        '''
-        最低价
-        '''
-        return df['low']
-    AMOUNT=AMOUNT=df['close']*df['volume']
-    VOL=df['volume']
-    HIGH=df['high']
-    LOW=df['low']
-    CLOSE=df['close']
-    def FINANCE_7(M=7):
-        '''
-        100*成交量
-        '''
-        return 100*df['volume']
-    JJJ=IF(DYNAINFO_8(8)>0.01,0.01*DYNAINFO_10(10)/DYNAINFO_8(8),DYNAINFO_3(3))
-    DDD=np.logical_or(DYNAINFO_5(5)<0.01,DYNAINFO_6(6)<0.01)
-    JJJT=IF(DDD,False,np.logical_and(JJJ<(DYNAINFO_5(5)+0.01),JJJ>(DYNAINFO_6(6)-0.01)))
-    CYC1=IF(JJJT,0.01*EMA(AMOUNT,P1)/EMA(VOL,P1),EMA((HIGH+LOW+CLOSE)/3,P1))
-    CYC2=IF(JJJT,0.01*EMA(AMOUNT,P2)/EMA(VOL,P2),EMA((HIGH+LOW+CLOSE)/3,P2))
-    CYC3=IF(JJJT,0.01*EMA(AMOUNT,P3)/EMA(VOL,P3),EMA((HIGH+LOW+CLOSE)/3,P3))
-    #CYC_a=IF(JJJT,DMA(AMOUNT/(100*VOL),100*VOL/FINANCE_7(7)),EMA((HIGH+LOW+CLOSE)/3,120))
-    return CYC1,CYC2,CYC3
+    DYNAINFO为最新行情，这里取最后一根K线（面板按每只股票的最后一根），JJJT用于判断成交量单位是否为手
+    '''
+    CLOSE,HIGH,LOW,AMOUNT,VOL=[np.asarray(X,dtype=float) for X in (CLOSE,HIGH,LOW,AMOUNT,VOL)]
+    H,L,V,AMO,LC=HIGH[...,-1:],LOW[...,-1:],VOL[...,-1:],AMOUNT[...,-1:],REF(CLOSE,1)[...,-1:]
+    with np.errstate(divide='ignore',invalid='ignore'):
+        JJJ=IF(V>0.01,0.01*AMO/V,LC)
+        DDD=np.logical_or(H<0.01,L<0.01)
+        JJJT=IF(DDD,False,np.logical_and(JJJ<(H+0.01),JJJ>(L-0.01)))
+        TYP=(HIGH+LOW+CLOSE)/3
+        CYC1,CYC2,CYC3=[IF(JJJT,0.01*EMA(AMOUNT,P)/EMA(VOL,P),EMA(TYP,P)) for P in (P1,P2,P3)]
+        CYC_a=IF(JJJT,DMA(AMOUNT/(100*VOL),100*VOL/np.asarray(CAPITAL,dtype=float)),EMA(TYP,120))
+    return CYC1,CYC2,CYC3,CYC_a
 def CYS(CLOSE,AMOUNT,VOL):
     '''
     市场盈亏
@@ -1573,12 +1895,13 @@ def CYS(CLOSE,AMOUNT,VOL):
     CYC13=0.01*EMA(AMOUNT,13)/EMA(VOL,13)
     CYS=(CLOSE-CYC13)/CYC13*100
     return CYS
-def CYQKL(CLOSE,OPEN):
+def CYQKL(CLOSE,OPEN,HIGH,LOW,VOL,CAPITAL):
     '''
     博弈K线长度
     输出KL:100*(以收盘价计算的获利盘比例-以开盘价计算的获利盘比例)
     '''
-    KL=100*(WINNER(CLOSE)-WINNER(OPEN))
+    WIN=chip_indicators(HIGH,LOW,CLOSE,_turnover(VOL,CAPITAL),winner={'C':CLOSE,'O':OPEN})   #两个价格共用一次筹码推进
+    KL=100*(WIN['C']-WIN['O'])
     return KL
 def CYW(CLOSE,HIGH,LOW,VOL):
     '''
@@ -1600,22 +1923,27 @@ def CYW(CLOSE,HIGH,LOW,VOL):
 #其他系
 def PEAK(CLOSE,N,n=1):
     '''
-    计算倾效
-    np.polyfit(range(N),x,deg=1)
+    波峰值
+    前n个ZIG(CLOSE,N)转向波峰的值
     '''
-    pass
+    return _zig_ref(CLOSE,N,n,1)
 def TROUGH(CLOSE,N,n=1):
     '''
-    箱底
+    波谷值
+    前n个ZIG(CLOSE,N)转向波谷的值
     '''
-    pass
-def XT(CLOSE):
+    return _zig_ref(CLOSE,N,n,-1)
+def XT(CLOSE,N=10):
     '''
     箱体
+    输出箱顶:前1个N%转向波峰值*0.98
+    输出箱底:前1个N%转向波谷值*1.02
+    箱高:100*(箱顶-箱底)/箱底
     '''
     箱顶=PEAK(CLOSE,N,1)*0.98
     箱底=TROUGH(CLOSE,N,1)*1.02
-    箱高=100*(箱顶-箱底)/箱底,#NODRAW
+    箱高=100*(箱顶-箱底)/箱底#NODRAW
+    return 箱顶,箱底,箱高
 def  MOD(M,N):
     '''
     计算模
@@ -1698,18 +2026,16 @@ def JAX(CLOSE,HIGH,LOW,N=30):
     输出A:TMP,线宽为2,画棕色
     输出X:如果TMP<=济安线,返回TMP,否则返回无效数,线宽为2,画绿色
     '''
+    CLOSE,HIGH,LOW=[np.asarray(X,dtype=float) for X in (CLOSE,HIGH,LOW)]
     AA=ABS((2*CLOSE+HIGH+LOW)/4-MA(CLOSE,N))/MA(CLOSE,N)
-    data=pd.DataFrame()
-    data['数据']=(2*CLOSE+LOW+HIGH)/4
-    #alpha中值0.5
-    济安线=data['数据'].ewm(alpha=0.5, adjust=True).mean()#LINETHICK3,COLORMAGENTA
+    济安线=DMA((2*CLOSE+LOW+HIGH)/4,AA)#LINETHICK3,COLORMAGENTA
     CC=(CLOSE/济安线)
     MA1=MA(CC*(2*CLOSE+HIGH+LOW)/4,3)
     MAAA=((MA1-济安线)/济安线)/3
     TMP=MA1-MAAA*MA1
-    J=IF(TMP<=济安线,济安线,None)#LINETHICK3,COLORCYAN
+    J=IF(TMP<=济安线,济安线,np.nan)#LINETHICK3,COLORCYAN
     A=TMP#LINETHICK2,COLORBROWN
-    X=IF(TMP<=济安线,TMP,None)#LINETHICK2,COLORGREEN
+    X=IF(TMP<=济安线,TMP,np.nan)#LINETHICK2,COLORGREEN
     return J,A,X
 def XJDX(CLOSE,HIGH,LOW):
     '''
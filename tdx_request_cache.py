@@ -0,0 +1,191 @@
+# tdx_request_cache.py - 行情请求合并（single-flight）与短时缓存：同一进程内相同的请求只发一次
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# 用法:
+#   client = CachedClient(get_pool().client())      # tdx_client_pool.get_client() 默认已包一层
+#   client.bars(symbol='000400', frequency='day', offset=300)
+# 相同的 (方法, 参数) 同时有多个线程请求时只有第一个真正请求，其余等待并共用结果；
+# 结果在 TTL 内复用：交易时段 1 秒（行情在变），非交易时段 5 分钟（数据不变，但不跨过下一个交易时段的开始）。
+# 每次返回的都是结果的拷贝，调用方修改返回的 DataFrame 不影响缓存和其他调用方。
+
+CACHED_METHODS = {'bars', 'minutes', 'quotes'}    # 只读行情接口
+
+TTL_TRADING = 1.0       # 交易时段内的缓存时间(秒)
+TTL_CLOSED = 300.0      # 非交易时段的缓存时间(秒)，不超过下一个交易时段开始
+
+# 交易时段（含集合竞价和收盘后数据落定的几分钟），按 HHMM
+SESSIONS = ((915, 1131), (1259, 1510))
+
+
+def market_ttl(now=None):
+    """
+    当前时刻的缓存时间(秒)：交易时段内 TTL_TRADING；其他时间 TTL_CLOSED，但不超过距下一个交易时段开始的时间
+
+    只按周一到周五判断交易日，节假日当作非交易时段（缓存时间同样不超过 TTL_CLOSED）
+    """
+    now = now or datetime.now()
+    hhmm = now.hour * 100 + now.minute
+    if now.weekday() < 5 and any(start <= hhmm < end for start, end in SESSIONS):
+        return TTL_TRADING
+    return max(min(TTL_CLOSED, (_next_session(now) - now).total_seconds()), TTL_TRADING)
+
+
+def _next_session(now):
+    day = now.replace(second=0, microsecond=0)
+    for _ in range(8):
+        if day.weekday() < 5:
+            for start, _ in SESSIONS:
+                begin = day.replace(hour=start // 100, minute=start % 100)
+                if begin > now:
+                    return begin
+        day = (day + timedelta(days=1)).replace(hour=0, minute=0)
+    return now + timedelta(seconds=TTL_CLOSED)
+
+
+class _Call:
+    """一次进行中的请求，同 key 的其他线程等待它完成"""
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCache:
+    """
+    single-flight + TTL 的 LRU 缓存
+
+    用法:
+        cache = RequestCache()
+        value = cache.get(key, lambda: fetch(...))
+    """
+
+    def __init__(self, maxsize=512, ttl=market_ttl):
+        """
+        参数:
+            maxsize: 最多缓存的结果数，超出时淘汰最久未用的
+            ttl: 缓存时间(秒)，数值或无参函数（默认 market_ttl，按交易时段变化）；0 只合并同时进行的请求
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()    # key -> (过期时间, 结果)
+        self._inflight = {}            # key -> _Call
+        self.hits = 0                  # 命中缓存
+        self.shared = 0                # 等待并共用了进行中的请求
+        self.misses = 0                # 真正发出的请求
+
+    def get(self, key, fetch):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return _copy(entry[1])
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return _copy(call.result)
+
+        try:
+            call.result = fetch()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if call.error is None and call.result is not None:
+                    self._store(key, call.result)
+            call.done.set()
+        return _copy(call.result)
+
+    def _store(self, key, value):
+        ttl = self.ttl() if callable(self.ttl) else self.ttl
+        if ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """{'hits', 'shared', 'misses', 'size'}"""
+        with self._lock:
+            return {'hits': self.hits, 'shared': self.shared, 'misses': self.misses, 'size': len(self._cache)}
+
+
+class CachedClient:
+    """
+    在行情客户端前加一层请求合并与缓存，CACHED_METHODS 中的方法经过缓存，其他方法直接转发
+
+    多个 CachedClient 共用同一个 RequestCache 时，它们之间的相同请求也会合并
+    """
+
+    def __init__(self, client, cache=None):
+        self._client = client
+        self._cache = cache if cache is not None else RequestCache()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in CACHED_METHODS:
+            return attr
+
+        def _method(*args, **kwargs):
+            key = (name, _freeze(args), _freeze(kwargs))
+            try:
+                hash(key)
+            except TypeError:
+                return attr(*args, **kwargs)    # 参数不可哈希（如数组）时不缓存
+            return self._cache.get(key, lambda: attr(*args, **kwargs))
+
+        _method.__name__ = name
+        return _method
+
+    def __repr__(self):
+        return f"CachedClient({self._client!r}, {self._cache.stats()})"
+
+
+def _freeze(value):
+    """参数转为可哈希的 key（列表 -> tuple，dict -> 排序后的 tuple）"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        items = tuple(_freeze(v) for v in value)
+        return tuple(sorted(items)) if isinstance(value, set) else items
+    return value
+
+
+def _copy(value):
+    return value.copy() if hasattr(value, 'copy') else copy.copy(value)
+
+
+_shared_cache = RequestCache()
+
+
+def shared_cache():
+    """进程内共用的缓存（tdx_client_pool.get_client 使用）"""
+    return _shared_cache